@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Arranque en segundo plano de los servicios de Flask.
+
+Importar MediaPipe/TensorFlow, cargar el modelo por defecto y crear los trackers
+tarda varios segundos. Los servicios abren su puerto HTTP de inmediato y hacen ese
+trabajo en un hilo aparte, por fases con su duración medida, terminando con una
+inferencia de prueba para que el primer frame no pague la inicialización.
+
+``/api/health`` (vida) responde en cuanto el proceso atiende peticiones;
+``/api/ready`` devuelve 200 solo cuando el arranque terminó, y 503 mientras tanto o
+si falló. Ambos informan las fases y sus tiempos. Las demás rutas que dependen de lo
+que se está cargando responden 503 hasta entonces.
+"""
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from flask import request
+
+
+class Arranque:
+    def __init__(self, servicio):
+        self.servicio = servicio
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.fases = []
+        self.fase_actual = None
+        self.error = None
+        self.segundos_hasta_listo = None
+        self._listo = threading.Event()
+
+    @contextmanager
+    def fase(self, nombre, opcional=False):
+        """Time one startup phase; an optional phase that fails is recorded and startup goes on."""
+        self.fase_actual = nombre
+        t0 = time.perf_counter()
+        registro = {"name": nombre}
+        try:
+            yield
+        except Exception as e:
+            registro["error"] = str(e)
+            if not opcional:
+                raise
+            print(f"Startup phase {nombre} failed: {e}")
+        finally:
+            registro["seconds"] = round(time.perf_counter() - t0, 3)
+            self.fases.append(registro)
+            self.fase_actual = None
+
+    def iniciar(self, pasos):
+        """Run pasos() on a background thread; the service is ready once it returns."""
+        def ejecutar():
+            try:
+                pasos()
+            except Exception as e:
+                self.error = str(e)
+                print(f"{self.servicio} failed to start: {e}")
+                traceback.print_exc()
+                return
+            self.segundos_hasta_listo = round(time.perf_counter() - self._t0, 3)
+            self._listo.set()
+            print(f"{self.servicio} ready in {self.segundos_hasta_listo:.2f}s")
+
+        threading.Thread(target=ejecutar, daemon=True, name=f"{self.servicio}-arranque").start()
+
+    @property
+    def listo(self):
+        return self._listo.is_set()
+
+    def esperar(self, timeout=None):
+        return self._listo.wait(timeout)
+
+    @property
+    def estado(self):
+        if self.listo:
+            return "ready"
+        return "failed" if self.error else "starting"
+
+    def a_dict(self):
+        return {
+            "service": self.servicio,
+            "status": self.estado,
+            "uptimeSeconds": round(time.time() - self.inicio, 3),
+            "readyAfterSeconds": self.segundos_hasta_listo,
+            "currentPhase": self.fase_actual,
+            "phases": list(self.fases),
+            "error": self.error,
+        }
+
+
+def registrar_rutas(app, arranque, exentos=()):
+    """Add /api/health and /api/ready to app, and answer 503 on every other endpoint not in
+    exentos (endpoint or blueprint names) until startup has finished."""
+    libres = {"health", "ready", "static", *exentos}
+
+    @app.route('/api/health')
+    def health():
+        """Liveness: the process is up and serving HTTP, whether or not startup has finished"""
+        return {"alive": True, **arranque.a_dict()}, 200
+
+    @app.route('/api/ready')
+    def ready():
+        """Readiness: libraries, models and trackers loaded and warmed up"""
+        return arranque.a_dict(), 200 if arranque.listo else 503
+
+    @app.before_request
+    def exigir_arranque():
+        if arranque.listo or request.endpoint in libres or request.blueprint in libres:
+            return None
+        mensaje = (f"Service failed to start: {arranque.error}" if arranque.error
+                   else f"Service is starting ({arranque.fase_actual or 'initializing'})")
+        return {"success": False, "message": mensaje}, 503, {"Retry-After": "1"}
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks reproducibles de los caminos críticos de reconocimiento y entrenamiento.
+
+Corre sin cámara ni servidor usando las imágenes incluidas en el repositorio
+(``frontend/static/Letras`` y ``backend/usuarios-entrenamientos/1``) y el modelo de
+``backend/modelos/1``. Los resultados se escriben en JSON para poder compararlos
+entre commits:
+
+    python benchmark.py --output resultados.json
+    python benchmark.py --compare resultados.json --skip-training
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from cache_landmarks import listar_imagenes
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(base_dir)
+repo_dir = os.path.dirname(backend_dir)
+letras_dir = os.path.join(repo_dir, "frontend", "static", "Letras")
+usuario_dir = os.path.join(backend_dir, "usuarios-entrenamientos", "1")
+modelo_path = os.path.join(backend_dir, "modelos", "1", "1_modelo_gestos.h5")
+
+
+def estadisticas(tiempos):
+    """Summary of a list of durations in seconds, reported in milliseconds."""
+    ms = np.asarray(tiempos, dtype=np.float64) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "median_ms": float(np.median(ms)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "min_ms": float(ms.min()),
+    }
+
+
+def cronometrar(funcion, repeticiones, calentamiento=3):
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def imagenes_de_muestra():
+    """Sorted list of (letter, path) for the bundled sample images."""
+    imagenes = []
+    for archivo in sorted(os.listdir(letras_dir)):
+        if archivo.startswith("Ejemplo-") and archivo.endswith(".jpg"):
+            imagenes.append((archivo[len("Ejemplo-"):-len(".jpg")], os.path.join(letras_dir, archivo)))
+    # Same listing as training, which skips the capture dataset files next to the letter folders
+    imagenes.extend((letter, ruta) for letter, _, ruta, _, _ in listar_imagenes(usuario_dir))
+    return imagenes
+
+
+def bench_extraccion(resultados, workers):
+    from extraccion_paralela import crear_hands, extraer_en_paralelo, extraer_landmarks
+
+    rutas = [ruta for _, ruta in imagenes_de_muestra()]
+    hands = crear_hands()
+    try:
+        tiempos = []
+        for ruta in rutas:
+            inicio = time.perf_counter()
+            extraer_landmarks(hands, ruta)
+            tiempos.append(time.perf_counter() - inicio)
+    finally:
+        hands.close()
+    resultados["landmarks_per_image"] = estadisticas(tiempos)
+    resultados["landmarks_per_image"]["images_per_s"] = len(rutas) / sum(tiempos)
+
+    # Parallel extraction includes pool start-up, as entrenamiento.py pays it too
+    lotes = [rutas[i::workers] for i in range(workers)]
+    inicio = time.perf_counter()
+    extraer_en_paralelo(lotes, workers)
+    total = time.perf_counter() - inicio
+    resultados["landmarks_parallel"] = {"workers": workers, "images": len(rutas),
+                                        "total_s": total, "images_per_s": len(rutas) / total}
+
+
+def bench_prediccion(resultados, repeticiones, backends):
+    from inferencia import cargar_modelo
+
+    rng = np.random.default_rng(0)
+    for backend in backends:
+        try:
+            modelo = cargar_modelo(modelo_path, backend)
+        except Exception as e:
+            print(f"Backend {backend} no disponible: {e}")
+            continue
+        for tamano in (1, 32, 256):
+            x = rng.random((tamano, 63), dtype=np.float32)
+            stats = estadisticas(cronometrar(lambda: modelo.predict(x, verbose=0), repeticiones))
+            stats["per_row_us"] = stats["median_ms"] * 1000.0 / tamano
+            resultados[f"predict_{backend}_batch{tamano}"] = stats
+
+
+def bench_jpeg(resultados, repeticiones):
+    import cv2
+
+    rng = np.random.default_rng(0)
+    base = cv2.imread(os.path.join(letras_dir, "Ejemplo-A.jpg"))
+    for ancho, alto in ((640, 480), (320, 240)):
+        # A real photo plus a little noise compresses like a camera frame, unlike pure noise
+        frame = cv2.resize(base, (ancho, alto))
+        frame = cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8))
+        for calidad in (95, 70):
+            parametros = [cv2.IMWRITE_JPEG_QUALITY, calidad]
+            stats = estadisticas(cronometrar(lambda: cv2.imencode(".jpg", frame, parametros), repeticiones))
+            stats["bytes"] = int(len(cv2.imencode(".jpg", frame, parametros)[1]))
+            resultados[f"jpeg_encode_{ancho}x{alto}_q{calidad}"] = stats
+
+
+def bench_entrenamiento(resultados):
+    """Train from scratch (cold landmark cache), then after one new image (incremental) in a scratch copy of backend/."""
+    with tempfile.TemporaryDirectory(prefix="traductor-bench-") as tmp:
+        python_dir = os.path.join(tmp, "backend", "python")
+        shutil.copytree(base_dir, python_dir, ignore=shutil.ignore_patterns("__pycache__"))
+        datos_dir = os.path.join(tmp, "backend", "usuarios-entrenamientos", "bench")
+        for letter, ruta in imagenes_de_muestra():
+            os.makedirs(os.path.join(datos_dir, letter), exist_ok=True)
+            shutil.copy2(ruta, os.path.join(datos_dir, letter, os.path.basename(ruta)))
+
+        script = os.path.join(python_dir, "entrenamiento.py")
+        for nombre in ("training_cold", "training_incremental"):
+            if nombre == "training_incremental":
+                # One new capture: only it goes through MediaPipe and fine-tuning
+                letter, ruta = imagenes_de_muestra()[0]
+                shutil.copy2(ruta, os.path.join(datos_dir, letter, "nueva.jpg"))
+            inicio = time.perf_counter()
+            proceso = subprocess.run([sys.executable, script, "bench"], capture_output=True, text=True)
+            total = time.perf_counter() - inicio
+            if proceso.returncode != 0:
+                print(proceso.stderr[-2000:])
+                raise RuntimeError(f"entrenamiento.py falló durante {nombre}")
+            resultados[nombre] = {"total_s": total}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(actual, referencia):
+    """Print the ratio current/reference for every shared timing metric (>1 means slower)."""
+    print(f"\nComparación contra {referencia.get('commit')}:")
+    for nombre, valores in sorted(actual["results"].items()):
+        previo = referencia.get("results", {}).get(nombre)
+        if not previo:
+            continue
+        for clave in ("median_ms", "total_s"):
+            if clave in valores and clave in previo and previo[clave] > 0:
+                print(f"  {nombre:40s} {clave:10s} {previo[clave]:10.3f} -> {valores[clave]:10.3f} "
+                      f"({valores[clave] / previo[clave]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de reconocimiento y entrenamiento")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por micro-benchmark")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backends", default="numpy,keras,tflite")
+    parser.add_argument("--skip-training", action="store_true")
+    parser.add_argument("--skip-extraction", action="store_true")
+    args = parser.parse_args()
+
+    resultados = {}
+    if not args.skip_extraction:
+        bench_extraccion(resultados, args.workers)
+    bench_prediccion(resultados, args.repeat, args.backends.split(","))
+    bench_jpeg(resultados, args.repeat)
+    if not args.skip_training:
+        bench_entrenamiento(resultados)
+
+    salida = {
+        "commit": commit_actual(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": resultados,
+    }
+    texto = json.dumps(salida, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(texto)
+        print(f"Resultados guardados en {args.output}")
+    else:
+        print(texto)
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparar(salida, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
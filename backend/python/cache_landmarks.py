@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Cache incremental de landmarks por usuario.
+
+Guarda, para cada imagen de entrenamiento, los landmarks extraídos por MediaPipe
+junto con el mtime y el tamaño del archivo. En el siguiente entrenamiento solo se
+procesan las imágenes nuevas o modificadas y se descartan las que ya no existen.
+"""
+import os
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS
+
+
+def listar_imagenes(user_training_dir):
+    """Return a sorted list of (letter, rel_path, abs_path, mtime, size) for every .jpg."""
+    imagenes = []
+    for letter in sorted(os.listdir(user_training_dir)):
+        letter_dir = os.path.join(user_training_dir, letter)
+        if not os.path.isdir(letter_dir):
+            continue
+        for archivo in sorted(os.listdir(letter_dir)):
+            if not archivo.endswith(".jpg"):
+                continue
+            image_path = os.path.join(letter_dir, archivo)
+            stat = os.stat(image_path)
+            rel_path = f"{letter}/{archivo}"
+            imagenes.append((letter, rel_path, image_path, stat.st_mtime, stat.st_size))
+    return imagenes
+
+
+def cargar_cache(cache_path):
+    """Load the cache as {rel_path: (mtime, size, filas)}; returns {} if missing or corrupt."""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            rutas = cache["rutas"]
+            mtimes = cache["mtimes"]
+            tamanos = cache["tamanos"]
+            datos = cache["datos"]
+            indices = cache["indices"]
+    except Exception as e:
+        print(f"Cache de landmarks inválido, se reconstruirá: {e}")
+        return {}
+
+    # Rows are stored grouped by image, so each image's rows are a contiguous slice
+    limites = np.searchsorted(indices, np.arange(len(rutas) + 1))
+    entradas = {}
+    for i, ruta in enumerate(rutas):
+        entradas[str(ruta)] = (float(mtimes[i]), int(tamanos[i]), datos[limites[i]:limites[i + 1]])
+    return entradas
+
+
+def guardar_cache(cache_path, entradas):
+    """Write the cache atomically so an interrupted training never leaves it half-written."""
+    rutas = sorted(entradas)
+    mtimes = np.array([entradas[r][0] for r in rutas], dtype=np.float64)
+    tamanos = np.array([entradas[r][1] for r in rutas], dtype=np.int64)
+    filas = [entradas[r][2] for r in rutas]
+    indices = np.concatenate(
+        [np.full(len(f), i, dtype=np.int32) for i, f in enumerate(filas)]
+    ) if filas else np.zeros(0, dtype=np.int32)
+    datos = np.concatenate(filas) if filas else np.zeros((0, NUM_CARACTERISTICAS), dtype=np.float32)
+
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez(tmp_path, rutas=np.array(rutas, dtype=str), mtimes=mtimes, tamanos=tamanos,
+             datos=datos.astype(np.float32), indices=indices)
+    os.replace(tmp_path, cache_path)
+
+
+def es_vigente(entradas, rel_path, mtime, size):
+    """True if the cached entry for rel_path matches the file's current mtime and size."""
+    entrada = entradas.get(rel_path)
+    return entrada is not None and entrada[0] == mtime and entrada[1] == size
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Cache LRU de modelos por usuario.
+
+Mantiene en memoria los últimos modelos usados para que cambiar de usuario en una
+estación compartida no vuelva a leer el ``.h5`` del disco. Una entrada se invalida
+cuando cambia el mtime o el tamaño de alguno de sus archivos.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def tamano_estimado(modelo, model_path):
+    """Approximate resident size in bytes: exact for NumPy models, file size otherwise."""
+    capas = getattr(modelo, "capas", None)
+    if capas is not None:
+        return sum(kernel.nbytes + bias.nbytes for kernel, bias, _ in capas)
+    return os.path.getsize(model_path)
+
+
+class CacheModelos:
+    """Bounded LRU keyed by user id, limited by entry count and optionally by total bytes."""
+
+    def __init__(self, max_modelos=4, max_bytes=None):
+        self.max_modelos = max(1, max_modelos)
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave -> (firma, valor, bytes)
+        self._cargando = {}  # clave -> (firma, Future) while a load is in progress
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def _firma(rutas):
+        firma = []
+        for ruta in rutas:
+            stat = os.stat(ruta)
+            firma.append((ruta, stat.st_mtime_ns, stat.st_size))
+        return tuple(firma)
+
+    def obtener(self, clave, rutas, cargar):
+        """Return (valor, from_cache) for clave, calling cargar() -> (valor, bytes) on a miss.
+
+        rutas are the files the entry was built from; if any of them changed on disk the
+        cached value is discarded and reloaded.
+        """
+        firma = self._firma(rutas)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == firma:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1], True
+
+            # A request for a user whose model is already loading waits for that load
+            en_curso = self._cargando.get(clave)
+            if en_curso is not None and en_curso[0] == firma:
+                futuro, propio = en_curso[1], False
+            else:
+                futuro, propio = Future(), True
+                self._cargando[clave] = (firma, futuro)
+                self.fallos += 1
+        if not propio:
+            return futuro.result(), False
+
+        # The load itself runs outside the lock so hits for other users are never blocked by it
+        try:
+            valor, tamano = cargar()
+        except BaseException as e:
+            with self._lock:
+                self._terminar_carga(clave, futuro)
+            futuro.set_exception(e)
+            raise
+        with self._lock:
+            self._terminar_carga(clave, futuro)
+            self._entradas[clave] = (firma, valor, tamano)
+            self._entradas.move_to_end(clave)
+            self._desalojar()
+        futuro.set_result(valor)
+        return valor, False
+
+    def _terminar_carga(self, clave, futuro):
+        if self._cargando.get(clave, (None, None))[1] is futuro:
+            del self._cargando[clave]
+
+    def _desalojar(self):
+        # The most recently used entry is never evicted, even if it alone exceeds max_bytes
+        while len(self._entradas) > 1 and (
+                len(self._entradas) > self.max_modelos or
+                (self.max_bytes is not None and self.bytes_totales() > self.max_bytes)):
+            clave, _ = self._entradas.popitem(last=False)
+            print(f"Model cache: evicted user {clave}")
+
+    def bytes_totales(self):
+        return sum(entrada[2] for entrada in self._entradas.values())
+
+    def estado(self):
+        with self._lock:
+            return {
+                "users": list(self._entradas),
+                "size": len(self._entradas),
+                "max_models": self.max_modelos,
+                "bytes": self.bytes_totales(),
+                "max_bytes": self.max_bytes,
+                "hits": self.aciertos,
+                "misses": self.fallos,
+            }
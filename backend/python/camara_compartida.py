@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""Cámara compartida entre procesos mediante memoria compartida.
+
+Un único proceso (este script) es dueño de ``cv2.VideoCapture`` y publica cada frame
+en un anillo de ``ranuras`` frames dentro de un bloque de memoria compartida, junto
+con un contador de secuencia. ``captura_imagenes.py`` y ``reconocimiento.py`` leen de
+ahí sin abrir el dispositivo, así que cambiar de página ya no cierra y reabre la
+cámara y ambos servicios pueden usarla a la vez.
+
+El demonio abre la cámara solo mientras algún lector da señales de vida y la libera
+tras ``CAMERA_IDLE_SECONDS`` sin lecturas. Los servicios lo arrancan solos si no
+está corriendo (``CAMERA_MODE=shared``, por defecto); con ``CAMERA_MODE=direct`` se
+usa ``cv2.VideoCapture`` como antes.
+
+    python camara_compartida.py
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+NOMBRE_MEMORIA = os.getenv("CAMERA_SHM_NAME", "traductor_camara")
+MAGICO = 0x54524443
+
+# Header fields (int64), followed by one sequence number per ring slot
+_MAGICO, _SECUENCIA, _ANCHO, _ALTO, _CANALES, _RANURAS, _LATIDO_LECTOR, _LATIDO_DEMONIO, _ABIERTA, _PID = range(10)
+_CAMPOS = 16
+
+
+def _tamano_cabecera(ranuras):
+    # Rounded up to a cache line so frame slots start aligned
+    return (8 * (_CAMPOS + ranuras) + 63) // 64 * 64
+
+
+class MemoriaCamara:
+    """Typed views over the shared block: int64 header, per-slot sequence numbers and frame ring."""
+
+    def __init__(self, shm):
+        self.shm = shm
+        cabecera = np.ndarray((_CAMPOS,), dtype=np.int64, buffer=shm.buf)
+        if cabecera[_MAGICO] != MAGICO:
+            raise ValueError(f"Memoria compartida {shm.name} no contiene frames de cámara")
+        ranuras, alto, ancho, canales = (int(cabecera[i]) for i in (_RANURAS, _ALTO, _ANCHO, _CANALES))
+        self.cabecera = cabecera
+        self.secuencias = np.ndarray((ranuras,), dtype=np.int64, buffer=shm.buf, offset=8 * _CAMPOS)
+        self.frames = np.ndarray((ranuras, alto, ancho, canales), dtype=np.uint8, buffer=shm.buf,
+                                 offset=_tamano_cabecera(ranuras))
+        self.ranuras = ranuras
+
+    @classmethod
+    def crear(cls, nombre, ancho, alto, canales=3, ranuras=8):
+        tamano = _tamano_cabecera(ranuras) + ranuras * alto * ancho * canales
+        shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        cabecera = np.ndarray((_CAMPOS,), dtype=np.int64, buffer=shm.buf)
+        cabecera[:] = 0
+        cabecera[[_ANCHO, _ALTO, _CANALES, _RANURAS, _PID]] = [ancho, alto, canales, ranuras, os.getpid()]
+        cabecera[_MAGICO] = MAGICO
+        return cls(shm)
+
+    @classmethod
+    def conectar(cls, nombre):
+        shm = shared_memory.SharedMemory(name=nombre)
+        # Readers must not unlink the block when they exit; only the daemon owns it
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm)
+
+    @property
+    def demonio_vivo(self):
+        return time.time_ns() - int(self.cabecera[_LATIDO_DEMONIO]) < 2_000_000_000
+
+    def cerrar(self):
+        self.cabecera = self.secuencias = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A reader still holds a frame view; the mapping goes away with the process
+            pass
+
+
+class ClienteCamara:
+    """Reader with the subset of the cv2.VideoCapture API the services use.
+
+    read() blocks until a frame newer than the last one this thread saw is published and
+    returns a read-only view into the ring (no copy). A slot is rewritten only after
+    `ranuras` newer frames, so consumers that keep a frame longer than that must copy it.
+    Each thread tracks its own position, so several pipelines each see every frame.
+    """
+
+    compartida = True
+
+    def __init__(self, memoria, timeout=5.0):
+        self.memoria = memoria
+        self.timeout = timeout
+        self._local = threading.local()
+        self._abierto = True
+
+    def _latido(self):
+        self.memoria.cabecera[_LATIDO_LECTOR] = time.time_ns()
+
+    def esperar_apertura(self, timeout=None):
+        """Signal demand and wait until the daemon has the camera open."""
+        limite = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while time.monotonic() < limite:
+            self._latido()
+            if self.memoria.cabecera[_ABIERTA] == 1 and self.memoria.demonio_vivo:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def isOpened(self):
+        return self._abierto and self.memoria.demonio_vivo and self.memoria.cabecera[_ABIERTA] == 1
+
+    def leer(self, ultima_secuencia=0, timeout=None):
+        """Return (secuencia, frame) for the newest frame after ultima_secuencia, or (None, None) on timeout."""
+        # Local references: release() may drop the memory's views while this thread waits
+        memoria = self.memoria
+        cabecera, secuencias, frames = memoria.cabecera, memoria.secuencias, memoria.frames
+        if cabecera is None:
+            return None, None
+        limite = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while self._abierto:
+            cabecera[_LATIDO_LECTOR] = time.time_ns()
+            secuencia = int(cabecera[_SECUENCIA])
+            if secuencia > ultima_secuencia:
+                ranura = secuencia % memoria.ranuras
+                frame = frames[ranura]
+                if secuencias[ranura] == secuencia:
+                    frame = frame.view()
+                    frame.flags.writeable = False
+                    return secuencia, frame
+            if time.monotonic() >= limite or time.time_ns() - int(cabecera[_LATIDO_DEMONIO]) >= 2_000_000_000:
+                break
+            time.sleep(0.002)
+        return None, None
+
+    def read(self):
+        secuencia, frame = self.leer(getattr(self._local, "secuencia", 0))
+        if frame is None:
+            return False, None
+        self._local.secuencia = secuencia
+        return True, frame
+
+    def release(self):
+        # The daemon keeps the device and closes it itself once no service reads for a while;
+        # only this process's mapping of the shared block goes away
+        self._abierto = False
+        self.memoria.cerrar()
+
+
+def iniciar_demonio():
+    """Start the camera daemon as a detached process."""
+    opciones = {"start_new_session": True} if os.name != "nt" else \
+        {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)], cwd=os.path.dirname(__file__), **opciones)
+
+
+def conectar(nombre=NOMBRE_MEMORIA, iniciar=True, timeout=10.0):
+    """Attach to the camera daemon's memory, starting the daemon if needed; returns a ClienteCamara or None."""
+    limite = time.monotonic() + timeout
+    iniciado = False
+    while time.monotonic() < limite:
+        try:
+            memoria = MemoriaCamara.conectar(nombre)
+            if memoria.demonio_vivo:
+                return ClienteCamara(memoria)
+            memoria.cerrar()
+        except (FileNotFoundError, ValueError):
+            pass
+        if iniciar and not iniciado:
+            print("Starting shared camera daemon...")
+            iniciar_demonio()
+            iniciado = True
+        time.sleep(0.1)
+    return None
+
+
+def abrir_camara(indice=0):
+    """Camera handle for the services: the shared daemon by default, cv2.VideoCapture with CAMERA_MODE=direct."""
+    import cv2
+
+    if os.getenv("CAMERA_MODE", "shared") == "shared":
+        cliente = conectar(timeout=5.0)
+        if cliente is not None:
+            # The daemon owns the device even if it is still opening it; never open it here too
+            if not cliente.esperar_apertura(timeout=3.0):
+                print("Shared camera daemon has not opened the camera yet.")
+            return cliente
+        print("Shared camera daemon not available; opening the device directly.")
+    return cv2.VideoCapture(indice)
+
+
+def encajar(frame, destino):
+    """Write frame into destino scaled to fit without distortion, centred between black bars."""
+    import cv2
+
+    alto, ancho = destino.shape[:2]
+    alto_frame, ancho_frame = frame.shape[:2]
+    escala = min(ancho / ancho_frame, alto / alto_frame)
+    nuevo_ancho = max(1, min(ancho, round(ancho_frame * escala)))
+    nuevo_alto = max(1, min(alto, round(alto_frame * escala)))
+    x, y = (ancho - nuevo_ancho) // 2, (alto - nuevo_alto) // 2
+    destino[:y] = 0
+    destino[y + nuevo_alto:] = 0
+    destino[y:y + nuevo_alto, :x] = 0
+    destino[y:y + nuevo_alto, x + nuevo_ancho:] = 0
+    destino[y:y + nuevo_alto, x:x + nuevo_ancho] = cv2.resize(frame, (nuevo_ancho, nuevo_alto),
+                                                             interpolation=cv2.INTER_AREA)
+
+
+def ejecutar_demonio():
+    import cv2
+
+    # A device index, or a video file / stream URL
+    indice = os.getenv("CAMERA_INDEX", "0")
+    indice = int(indice) if indice.isdigit() else indice
+    ancho = int(os.getenv("CAMERA_WIDTH", "640"))
+    alto = int(os.getenv("CAMERA_HEIGHT", "480"))
+    inactividad = float(os.getenv("CAMERA_IDLE_SECONDS", "10"))
+    vida = float(os.getenv("CAMERA_DAEMON_TTL", "300"))
+
+    try:
+        memoria = MemoriaCamara.crear(NOMBRE_MEMORIA, ancho, alto, ranuras=int(os.getenv("CAMERA_SHM_SLOTS", "8")))
+    except FileExistsError:
+        existente = MemoriaCamara.conectar(NOMBRE_MEMORIA)
+        if existente.demonio_vivo:
+            print("Shared camera daemon already running.")
+            return
+        # Left behind by a daemon that crashed
+        existente.cerrar()
+        shared_memory.SharedMemory(name=NOMBRE_MEMORIA).unlink()
+        memoria = MemoriaCamara.crear(NOMBRE_MEMORIA, ancho, alto, ranuras=int(os.getenv("CAMERA_SHM_SLOTS", "8")))
+
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    cabecera = memoria.cabecera
+    cabecera[_LATIDO_LECTOR] = time.time_ns()
+    cap = None
+    fallos = 0
+    print(f"Shared camera daemon ready ({ancho}x{alto}, {memoria.ranuras} slots, shm '{NOMBRE_MEMORIA}').")
+    try:
+        while not detener.is_set():
+            ahora = time.time_ns()
+            cabecera[_LATIDO_DEMONIO] = ahora
+            sin_lectores = (ahora - int(cabecera[_LATIDO_LECTOR])) / 1e9
+            if sin_lectores > vida:
+                print("No readers for a long time; shared camera daemon exiting.")
+                break
+            if sin_lectores > inactividad:
+                if cap is not None:
+                    cap.release()
+                    cap = None
+                    cabecera[_ABIERTA] = 0
+                    print("No readers; camera released.")
+                time.sleep(0.05)
+                continue
+
+            if cap is None:
+                cap = cv2.VideoCapture(indice)
+                if not cap.isOpened():
+                    print("Error: Unable to access the camera; retrying...")
+                    cap = None
+                    time.sleep(0.5)
+                    continue
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+                cabecera[_ABIERTA] = 1
+                print("Camera opened.")
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                fallos += 1
+                if fallos >= 30:
+                    # Unplugged or grabbed by another program: reopen it
+                    print("Error: Unable to read frames; reopening the camera.")
+                    cap.release()
+                    cap = None
+                    cabecera[_ABIERTA] = 0
+                    fallos = 0
+                time.sleep(0.01)
+                continue
+            fallos = 0
+            secuencia = int(cabecera[_SECUENCIA]) + 1
+            ranura = secuencia % memoria.ranuras
+            # Invalidate the slot while it is rewritten, then publish it
+            memoria.secuencias[ranura] = -1
+            if frame.shape[:2] == (alto, ancho):
+                memoria.frames[ranura] = frame
+            else:
+                # A camera that ignores the requested size is letterboxed, never stretched, so
+                # hand shapes reach MediaPipe with the same proportions as with direct capture
+                encajar(frame, memoria.frames[ranura])
+            memoria.secuencias[ranura] = secuencia
+            cabecera[_SECUENCIA] = secuencia
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cap is not None:
+            cap.release()
+        cabecera[_ABIERTA] = 0
+        cabecera[_LATIDO_DEMONIO] = 0
+        shm = memoria.shm
+        memoria.cerrar()
+        shm.unlink()
+        print("Shared camera daemon stopped.")
+
+
+if __name__ == "__main__":
+    ejecutar_demonio()
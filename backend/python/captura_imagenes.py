@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
-import subprocess
 from flask import Flask, render_template, Response, request, send_from_directory
 import os
 import cv2
-import mediapipe as mp
+import numpy as np
 import sys
 from flask_cors import CORS
 import logging
 import absl.logging
 import threading
 import time
+import functools
+from pipeline_video import DifusorVideo
+from perfiles_video import PERFILES, perfil_de_peticion
+from fuentes_video import abrir_fuente
+from escritor_capturas import ContadorLetras, EscritorImagenes
+from arranque import Arranque, registrar_rutas
+from dataset_landmarks import DatasetLandmarks, ruta_dataset
+from trabajos_entrenamiento import GestorEntrenamientos, crear_blueprint
+from metricas import CONTENT_TYPE as METRICS_CONTENT_TYPE, MedidorFPS, Registro
 
 # Suppress TensorFlow Lite and MediaPipe warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -26,9 +34,54 @@ backend_dir = os.path.dirname(base_dir)
 usuarios_entrenamientos_dir = os.path.join(backend_dir, "usuarios-entrenamientos")
 os.makedirs(usuarios_entrenamientos_dir, exist_ok=True)
 
-# Initialize MediaPipe
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(min_detection_confidence=0.8, min_tracking_confidence=0.8)
+# MediaPipe and the trackers are created by startup() in the background while the port is
+# already open; until they are warmed up only pages, metrics, training and the camera respond
+arranque = Arranque("captura")
+registrar_rutas(app, arranque, exentos=("index", "metrics", "camera_open", "camera_close", "train_model",
+                                        "trabajos_entrenamiento"))
+mp_hands = mp_dibujo = hands = None
+
+# Per-stage latency, throughput and drop metrics exposed at /api/metrics
+metricas = Registro("captura")
+stage_latency = {stage: metricas.histograma("frame_stage_seconds", "Latency of each frame processing stage", stage=stage)
+                 for stage in ("read", "flip_convert", "hands_process", "draw", "encode", "yield")}
+frames_total = metricas.contador("frames_total", "Frames read from the camera")
+images_saved_total = metricas.contador("images_saved_total", "Training images written to disk")
+stream_fps = MedidorFPS(metricas.medidor("stream_fps", "Smoothed rate of streamed frames per second"))
+
+def count_dropped(stage, n):
+    metricas.contador("dropped_frames_total", "Frames overwritten before a stage could consume them", stage=stage).inc(n)
+
+# File numbers per letter are read from disk once; burst captures are written in the background
+contador_letras = ContadorLetras()
+escritor = EscritorImagenes(max_workers=int(os.getenv("CAPTURE_WRITERS", "2")),
+                            al_terminar=lambda ok: images_saved_total.inc() if ok else None)
+burst_max = int(os.getenv("CAPTURE_BURST_MAX", "500"))
+
+# Landmarks of every saved image go straight into the user's dataset, detected with the
+# same static-image settings entrenamiento.py would use on the saved file
+detector = landmarks_de_imagen = None
+detector_lock = threading.Lock()
+datasets = {}
+datasets_lock = threading.Lock()
+images_rejected_total = metricas.contador("images_rejected_total", "Captures discarded because no hand was detected")
+
+def get_dataset(user_id):
+    with datasets_lock:
+        if user_id not in datasets:
+            datasets[user_id] = DatasetLandmarks(ruta_dataset(os.path.join(usuarios_entrenamientos_dir, user_id)))
+        return datasets[user_id]
+
+def prepare_capture(frame):
+    """Resize a camera frame for training and detect its hand; returns (image, landmarks or None)"""
+    # Resizing also copies the frame out of the camera buffer before it is reused
+    image = cv2.resize(frame, (224, 224))
+    with detector_lock:
+        landmarks = landmarks_de_imagen(detector, image)
+    if len(landmarks) == 0:
+        images_rejected_total.inc()
+        return image, None
+    return image, landmarks
 
 # Lazy camera control
 cap = None
@@ -41,7 +94,9 @@ def open_camera():
         return True
     max_retries = 5
     for attempt in range(max_retries):
-        cap = cv2.VideoCapture(0)
+        if cap is not None:
+            cap.release()  # Do not leave a failed handle (or its shared memory mapping) behind
+        cap = abrir_fuente(0)
         if cap.isOpened():
             camera_active = True
             print(f"Camera opened successfully on attempt {attempt + 1}")
@@ -71,14 +126,21 @@ def validate_image(frame):
         return False
     return True
 
-def generate_frames():
+def read_frame():
+    """Read one frame from the camera (runs on the pipeline's reader thread)"""
+    global last_frame_time
     while camera_active and cap is not None and cap.isOpened():
-        ret, frame = cap.read()
+        with stage_latency["read"].medir():
+            ret, frame = cap.read()
         if not ret or not validate_image(frame):
             continue
-        global last_frame_time
         last_frame_time = time.time()
+        frames_total.inc()
+        return True, frame
+    return False, None
 
+def process_frame(frame, dibujar=True):
+    with stage_latency["flip_convert"].medir():
         frame = cv2.flip(frame, 1)  # Flip the image horizontally
         h, w, _ = frame.shape  # Get the height and width of the frame
 
@@ -89,17 +151,35 @@ def generate_frames():
 
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # Convert to RGB for MediaPipe
 
-        # Process the image and detect hands
+    # Process the image and detect hands
+    with stage_latency["hands_process"].medir():
         results = hands.process(frame_rgb)
 
-        if results.multi_hand_landmarks:
+    if dibujar and results.multi_hand_landmarks:
+        with stage_latency["draw"].medir():
             for landmarks in results.multi_hand_landmarks:
-                mp.solutions.drawing_utils.draw_landmarks(frame, landmarks, mp_hands.HAND_CONNECTIONS)
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                mp_dibujo.draw_landmarks(frame, landmarks, mp_hands.HAND_CONNECTIONS)
+    return frame
+
+def encode_frame(frame, codificador):
+    with stage_latency["encode"].medir():
+        jpeg = codificador.codificar(frame)
+    metricas.contador("stream_bytes_total", "JPEG bytes encoded for the video feed",
+                      profile=codificador.perfil.nombre).inc(len(jpeg))
+    return jpeg
+
+# Every /video_feed viewer shares one pipeline, so each camera frame is processed once
+# and encoded once per stream profile being watched
+difusor = DifusorVideo(read_frame, process_frame, encode_frame, nombre="captura", al_descartar=count_dropped,
+                       al_emitir=stream_fps.tick)
+
+def generate_frames(perfil):
+    for frame in difusor.suscribir(perfil):
+        # Time spent in yield is time the client takes to accept the frame
+        with stage_latency["yield"].medir():
+            yield b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(frame)
+            yield frame
+            yield b'\r\n'
 
 @app.route('/')
 def index():
@@ -107,13 +187,28 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
+    try:
+        perfil = perfil_de_peticion(request.args)
+    except ValueError as e:
+        return Response(str(e), status=400)
     if not camera_active:
         return Response("Camera inactive", status=503)
     if cap is None or not cap.isOpened():
         # Try open once to recover
         if not open_camera():
             return Response("Camera open failed", status=503)
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(generate_frames(perfil), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus text-format metrics for the capture stream"""
+    metricas.medidor("viewers", "Clients currently watching the video feed").set(difusor.espectadores)
+    por_perfil = difusor.perfiles()
+    for nombre in PERFILES:
+        metricas.medidor("profile_viewers", "Clients watching the video feed per stream profile",
+                         profile=nombre).set(por_perfil.get(nombre, 0))
+    metricas.medidor("pending_writes", "Captured images queued for the background writer").set(escritor.pendientes)
+    return Response(metricas.exportar(), mimetype=METRICS_CONTENT_TYPE)
 
 @app.route('/camera/open', methods=['POST'])
 def camera_open():
@@ -139,6 +234,26 @@ def inactivity_worker(threshold=10):
 
 threading.Thread(target=inactivity_worker, args=(10,), daemon=True).start()
 
+def startup():
+    global mp_hands, mp_dibujo, hands, detector, landmarks_de_imagen
+    with arranque.fase("mediapipe"):
+        import mediapipe as mp
+        import extraccion_paralela
+        mp_hands = mp.solutions.hands
+        mp_dibujo = mp.solutions.drawing_utils
+        landmarks_de_imagen = extraccion_paralela.landmarks_de_imagen
+    with arranque.fase("trackers"):
+        hands = mp_hands.Hands(min_detection_confidence=0.8, min_tracking_confidence=0.8)
+        detector = extraccion_paralela.crear_hands()
+    # One blank frame through each tracker so the first streamed frame and capture do not pay for their setup
+    with arranque.fase("warm_up"):
+        frame = np.zeros((224, 224, 3), dtype=np.uint8)
+        hands.process(frame)
+        with detector_lock:
+            landmarks_de_imagen(detector, frame)
+
+arranque.iniciar(startup)
+
 import atexit
 atexit.register(close_camera)
 
@@ -164,70 +279,137 @@ def capture_image():
     if not camera_active:
         if not open_camera():
             return "Camera not available", 500
-    # Capture and save the image
-    ret, frame = cap.read()
+    # Capture and save the image; while the stream is running reuse its latest frame
+    # instead of calling cap.read() concurrently with the reader thread
+    frame = difusor.ultimo_frame()
+    ret = frame is not None
+    if not ret:
+        ret, frame = cap.read()
     if not ret:
         print("Error: Failed to capture image from the camera.")
         return "Failed to capture image.", 500
 
+    # Resize for compatibility with training; frames without a hand would be useless for it
+    frame_resized, landmarks = prepare_capture(frame)
+    if landmarks is None:
+        return {"success": False, "message": "No se detectó ninguna mano; la imagen no se guardó."}, 422
+
     # Determine the next sequential filename
-    existing_files = [f for f in os.listdir(letter_dir) if f.endswith(".jpg")]
-    next_number = len(existing_files) + 1
+    next_number = contador_letras.reservar(letter_dir, letter.upper())
     image_filename = f"{letter.upper()}_{next_number}.jpg"
     image_path = os.path.join(letter_dir, image_filename)
 
-    # Save the image - resize and save without color conversion
+    # Save the image without color conversion
     # (imwrite expects BGR format, which is what we have from cap.read())
-    frame_resized = cv2.resize(frame, (224, 224))  # Resize for compatibility with training
     success = cv2.imwrite(image_path, frame_resized)
     
     if not success:
         print(f"Error: Failed to write image at {image_path}")
         return {"success": False, "message": f"Failed to write image to disk"}, 500
 
+    get_dataset(user_id).agregar(letter.upper(), f"{letter.upper()}/{image_filename}", landmarks)
+    images_saved_total.inc()
     print(f"Image saved at {image_path}.")
     return {"success": True, "message": f"Image {image_filename} saved for letter {letter.upper()}", "path": image_path}, 200
 
+def grab_frame(ultimo_seq):
+    """Return (seq, frame) with a camera frame newer than ultimo_seq, from the stream when it is running"""
+    seq, frame = difusor.siguiente_frame(ultimo_seq)
+    if frame is not None:
+        return seq, frame
+    ret, frame = cap.read() if cap is not None else (False, None)
+    return (ultimo_seq + 1, frame) if ret else (ultimo_seq, None)
+
+@app.route('/capture_burst', methods=['POST'])
+def capture_burst():
+    """Capture `count` frames `intervalMs` apart for one letter and queue them for writing.
+
+    Frames without a hand are skipped. Returns once every frame is queued; the files appear
+    on disk shortly after.
+    """
+    user_id = request.args.get('userId')
+    letter = request.args.get('letter')
+    if not user_id or not letter:
+        return {"success": False, "message": "userId and letter are required."}, 400
+    try:
+        count = int(request.args.get('count', 10))
+        interval = float(request.args.get('intervalMs', 100)) / 1000.0
+    except ValueError:
+        return {"success": False, "message": "count and intervalMs must be numbers."}, 400
+    if not 1 <= count <= burst_max:
+        return {"success": False, "message": f"count must be between 1 and {burst_max}."}, 400
+
+    letter = letter.upper()
+    letter_dir = os.path.join(usuarios_entrenamientos_dir, user_id, letter)
+    os.makedirs(letter_dir, exist_ok=True)
+    if not camera_active and not open_camera():
+        return {"success": False, "message": "Camera not available"}, 500
+
+    dataset = get_dataset(user_id)
+    first_number = contador_letras.reservar(letter_dir, letter, count)
+    files = []
+    rejected = 0
+    grabbed = 0
+    seq = 0
+    next_time = time.monotonic()
+    for _ in range(count):
+        time.sleep(max(0.0, next_time - time.monotonic()))
+        next_time += interval
+        seq, frame = grab_frame(seq)
+        if frame is None:
+            break
+        grabbed += 1
+        image, landmarks = prepare_capture(frame)
+        if landmarks is None:
+            rejected += 1
+            continue
+        image_filename = f"{letter}_{first_number + len(files)}.jpg"
+        # The record is only added once its image is on disk, with the time it was captured
+        escritor.encolar(os.path.join(letter_dir, image_filename), image,
+                         al_escribir=functools.partial(dataset.agregar, letter, f"{letter}/{image_filename}",
+                                                       landmarks, time.time()))
+        files.append(image_filename)
+
+    if not grabbed:
+        return {"success": False, "message": "Failed to capture images from the camera."}, 500
+    print(f"Burst of {len(files)} images queued for letter {letter} (user {user_id}), {rejected} without a hand.")
+    return {"success": True, "message": f"{len(files)} images queued for letter {letter}", "queued": len(files),
+            "rejected": rejected, "files": files, "writer": escritor.estado()}, 202
+
+# Training runs in the background on a bounded pool, one job per user at a time
+gestor_entrenamientos = GestorEntrenamientos(
+    os.path.join(os.path.dirname(__file__), "entrenamiento.py"),
+    max_workers=int(os.getenv("TRAINING_WORKERS", "1")))
+app.register_blueprint(crear_blueprint(gestor_entrenamientos))
+
 @app.route('/train_model')
 def train_model():
-    try:
-        # Get the user ID from the query parameters
-        user_id = request.args.get('userId')
-        if not user_id:
-            return {"success": False, "message": "User ID is required."}, 400
-
-        # Use the Python interpreter from the current environment
-        python_executable = sys.executable
-        script_path = os.path.join(os.path.dirname(__file__), "entrenamiento.py")
-
-        # Run the entrenamiento.py script with the user ID
-        result = subprocess.run(
-            [python_executable, script_path, user_id],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-
-        # Log the output for debugging
-        print("Entrenamiento output:", result.stdout)
-        return {"success": True, "message": "Model trained successfully.", "output": result.stdout}, 200
-
-    except subprocess.CalledProcessError as e:
-        # Log the error output for debugging
-        print("Error al entrenar el modelo:", e.stderr)
-        return {"success": False, "message": "Error training model.", "error": e.stderr}, 500
+    # Get the user ID from the query parameters
+    user_id = request.args.get('userId')
+    if not user_id:
+        return {"success": False, "message": "User ID is required."}, 400
 
-    except Exception as e:
-        # Catch any other exceptions and log them
-        print("Unexpected error:", str(e))
-        return {"success": False, "message": "Unexpected error.", "error": str(e)}, 500
+    trabajo, _ = gestor_entrenamientos.enviar(user_id)
+    if request.args.get('wait') != '1':
+        return {"success": True, "message": "Training job queued.", **trabajo.a_dict()}, 202
+
+    # Blocking mode kept for callers that expect the old synchronous behaviour
+    trabajo.finalizado.wait()
+    salida = "\n".join(trabajo.salida)
+    if trabajo.estado == "succeeded":
+        return {"success": True, "message": "Model trained successfully.", "output": salida}, 200
+    print("Error al entrenar el modelo:", trabajo.error)
+    return {"success": False, "message": "Error training model.", "error": salida}, 500
 
 if __name__ == "__main__":
     print("Starting captura_imagenes.py Flask server on port 5001...")
     try:
         from waitress import serve
-        print("Using Waitress WSGI server")
-        serve(app, host='0.0.0.0', port=5001, _quiet=False)
+        # The video feed, training progress streams and waiting /train_model calls each hold a
+        # thread; leave room for them next to health and control requests
+        threads = int(os.getenv("SERVER_THREADS", "16"))
+        print(f"Using Waitress WSGI server with {threads} threads")
+        serve(app, host='0.0.0.0', port=5001, threads=threads, _quiet=False)
     except ImportError:
         print("Waitress not available, using Flask development server")
         app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Vectores de características a partir de los landmarks de MediaPipe.
+
+Un único lugar convierte los resultados de ``Hands.process`` en vectores float32 de
+63 valores (21 puntos x, y, z) y aplica la normalización del modelo, para que el
+entrenamiento, el reconocimiento en vivo, la API de predicción y la transcripción
+entreguen al modelo exactamente las mismas entradas. Las funciones aceptan un
+arreglo de salida ya reservado para no crear objetos nuevos en cada frame.
+
+La normalización se elige al entrenar y se guarda junto al modelo en
+``caracteristicas.json``; los modelos sin ese archivo usan coordenadas sin normalizar.
+"""
+import json
+import os
+
+import numpy as np
+
+NUM_PUNTOS = 21
+NUM_CARACTERISTICAS = NUM_PUNTOS * 3  # x, y, z per point
+PUNTO_MUNECA = 0
+PUNTO_BASE_MEDIO = 9  # Middle finger MCP; wrist-to-MCP distance is the palm size
+NORMALIZACIONES = ("none", "wrist")
+ARCHIVO_CONFIG = "caracteristicas.json"
+
+
+def vector_mano(hand_landmarks, salida=None):
+    """Write one hand's landmarks into salida (63 float32, allocated if None) and return it."""
+    if salida is None:
+        salida = np.empty(NUM_CARACTERISTICAS, dtype=np.float32)
+    salida[:] = [c for punto in hand_landmarks.landmark for c in (punto.x, punto.y, punto.z)]
+    return salida
+
+
+def matriz_manos(lista_landmarks, salida=None):
+    """Convert a list of hands (one frame, or one hand per frame) into an (n, 63) float32 array."""
+    if salida is None:
+        salida = np.empty((len(lista_landmarks), NUM_CARACTERISTICAS), dtype=np.float32)
+    for fila, hand_landmarks in zip(salida, lista_landmarks):
+        vector_mano(hand_landmarks, fila)
+    return salida[:len(lista_landmarks)]
+
+
+def normalizar(datos, modo="none", salida=None):
+    """Apply a model's normalization to one (63,) vector or an (n, 63) batch.
+
+    "wrist" moves the wrist to the origin and divides by the palm size, so the features do
+    not depend on where the hand is in the frame or how close it is to the camera. The
+    result is written into salida when given (any shape with the same number of values,
+    e.g. a (1, 63) model input row) and returned with salida's shape.
+    """
+    if modo not in NORMALIZACIONES:
+        raise ValueError(f"Normalización desconocida: {modo}. Opciones: {', '.join(NORMALIZACIONES)}")
+    datos = np.asarray(datos, dtype=np.float32)
+    if salida is None:
+        if modo == "none":
+            return datos
+        salida = np.empty(datos.shape, dtype=np.float32)
+    if modo == "none":
+        salida.reshape(datos.shape)[...] = datos
+        return salida
+
+    puntos = datos.reshape(-1, NUM_PUNTOS, 3)
+    resultado = salida.reshape(-1, NUM_PUNTOS, 3)
+    np.subtract(puntos, puntos[:, PUNTO_MUNECA:PUNTO_MUNECA + 1, :], out=resultado)
+    escala = np.linalg.norm(resultado[:, PUNTO_BASE_MEDIO, :], axis=1)
+    np.maximum(escala, 1e-6, out=escala)
+    resultado /= escala[:, None, None]
+    return salida
+
+
+def ruta_config(model_path):
+    return os.path.join(os.path.dirname(model_path), ARCHIVO_CONFIG)
+
+
+def guardar_config(model_path, modo, secuencias=None, imagenes=None):
+    """Record next to a model the normalization it was trained with, its sequence model (if any)
+    and the images it has learned ({rel_path: (mtime, size)})."""
+    config = {"normalization": modo}
+    if secuencias:
+        config["sequence"] = secuencias
+    if imagenes is not None:
+        config["images"] = {ruta: [mtime, size] for ruta, (mtime, size) in imagenes.items()}
+    with open(ruta_config(model_path), "w") as f:
+        json.dump(config, f)
+
+
+def leer_config(model_path):
+    """The feature configuration stored next to model_path; {} for models trained without one."""
+    ruta = ruta_config(model_path)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta) as f:
+        return json.load(f)
+
+
+def imagenes_entrenadas(model_path):
+    """{rel_path: (mtime, size)} of the images the model at model_path has learned, or None if unrecorded."""
+    imagenes = leer_config(model_path).get("images")
+    if imagenes is None:
+        return None
+    return {ruta: (mtime, size) for ruta, (mtime, size) in imagenes.items()}
+
+
+def cargar_config(model_path):
+    """Return the normalization the model at model_path expects ("none" if unrecorded)."""
+    modo = leer_config(model_path).get("normalization", "none")
+    if modo not in NORMALIZACIONES:
+        raise ValueError(f"Normalización desconocida en {ruta_config(model_path)}: {modo}")
+    return modo
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Dataset de landmarks por usuario escrito en el momento de la captura.
+
+``captura_imagenes.py`` detecta la mano en cada imagen que guarda y agrega sus
+landmarks a ``usuarios-entrenamientos/<user>/landmarks.dat``: un archivo de solo
+agregado con una cabecera fija y registros de tamaño fijo (letra, imagen de origen,
+hora de captura y 63 floats), que se puede abrir con ``np.memmap`` sin copiarlo.
+``entrenamiento.py`` toma de aquí los landmarks de las imágenes capturadas y solo
+pasa por MediaPipe las que no estén en el dataset.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS
+
+NOMBRE_ARCHIVO = "landmarks.dat"
+MAGICO = b"TRLM"
+VERSION = 1
+TAMANO_CABECERA = 64
+DTYPE_REGISTRO = np.dtype([
+    ("etiqueta", "<U4"),
+    ("imagen", "<U64"),  # path relative to the user directory, e.g. "B/B_12.jpg"
+    ("tiempo", "<f8"),
+    ("landmarks", "<f4", (NUM_CARACTERISTICAS,)),
+])
+
+
+def ruta_dataset(user_dir):
+    return os.path.join(user_dir, NOMBRE_ARCHIVO)
+
+
+def _cabecera():
+    cabecera = MAGICO + np.array([VERSION, DTYPE_REGISTRO.itemsize], dtype="<u4").tobytes()
+    return cabecera.ljust(TAMANO_CABECERA, b"\0")
+
+
+def _validar_cabecera(datos, ruta):
+    version, tamano = np.frombuffer(datos[4:12], dtype="<u4")
+    if datos[:4] != MAGICO or version != VERSION or tamano != DTYPE_REGISTRO.itemsize:
+        raise ValueError(f"{ruta} no es un dataset de landmarks compatible")
+
+
+class DatasetLandmarks:
+    """Append-only writer for one user's dataset file (one writer process per file)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._preparado = False
+
+    def _preparar(self):
+        if not os.path.exists(self.ruta) or os.path.getsize(self.ruta) < TAMANO_CABECERA:
+            with open(self.ruta, "wb") as f:
+                f.write(_cabecera())
+        else:
+            with open(self.ruta, "r+b") as f:
+                _validar_cabecera(f.read(TAMANO_CABECERA), self.ruta)
+                # Drop a record left half-written by a crash so the file stays aligned
+                sobrante = (os.path.getsize(self.ruta) - TAMANO_CABECERA) % DTYPE_REGISTRO.itemsize
+                if sobrante:
+                    f.truncate(os.path.getsize(self.ruta) - sobrante)
+        self._preparado = True
+
+    def agregar(self, etiqueta, imagen, landmarks, tiempo=None):
+        """Append one record per row of landmarks, an (n, 63) array, all pointing to the same image.
+
+        tiempo is the capture time (now if None); sequence windows are cut from it.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, NUM_CARACTERISTICAS)
+        if len(imagen) > 64 or len(etiqueta) > 4:
+            raise ValueError(f"Referencia demasiado larga para el dataset: {etiqueta} {imagen}")
+        registros = np.zeros(len(landmarks), dtype=DTYPE_REGISTRO)
+        registros["etiqueta"] = etiqueta
+        registros["imagen"] = imagen
+        registros["tiempo"] = time.time() if tiempo is None else tiempo
+        registros["landmarks"] = landmarks
+        with self._lock:
+            if not self._preparado:
+                self._preparar()
+            with open(self.ruta, "ab") as f:
+                f.write(registros.tobytes())
+        return len(registros)
+
+
+def leer_dataset(ruta):
+    """Memory-map every complete record of a dataset file (read-only); empty array if missing."""
+    if not os.path.exists(ruta):
+        return np.zeros(0, dtype=DTYPE_REGISTRO)
+    tamano = os.path.getsize(ruta)
+    with open(ruta, "rb") as f:
+        _validar_cabecera(f.read(TAMANO_CABECERA), ruta)
+    n = (tamano - TAMANO_CABECERA) // DTYPE_REGISTRO.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=DTYPE_REGISTRO)
+    return np.memmap(ruta, dtype=DTYPE_REGISTRO, mode="r", offset=TAMANO_CABECERA, shape=(n,))
+
+
+def registros_vigentes(registros):
+    """Indices of the records of each image's latest capture, grouped by image path.
+
+    Paths are reused once an image is deleted and its letter's counter starts over, so
+    older records of the same path describe a picture that no longer exists. The records
+    of one capture (one per hand) share its time.
+    """
+    if len(registros) == 0:
+        return np.zeros(0, dtype=np.intp)
+    imagenes = np.asarray(registros["imagen"])
+    tiempos = np.asarray(registros["tiempo"])
+    orden = np.lexsort((np.arange(len(registros)), tiempos, imagenes))
+    _, inicios = np.unique(imagenes[orden], return_index=True)
+    fines = np.append(inicios[1:], len(orden)) - 1
+    ultimo = np.repeat(tiempos[orden][fines], fines - inicios + 1)
+    return orden[tiempos[orden] == ultimo]
+
+
+def landmarks_por_imagen(ruta):
+    """Return {image rel_path: (n, 63) float32 rows} from a dataset file; {} if missing or unreadable."""
+    try:
+        registros = leer_dataset(ruta)
+    except (OSError, ValueError) as e:
+        print(f"Dataset de landmarks inválido, se ignorará: {e}")
+        return {}
+    if len(registros) == 0:
+        return {}
+    vigentes = registros_vigentes(registros)
+    unicas, inicios = np.unique(registros["imagen"][vigentes], return_index=True)
+    grupos = np.split(np.asarray(registros["landmarks"][vigentes], dtype=np.float32), inicios[1:])
+    return dict(zip(unicas.tolist(), grupos))
@@ -1,123 +1,363 @@
 # -*- coding: utf-8 -*-
-import cv2
+import argparse
+import json
 import os
-import mediapipe as mp
+import time
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from keras.models import Sequential
-from keras.layers import Dense, Dropout
-from keras.optimizers import Adam
 import sys
+from cache_landmarks import cargar_cache, guardar_cache, listar_imagenes, es_vigente
+from caracteristicas import NORMALIZACIONES, NUM_CARACTERISTICAS, cargar_config, guardar_config, imagenes_entrenadas, normalizar
+from dataset_landmarks import landmarks_por_imagen, leer_dataset, registros_vigentes, ruta_dataset
+from extraccion_paralela import agrupar_por_letra, extraer_en_paralelo, numero_workers
+from reglas_gestos import GESTOS_DINAMICOS
+from secuencias_gestos import ARCHIVO_MODELO as ARCHIVO_SECUENCIAS, VENTANA, configuracion, ventanas_de_registros
+from trabajos_entrenamiento import PREFIJO_PROGRESO
+from versiones_modelo import publicar_version, version_actual
 
-# Enable eager execution
-tf.config.run_functions_eagerly(True)
-
-# Get the user ID from the command-line arguments
-if len(sys.argv) < 2:
-    raise ValueError("User ID is required as a command-line argument.")
-user_id = sys.argv[1]
-
-# Directory for gesture images and user-specific model paths
-base_dir = os.path.dirname(__file__)
-backend_dir = os.path.dirname(base_dir)
-usuarios_entrenamientos_dir = os.path.join(backend_dir, "usuarios-entrenamientos")
-user_training_dir = os.path.join(usuarios_entrenamientos_dir, user_id)
-modelo_dir = os.path.join(backend_dir, "modelos", user_id)
-modelo_path = os.path.join(modelo_dir, f"{user_id}_modelo_gestos.h5")
-mapa_etiquetas_path = os.path.join(modelo_dir, f"{user_id}_mapa_etiquetas.npy")
-
-# Ensure the model directory exists
-os.makedirs(modelo_dir, exist_ok=True)
-
-print(f"\n=== Entrenamiento del Modelo para Usuario {user_id} ===")
-print(f"Leyendo datos de: {user_training_dir}")
-print(f"Guardando modelo en: {modelo_dir}\n")
-
-# Initialize MediaPipe
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands()
-
-# Validate directories and files
-if not os.path.exists(user_training_dir):
-    raise FileNotFoundError(f"El directorio de gestos para el usuario {user_id} no existe: {user_training_dir}")
-
-if len(os.listdir(user_training_dir)) == 0:
-    raise FileNotFoundError(f"No se encontraron imágenes en el directorio: {user_training_dir}")
-
-# Collect data and labels
-datos = []
-etiquetas = []
-
-for letter in os.listdir(user_training_dir):
-    letter_dir = os.path.join(user_training_dir, letter)
-    if not os.path.isdir(letter_dir):
-        continue
-
-    for archivo in os.listdir(letter_dir):
-        if not archivo.endswith(".jpg"):
-            continue
-
-        image_path = os.path.join(letter_dir, archivo)
-        imagen = cv2.imread(image_path)
-        if imagen is None:
-            print(f"Error al leer la imagen: {archivo}")
-            continue
-
-        imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-        resultados = hands.process(imagen_rgb)
-
-        if resultados.multi_hand_landmarks:
-            for landmarks in resultados.multi_hand_landmarks:
-                gesto = []
-                for punto in landmarks.landmark:
-                    gesto.extend([punto.x, punto.y, punto.z])
-                datos.append(gesto)
-                etiquetas.append(letter)
-        else:
-            print(f"No se detectaron manos en la imagen: {archivo}")
-
-# Validate data
-if len(datos) == 0:
-    raise ValueError("No se encontraron datos de gestos. Asegúrate de que las imágenes estén correctamente capturadas.")
-if len(datos) != len(etiquetas):
-    raise ValueError("El número de datos y etiquetas no coincide. Verifica las imágenes y sus etiquetas.")
-
-# Convert data and labels to numpy arrays
-datos = np.array(datos)
-etiquetas = np.array(etiquetas)
-
-# Map labels to integers
-unicos = np.unique(etiquetas)
-if len(unicos) == 0:
-    raise ValueError("No se encontraron etiquetas únicas. Asegúrate de que las imágenes estén etiquetadas correctamente.")
-mapa_etiquetas = {etiqueta: i for i, etiqueta in enumerate(unicos)}
-etiquetas_numericas = np.array([mapa_etiquetas[e] for e in etiquetas])
-
-# Build or load the model
-if os.path.exists(modelo_path) and os.path.exists(mapa_etiquetas_path):
-    modelo = keras.models.load_model(modelo_path)
-    mapa_etiquetas = np.load(mapa_etiquetas_path, allow_pickle=True).item()
-    print("Modelo y mapa de etiquetas cargados.")
-else:
-    modelo = Sequential([
-        Dense(256, activation="relu", input_shape=(len(datos[0]),)),
-        Dropout(0.4),
-        Dense(128, activation="relu"),
-        Dropout(0.3),
-        Dense(64, activation="relu"),
-        Dropout(0.2),
-        Dense(len(unicos), activation="softmax")
+# TensorFlow and Keras are imported inside main() so that extraction worker
+# processes (which re-import this module when spawned) stay lightweight.
+
+
+def ampliar_salida(keras, modelo, num_clases):
+    """Return a model that reuses modelo's hidden layers with a softmax head of num_clases outputs.
+
+    The weights of the classes the old head already knew are copied over, so only the new
+    columns start from scratch.
+    """
+    cabeza = modelo.layers[-1]
+    kernel, bias = cabeza.get_weights()
+    nueva_cabeza = keras.layers.Dense(num_clases, activation="softmax", name=f"salida_{num_clases}")
+    ampliado = keras.Sequential([keras.Input(shape=modelo.input_shape[1:])] + modelo.layers[:-1] + [nueva_cabeza])
+    nuevo_kernel, nuevo_bias = nueva_cabeza.get_weights()
+    nuevo_kernel[:, :kernel.shape[1]] = kernel
+    nuevo_bias[:bias.shape[0]] = bias
+    nueva_cabeza.set_weights([nuevo_kernel, nuevo_bias])
+    return ampliado
+
+
+def seleccionar_filas_incrementales(es_nueva, etiquetas_numericas, proporcion_repaso, semilla=0):
+    """Indices of every new row plus a class-balanced replay sample of old rows.
+
+    The replay sample has about proporcion_repaso times as many rows as there are new ones
+    (at least one per old class), so earlier letters are not forgotten.
+    """
+    rng = np.random.default_rng(semilla)
+    nuevas = np.flatnonzero(es_nueva)
+    antiguas = np.flatnonzero(~es_nueva)
+    clases = np.unique(etiquetas_numericas[antiguas])
+    if len(clases) == 0:
+        return nuevas
+    por_clase = max(1, int(np.ceil(len(nuevas) * proporcion_repaso / len(clases))))
+    repaso = []
+    for clase in clases:
+        candidatas = antiguas[etiquetas_numericas[antiguas] == clase]
+        repaso.append(rng.choice(candidatas, size=min(por_clase, len(candidatas)), replace=False))
+    return np.sort(np.concatenate([nuevas] + repaso))
+
+
+def entrenar_rapido(tf, keras, modelo, datos, etiquetas_numericas, args, callbacks):
+    """Graph-mode training from a tf.data pipeline with early stopping on validation loss."""
+    # Images are listed letter by letter, so shuffle before splitting; validation_split
+    # would otherwise hold out only the last letters
+    rng = np.random.default_rng(0)
+    orden = rng.permutation(len(datos))
+    n_val = int(len(datos) * 0.2)
+    val_idx, train_idx = orden[:n_val], orden[n_val:]
+
+    datos = datos.astype(np.float32)
+    entrenamiento = (tf.data.Dataset.from_tensor_slices((datos[train_idx], etiquetas_numericas[train_idx]))
+                     .cache()
+                     .shuffle(len(train_idx), seed=0, reshuffle_each_iteration=True)
+                     .batch(args.batch_size)
+                     .prefetch(tf.data.AUTOTUNE))
+    validacion = None
+    monitor = "loss"
+    if n_val > 0:
+        validacion = (tf.data.Dataset.from_tensor_slices((datos[val_idx], etiquetas_numericas[val_idx]))
+                      .batch(args.batch_size)
+                      .cache()
+                      .prefetch(tf.data.AUTOTUNE))
+        monitor = "val_loss"
+
+    parada = keras.callbacks.EarlyStopping(monitor=monitor, patience=args.patience, restore_best_weights=True)
+    modelo.fit(entrenamiento, validation_data=validacion, epochs=args.epochs, verbose=2,
+               callbacks=callbacks + [parada])
+
+
+def entrenar_secuencias(tf, keras, user_training_dir, imagenes_vigentes, args):
+    """Train the optional sequence model on capture bursts; returns (modelo, config entry) or None."""
+    if args.sequence_window <= 1:
+        return None
+    try:
+        registros = leer_dataset(ruta_dataset(user_training_dir))
+    except (OSError, ValueError) as e:
+        print(f"Dataset de captura inválido; no se entrenará el modelo de secuencias: {e}")
+        return None
+    # One record per existing image, from its latest capture (images with two hands have two
+    # records with the same time); same rule as landmarks_por_imagen
+    vigentes = registros_vigentes(registros)
+    _, primeros = np.unique(registros["imagen"][vigentes], return_index=True)
+    primeros = vigentes[primeros]
+    primeros = primeros[np.isin(registros["imagen"][primeros], list(imagenes_vigentes))]
+    datos, nombres, intervalo = ventanas_de_registros(
+        registros["etiqueta"][primeros], registros["tiempo"][primeros],
+        np.asarray(registros["landmarks"][primeros], dtype=np.float32), ventana=args.sequence_window)
+    clases = np.unique(nombres)
+    if len(clases) < 2 or not GESTOS_DINAMICOS.intersection(clases.tolist()):
+        print("Modelo de secuencias: no hay ráfagas suficientes de al menos una letra dinámica "
+              f"({len(datos)} ventanas de {args.sequence_window} frames); se omite.")
+        return None
+    print(f"Modelo de secuencias: {len(datos)} ventanas de {args.sequence_window} frames "
+          f"(cada {intervalo:.3f}s), letras {', '.join(clases.tolist())}")
+
+    etiquetas_numericas = np.searchsorted(clases, nombres)
+    modelo = keras.Sequential([
+        keras.layers.Dense(128, activation="relu", input_shape=(datos.shape[1],)),
+        keras.layers.Dropout(0.3),
+        keras.layers.Dense(64, activation="relu"),
+        keras.layers.Dense(len(clases), activation="softmax")
     ])
-    modelo.compile(optimizer=Adam(learning_rate=0.001), loss="sparse_categorical_crossentropy", metrics=["accuracy"])
-
-# Train the model
-try:
-    modelo.fit(datos, etiquetas_numericas, epochs=50, batch_size=32, validation_split=0.2, shuffle=True)
-except Exception as e:
-    raise RuntimeError(f"Error durante el entrenamiento del modelo: {e}")
-
-# Save the model and label map
-modelo.save(modelo_path)
-np.save(mapa_etiquetas_path, mapa_etiquetas)
-print(f"Entrenamiento completo. Modelo guardado en {modelo_path}.")
\ No newline at end of file
+    modelo.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001), loss="sparse_categorical_crossentropy",
+                   metrics=["accuracy"])
+    entrenar_rapido(tf, keras, modelo, datos, etiquetas_numericas, args, [])
+    return modelo, configuracion(clases, args.sequence_window, intervalo)
+
+
+def parse_args(argv):
+    """Command-line options; defaults come from environment variables so callers can pass only the user ID."""
+    parser = argparse.ArgumentParser(description="Entrena el modelo de gestos de un usuario")
+    parser.add_argument("user_id")
+    parser.add_argument("--mode", choices=("fast", "eager"), default=os.getenv("TRAIN_MODE", "fast"),
+                        help="fast: graph mode with tf.data and early stopping; eager: original behaviour")
+    parser.add_argument("--epochs", type=int, default=int(os.getenv("TRAIN_EPOCHS", "50")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("TRAIN_BATCH_SIZE", "32")))
+    parser.add_argument("--patience", type=int, default=int(os.getenv("TRAIN_PATIENCE", "10")),
+                        help="Epochs without val_loss improvement before stopping (fast mode)")
+    parser.add_argument("--full", action="store_true", default=os.getenv("TRAIN_INCREMENTAL", "1") == "0",
+                        help="Retrain from scratch on the whole dataset instead of fine-tuning the existing model")
+    parser.add_argument("--replay-ratio", type=float, default=float(os.getenv("TRAIN_REPLAY_RATIO", "1.0")),
+                        help="Old rows replayed per new row when fine-tuning")
+    parser.add_argument("--normalization", choices=NORMALIZACIONES, default=os.getenv("TRAIN_NORMALIZATION"),
+                        help="Landmark normalization (default: the current model's, or none)")
+    parser.add_argument("--sequence-window", type=int, default=int(os.getenv("TRAIN_SEQUENCE_WINDOW", str(VENTANA))),
+                        help="Frames per window of the dynamic-gesture sequence model (0 disables it)")
+    return parser.parse_args(argv)
+
+
+def main():
+    # Get the user ID from the command-line arguments
+    if len(sys.argv) < 2:
+        raise ValueError("User ID is required as a command-line argument.")
+    args = parse_args(sys.argv[1:])
+    user_id = args.user_id
+
+    # Directory for gesture images and user-specific model paths
+    base_dir = os.path.dirname(__file__)
+    backend_dir = os.path.dirname(base_dir)
+    usuarios_entrenamientos_dir = os.path.join(backend_dir, "usuarios-entrenamientos")
+    user_training_dir = os.path.join(usuarios_entrenamientos_dir, user_id)
+    modelo_dir = os.path.join(backend_dir, "modelos", user_id)
+    modelo_path = os.path.join(modelo_dir, f"{user_id}_modelo_gestos.h5")
+    mapa_etiquetas_path = os.path.join(modelo_dir, f"{user_id}_mapa_etiquetas.npy")
+
+    # Ensure the model directory exists
+    os.makedirs(modelo_dir, exist_ok=True)
+
+    print(f"\n=== Entrenamiento del Modelo para Usuario {user_id} ===")
+    print(f"Leyendo datos de: {user_training_dir}")
+    print(f"Guardando modelo en: {modelo_dir}\n")
+
+    # Validate directories and files
+    if not os.path.exists(user_training_dir):
+        raise FileNotFoundError(f"El directorio de gestos para el usuario {user_id} no existe: {user_training_dir}")
+
+    if len(os.listdir(user_training_dir)) == 0:
+        raise FileNotFoundError(f"No se encontraron imágenes en el directorio: {user_training_dir}")
+
+    # Collect data and labels, reusing cached landmarks for unchanged images
+    cache_path = os.path.join(modelo_dir, f"{user_id}_cache_landmarks.npz")
+    cache = cargar_cache(cache_path)
+    imagenes = listar_imagenes(user_training_dir)
+    pendientes = [img for img in imagenes if not es_vigente(cache, img[1], img[3], img[4])]
+
+    # Images saved by captura_imagenes.py already have their landmarks in the capture dataset
+    capturados = landmarks_por_imagen(ruta_dataset(user_training_dir))
+    extraidos = {rel_path: (mtime, size, capturados[rel_path])
+                 for _, rel_path, _, mtime, size in pendientes if rel_path in capturados}
+    pendientes = [img for img in pendientes if img[1] not in extraidos]
+    workers = numero_workers()
+    print(f"Imágenes en cache: {len(imagenes) - len(pendientes) - len(extraidos)}, "
+          f"del dataset de captura: {len(extraidos)}, por procesar: {len(pendientes)} ({workers} procesos)")
+
+    # Only new or modified images without capture-time landmarks go through MediaPipe,
+    # sharded by letter across workers
+    lotes = agrupar_por_letra(pendientes)
+    resultados = extraer_en_paralelo([[img[2] for img in lote] for lote in lotes], workers)
+    for lote, filas_lote in zip(lotes, resultados):
+        for (_, rel_path, _, mtime, size), filas in zip(lote, filas_lote):
+            if filas is not None:
+                extraidos[rel_path] = (mtime, size, filas)
+
+    # Images that no longer exist are dropped from the cache here
+    nuevas_entradas = {}
+    for _, rel_path, _, mtime, size in imagenes:
+        if es_vigente(cache, rel_path, mtime, size):
+            nuevas_entradas[rel_path] = cache[rel_path]
+        elif rel_path in extraidos:
+            nuevas_entradas[rel_path] = extraidos[rel_path]
+
+    if pendientes or extraidos or len(nuevas_entradas) != len(cache):
+        guardar_cache(cache_path, nuevas_entradas)
+
+    # Build the N x 63 matrix straight from the cached arrays
+    vigentes = [(letter, nuevas_entradas[rel_path][2], rel_path) for letter, rel_path, _, _, _ in imagenes
+                if rel_path in nuevas_entradas]
+    datos = np.concatenate([filas for _, filas, _ in vigentes]) if vigentes else np.zeros((0, NUM_CARACTERISTICAS))
+    etiquetas = [letter for letter, filas, _ in vigentes for _ in range(len(filas))]
+
+    # Validate data
+    if len(datos) == 0:
+        raise ValueError("No se encontraron datos de gestos. Asegúrate de que las imágenes estén correctamente capturadas.")
+    if len(datos) != len(etiquetas):
+        raise ValueError("El número de datos y etiquetas no coincide. Verifica las imágenes y sus etiquetas.")
+
+    # Convert data and labels to numpy arrays
+    datos = np.array(datos)
+    etiquetas = np.array(etiquetas)
+
+    # Map labels to integers
+    unicos = np.unique(etiquetas)
+    if len(unicos) == 0:
+        raise ValueError("No se encontraron etiquetas únicas. Asegúrate de que las imágenes estén etiquetadas correctamente.")
+    mapa_etiquetas = {etiqueta: i for i, etiqueta in enumerate(unicos)}
+    etiquetas_numericas = np.array([mapa_etiquetas[e] for e in etiquetas])
+
+    # Imported only now so that extraction workers are forked before TensorFlow is loaded
+    import tensorflow as tf
+    from tensorflow import keras
+    from keras.models import Sequential
+    from keras.layers import Dense, Dropout
+    from keras.optimizers import Adam
+
+    # Eager execution is only kept for the legacy mode; fast mode runs compiled tf.functions
+    tf.config.run_functions_eagerly(args.mode == "eager")
+
+    # The published version takes precedence; models trained before versioning only have the flat files
+    publicada = version_actual(modelo_dir)
+    if publicada is not None:
+        _, modelo_path, mapa_etiquetas_path = publicada
+
+    # Recognition normalizes its input the way the published model records, so a model can only
+    # be fine-tuned with the normalization it was trained with
+    normalizacion_anterior = cargar_config(modelo_path) if os.path.exists(modelo_path) else None
+    normalizacion = args.normalization or normalizacion_anterior or "none"
+
+    # Rows of images the published model has not learned (new, modified, or added after the version
+    # it was rolled back to), used by incremental fine-tuning. Models published before the trained
+    # images were recorded fall back to the images extracted in this run.
+    entrenadas = imagenes_entrenadas(modelo_path) if os.path.exists(modelo_path) else None
+    if entrenadas is None:
+        imagenes_nuevas = set(extraidos)
+    else:
+        imagenes_nuevas = {rel_path for rel_path, (mtime, size, _) in nuevas_entradas.items()
+                           if entrenadas.get(rel_path) != (mtime, size)}
+    es_nueva = np.array([rel_path in imagenes_nuevas for _, filas, rel_path in vigentes for _ in range(len(filas))],
+                        dtype=bool)
+
+    # Build the model, or fine-tune the existing one on what changed since the last training
+    modelo = None
+    if not args.full and os.path.exists(modelo_path) and os.path.exists(mapa_etiquetas_path):
+        modelo = keras.models.load_model(modelo_path)
+        mapa_anterior = np.load(mapa_etiquetas_path, allow_pickle=True).item()
+        print("Modelo y mapa de etiquetas cargados.")
+        if modelo.output_shape[-1] != len(mapa_anterior):
+            print("El modelo guardado no coincide con su mapa de etiquetas; se entrenará desde cero.")
+            modelo = None
+        elif normalizacion != normalizacion_anterior:
+            print(f"El modelo guardado usa la normalización '{normalizacion_anterior}'; "
+                  f"se entrenará desde cero con '{normalizacion}'.")
+            modelo = None
+
+    if modelo is not None:
+        # Existing letters keep their output index; new letters are appended to the head
+        mapa_etiquetas = dict(mapa_anterior)
+        nuevas_clases = [e for e in unicos if e not in mapa_etiquetas]
+        for etiqueta in nuevas_clases:
+            mapa_etiquetas[etiqueta] = len(mapa_etiquetas)
+        etiquetas_numericas = np.array([mapa_etiquetas[e] for e in etiquetas])
+
+        if not es_nueva.any() and not nuevas_clases:
+            print("No hay imágenes nuevas ni modificadas; el modelo ya está actualizado.")
+            return
+        if nuevas_clases:
+            print(f"Nuevas letras: {', '.join(str(e) for e in nuevas_clases)}. Ampliando la capa de salida.")
+            modelo = ampliar_salida(keras, modelo, len(mapa_etiquetas))
+            modelo.compile(optimizer=Adam(learning_rate=0.001), loss="sparse_categorical_crossentropy",
+                           metrics=["accuracy"])
+
+        seleccion = seleccionar_filas_incrementales(es_nueva, etiquetas_numericas, args.replay_ratio)
+        print(f"Ajuste incremental: {int(es_nueva.sum())} filas nuevas + "
+              f"{len(seleccion) - int(es_nueva.sum())} de repaso (de {len(datos)} en total)")
+        datos, etiquetas_numericas = datos[seleccion], etiquetas_numericas[seleccion]
+    else:
+        modelo = Sequential([
+            Dense(256, activation="relu", input_shape=(len(datos[0]),)),
+            Dropout(0.4),
+            Dense(128, activation="relu"),
+            Dropout(0.3),
+            Dense(64, activation="relu"),
+            Dropout(0.2),
+            Dense(len(unicos), activation="softmax")
+        ])
+        modelo.compile(optimizer=Adam(learning_rate=0.001), loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+
+    print(f"Normalización de landmarks: {normalizacion}")
+    datos = normalizar(datos, normalizacion)
+
+    epocas = args.epochs
+    tiempos_epoca = []
+
+    class ReportarProgreso(keras.callbacks.Callback):
+        """Print one machine-readable line per epoch for the training job manager."""
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.inicio_epoca = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            tiempos_epoca.append(time.perf_counter() - self.inicio_epoca)
+            metricas = {k: float(v) for k, v in (logs or {}).items()}
+            print(PREFIJO_PROGRESO + json.dumps({"epoch": epoch + 1, "epochs": epocas, "metrics": metricas,
+                                                 "epoch_seconds": tiempos_epoca[-1]}),
+                  flush=True)
+
+    # Train the model
+    inicio_entrenamiento = time.perf_counter()
+    try:
+        if args.mode == "eager":
+            modelo.fit(datos, etiquetas_numericas, epochs=epocas, batch_size=args.batch_size, validation_split=0.2,
+                       shuffle=True, verbose=2, callbacks=[ReportarProgreso()])
+        else:
+            entrenar_rapido(tf, keras, modelo, datos, etiquetas_numericas, args, [ReportarProgreso()])
+    except Exception as e:
+        raise RuntimeError(f"Error durante el entrenamiento del modelo: {e}")
+    total = time.perf_counter() - inicio_entrenamiento
+    print(f"Entrenamiento ({args.mode}): {len(tiempos_epoca)} épocas en {total:.2f}s "
+          f"({total / max(1, len(tiempos_epoca)):.3f}s por época)")
+
+    secuencias = entrenar_secuencias(tf, keras, user_training_dir, nuevas_entradas, args)
+
+    # Save the model and label map as a new version; the pointer switches only once both are on disk
+    def guardar(ruta_modelo, ruta_mapa):
+        modelo.save(ruta_modelo)
+        np.save(ruta_mapa, mapa_etiquetas)
+        if secuencias is not None:
+            secuencias[0].save(os.path.join(os.path.dirname(ruta_modelo), ARCHIVO_SECUENCIAS))
+        guardar_config(ruta_modelo, normalizacion, secuencias[1] if secuencias is not None else None,
+                       imagenes={rel_path: (mtime, size) for rel_path, (mtime, size, _) in nuevas_entradas.items()})
+
+    version = publicar_version(modelo_dir, guardar, conservar=int(os.getenv("MODEL_KEEP_VERSIONS", "5")))
+    print(f"Entrenamiento completo. Versión {version} publicada en {modelo_dir}.")
+
+
+if __name__ == "__main__":
+    main()
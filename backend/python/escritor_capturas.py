@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Numeración y escritura en segundo plano de las imágenes capturadas.
+
+``ContadorLetras`` lee el directorio de cada letra una sola vez para saber el
+siguiente número de archivo y después lo mantiene en memoria, en lugar de listar el
+directorio en cada captura. ``EscritorImagenes`` codifica y guarda los JPEG en un pool
+de hilos, de modo que una ráfaga de capturas solo espera a que los frames queden en
+cola.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+class ContadorLetras:
+    """Next file number per letter directory, read from disk once and then kept in memory."""
+
+    def __init__(self):
+        self._siguientes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _leer_directorio(letter_dir, letra):
+        patron = re.compile(rf"^{re.escape(letra)}_(\d+)\.jpg$")
+        numeros = [int(m.group(1)) for m in map(patron.match, os.listdir(letter_dir)) if m]
+        return max(numeros, default=0) + 1
+
+    def reservar(self, letter_dir, letra, cantidad=1):
+        """Reserve `cantidad` consecutive numbers for letra in letter_dir; returns the first one."""
+        with self._lock:
+            if letter_dir not in self._siguientes:
+                self._siguientes[letter_dir] = self._leer_directorio(letter_dir, letra)
+            primero = self._siguientes[letter_dir]
+            self._siguientes[letter_dir] = primero + cantidad
+            return primero
+
+
+class EscritorImagenes:
+    """Encodes and writes images on a thread pool with at most max_pendientes queued."""
+
+    def __init__(self, max_workers=2, max_pendientes=512, al_terminar=None):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="escritor")
+        self._cupos = threading.BoundedSemaphore(max(1, max_pendientes))
+        self._lock = threading.Lock()
+        self.al_terminar = al_terminar
+        self.pendientes = 0
+        self.escritas = 0
+        self.fallidas = 0
+
+    def encolar(self, ruta, imagen, timeout=None, al_escribir=None):
+        """Queue imagen to be written as ruta; blocks while the queue is full. Returns a Future of bool.
+
+        imagen must not be modified afterwards (pass a copy if the caller reuses it).
+        al_escribir(), if given, runs on the writer thread once the file is on disk; it is
+        not called if the write fails.
+        """
+        if not self._cupos.acquire(timeout=timeout):
+            raise TimeoutError("Image writer queue is full")
+        with self._lock:
+            self.pendientes += 1
+        futuro = self._pool.submit(self._escribir, ruta, imagen, al_escribir)
+        futuro.add_done_callback(self._terminado)
+        return futuro
+
+    @staticmethod
+    def _escribir(ruta, imagen, al_escribir=None):
+        ok, buffer = cv2.imencode(os.path.splitext(ruta)[1] or ".jpg", imagen)
+        if not ok:
+            return False
+        # Written under a temporary name so training never lists a half-written image
+        tmp = ruta + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.tobytes())
+        os.replace(tmp, ruta)
+        if al_escribir is not None:
+            try:
+                al_escribir()
+            except Exception as e:
+                print(f"Error after writing {ruta}: {e}")
+        return True
+
+    def _terminado(self, futuro):
+        ok = futuro.exception() is None and futuro.result()
+        if not ok:
+            print(f"Error writing captured image: {futuro.exception() or 'encoding failed'}")
+        with self._lock:
+            self.pendientes -= 1
+            if ok:
+                self.escritas += 1
+            else:
+                self.fallidas += 1
+        self._cupos.release()
+        if self.al_terminar is not None:
+            self.al_terminar(ok)
+
+    def estado(self):
+        with self._lock:
+            return {"pending": self.pendientes, "written": self.escritas, "failed": self.fallidas}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Canal de eventos de gestos para Server-Sent Events.
+
+Cada gesto reconocido se publica con un id creciente y se guarda en un buffer
+circular pequeño, así un cliente que se reconecta con ``Last-Event-ID`` recibe los
+eventos que se perdió en lugar de solo el último. Los ids llevan el prefijo de la época
+del canal, de modo que un id de otro proceso o de otra sesión no se confunde con uno
+propio.
+"""
+import json
+import threading
+import uuid
+from collections import deque
+
+
+class CanalEventos:
+    """Publish/subscribe channel with a bounded replay buffer, formatted as SSE events named nombre."""
+
+    def __init__(self, max_historial=50, latido=15.0, nombre="gesture"):
+        self._historial = deque(maxlen=max_historial)
+        self._cond = threading.Condition()
+        self._ultimo_id = 0
+        self._cerrado = False
+        self.latido = latido
+        self.nombre = nombre
+        self.epoca = uuid.uuid4().hex[:8]
+
+    def publicar(self, evento):
+        with self._cond:
+            self._ultimo_id += 1
+            self._historial.append((self._ultimo_id, evento))
+            self._cond.notify_all()
+            return self._ultimo_id
+
+    @property
+    def ultimo_id(self):
+        return self._ultimo_id
+
+    def cerrar(self):
+        """No more events will be published; subscriptions end once they have sent the last one."""
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
+
+    def id_de_cliente(self, texto):
+        """Event counter a client's Last-Event-ID refers to, or None if this channel did not issue it."""
+        epoca, _, numero = (texto or "").rpartition("-")
+        if epoca != self.epoca or not numero.isdigit():
+            return None
+        return int(numero)
+
+    def _pendientes(self, desde_id):
+        return [(i, e) for i, e in self._historial if i > desde_id]
+
+    def suscribir(self, desde_id=None):
+        """Yield SSE messages for events after desde_id (None, or an id not issued yet, means only new events).
+
+        A comment line is sent every `latido` seconds without events so proxies keep the
+        connection open and disconnected clients are noticed. The stream ends after
+        cerrar() once every pending event has been sent.
+        """
+        with self._cond:
+            ultimo = self._ultimo_id if desde_id is None or desde_id > self._ultimo_id else desde_id
+        yield "retry: 2000\n\n"
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ultimo_id > ultimo or self._cerrado, self.latido)
+                # Events evicted from the buffer before we read them are lost; say so explicitly
+                perdidos = bool(self._historial) and self._historial[0][0] > ultimo + 1
+                pendientes = self._pendientes(ultimo)
+                cerrado = self._cerrado
+            if not pendientes:
+                if cerrado:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if perdidos:
+                yield "event: overflow\ndata: {}\n\n"
+            for id_evento, evento in pendientes:
+                yield f"id: {self.epoca}-{id_evento}\nevent: {self.nombre}\ndata: {json.dumps(evento)}\n\n"
+                ultimo = id_evento
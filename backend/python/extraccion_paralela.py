@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Extracción de landmarks en paralelo con un pool de procesos.
+
+Cada proceso crea su propia instancia de ``Hands(static_image_mode=True)`` y
+procesa un lote de imágenes de una misma letra. Los resultados se devuelven en
+el mismo orden que la lista de entrada, sin importar qué proceso termine antes.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import mediapipe as mp
+
+from caracteristicas import matriz_manos
+
+# Per-process MediaPipe instance, created by _iniciar_worker
+_hands = None
+
+
+def crear_hands():
+    return mp.solutions.hands.Hands(static_image_mode=True)
+
+
+def extraer_landmarks(hands, image_path):
+    """Return an (n_hands, 63) float32 array of landmarks for one image, or None if unreadable."""
+    imagen = cv2.imread(image_path)
+    if imagen is None:
+        print(f"Error al leer la imagen: {image_path}")
+        return None
+    filas = landmarks_de_imagen(hands, imagen)
+    if len(filas) == 0:
+        print(f"No se detectaron manos en la imagen: {os.path.basename(image_path)}")
+    return filas
+
+
+def landmarks_de_imagen(hands, imagen):
+    """Return an (n_hands, 63) float32 array of landmarks for a BGR image already in memory."""
+    imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+    resultados = hands.process(imagen_rgb)
+    return matriz_manos(resultados.multi_hand_landmarks or [])
+
+
+def _iniciar_worker():
+    global _hands
+    _hands = crear_hands()
+
+
+def _procesar_lote(rutas):
+    return [extraer_landmarks(_hands, ruta) for ruta in rutas]
+
+
+def numero_workers(valor=None):
+    """Resolve the worker count from an explicit value or TRAIN_WORKERS, defaulting to all cores."""
+    if valor is None:
+        valor = os.getenv("TRAIN_WORKERS")
+    try:
+        workers = int(valor) if valor else (os.cpu_count() or 1)
+    except ValueError:
+        raise ValueError(f"TRAIN_WORKERS debe ser un entero, no {valor!r}")
+    return max(1, workers)
+
+
+def agrupar_por_letra(imagenes, tamano_lote=64):
+    """Split the (letter, rel_path, abs_path, ...) tuples into per-letter lots of at most tamano_lote."""
+    lotes = []
+    actual = []
+    letra_actual = None
+    for imagen in imagenes:
+        letter = imagen[0]
+        if actual and (letter != letra_actual or len(actual) >= tamano_lote):
+            lotes.append(actual)
+            actual = []
+        letra_actual = letter
+        actual.append(imagen)
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+def contexto_procesos(precargar):
+    """Multiprocessing context for MediaPipe worker pools.
+
+    Workers must not be forked from a parent that already ran MediaPipe (its graph threads
+    do not survive fork). A forkserver that preloads the worker modules gives clean, cheap
+    workers; on platforms without it (Windows) they are spawned.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload(list(precargar))
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+def extraer_en_paralelo(lotes, workers):
+    """Process each lot (a list of image paths) and return one list of results per lot, in order.
+
+    With a single worker everything runs in the current process and no pool is created.
+    """
+    if not lotes:
+        return []
+    workers = min(workers, len(lotes))
+    if workers <= 1:
+        hands = crear_hands()
+        try:
+            return [[extraer_landmarks(hands, ruta) for ruta in rutas] for rutas in lotes]
+        finally:
+            hands.close()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto_procesos(["extraccion_paralela"]),
+                             initializer=_iniciar_worker) as pool:
+        # map() yields results in submission order, which keeps the output deterministic
+        return list(pool.map(_procesar_lote, lotes))
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Fuentes de frames intercambiables para los servicios de video.
+
+Además de la cámara (``camara_compartida.abrir_camara``), los servicios pueden leer
+de un archivo de video, de una carpeta de imágenes reproducida a FPS fijos o de un
+generador sintético, para correr sin webcam (CI, pruebas de carga) o reproducir una
+grabación de campo. Todas ofrecen la interfaz de ``cv2.VideoCapture`` que usa
+``read_frame`` (``isOpened``, ``read``, ``release``) y entregan los frames al ritmo
+de una cámara real. Se eligen con variables de entorno:
+
+    FRAME_SOURCE=camera|video|images|synthetic   (por defecto camera)
+    FRAME_SOURCE_PATH=<archivo de video o directorio de imágenes>
+    FRAME_SOURCE_FPS=<frames por segundo>        (por defecto los del video, o 30)
+    FRAME_SOURCE_LOOP=1|0                        (volver a empezar al terminar)
+    FRAME_SOURCE_WIDTH / FRAME_SOURCE_HEIGHT     (redimensionar; tamaño del sintético)
+"""
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+TIPOS = ("camera", "video", "images", "synthetic")
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _orden_natural(nombre):
+    return [int(parte) if parte.isdigit() else parte.lower() for parte in re.split(r"(\d+)", nombre)]
+
+
+def listar_imagenes(directorio):
+    """Image paths of a directory in natural order (A_2.jpg before A_10.jpg)."""
+    nombres = sorted((f for f in os.listdir(directorio) if f.lower().endswith(EXTENSIONES_IMAGEN)),
+                     key=_orden_natural)
+    return [os.path.join(directorio, f) for f in nombres]
+
+
+class FuenteFrames:
+    """Base for non-camera sources: read() returns frames no faster than fps, like a camera."""
+
+    compartida = False
+
+    def __init__(self, fps, tamano=None):
+        self.fps = fps
+        self.tamano = tamano  # (width, height) to resize to, or None
+        self._intervalo = 1.0 / fps if fps and fps > 0 else 0.0
+        self._proximo = None
+        self._abierta = True
+        self._lock = threading.Lock()
+
+    def isOpened(self):
+        return self._abierta
+
+    def _esperar_turno(self):
+        if not self._intervalo:
+            return
+        ahora = time.monotonic()
+        if self._proximo is None or ahora - self._proximo > self._intervalo:
+            # A reader that fell behind gets the next frame now instead of a catch-up burst
+            self._proximo = ahora
+        elif ahora < self._proximo:
+            time.sleep(self._proximo - ahora)
+        self._proximo += self._intervalo
+
+    def _siguiente(self):
+        raise NotImplementedError
+
+    def read(self):
+        with self._lock:
+            if not self._abierta:
+                return False, None
+            self._esperar_turno()
+            frame = self._siguiente()
+        if frame is None:
+            return False, None
+        if self.tamano and (frame.shape[1], frame.shape[0]) != self.tamano:
+            frame = cv2.resize(frame, self.tamano)
+        return True, frame
+
+    def release(self):
+        self._abierta = False
+
+
+class FuenteVideo(FuenteFrames):
+    """Plays a video file at its own frame rate (or fps), optionally looping."""
+
+    def __init__(self, ruta, fps=None, bucle=True, tamano=None):
+        self.ruta = ruta
+        self.bucle = bucle
+        self._captura = cv2.VideoCapture(ruta)
+        super().__init__(fps or self._captura.get(cv2.CAP_PROP_FPS) or 30.0, tamano)
+        if not self._captura.isOpened():
+            print(f"Could not open video source: {ruta}")
+            self._abierta = False
+
+    def _siguiente(self):
+        ok, frame = self._captura.read()
+        if not ok and self.bucle:
+            self._captura.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._captura.read()
+        if not ok:
+            self.release()
+            return None
+        return frame
+
+    def release(self):
+        super().release()
+        self._captura.release()
+
+
+class FuenteImagenes(FuenteFrames):
+    """Replays the images of a directory in natural order at a fixed fps."""
+
+    def __init__(self, directorio, fps=10.0, bucle=True, tamano=None):
+        super().__init__(fps, tamano)
+        self.bucle = bucle
+        self.rutas = listar_imagenes(directorio) if os.path.isdir(directorio) else []
+        self._indice = 0
+        if not self.rutas:
+            print(f"No images to replay in {directorio}")
+            self._abierta = False
+
+    def _siguiente(self):
+        while self._indice < len(self.rutas) or (self.bucle and self.rutas):
+            if self._indice >= len(self.rutas):
+                self._indice = 0
+            ruta = self.rutas[self._indice]
+            self._indice += 1
+            frame = cv2.imread(ruta)
+            if frame is not None:
+                return frame
+            print(f"Skipping unreadable image: {ruta}")
+            self.rutas.remove(ruta)
+            self._indice -= 1
+        self.release()
+        return None
+
+
+class FuenteSintetica(FuenteFrames):
+    """Generated frames (a moving disc and a frame counter over a gradient) for load tests."""
+
+    def __init__(self, fps=30.0, tamano=None):
+        ancho, alto = tamano or (640, 480)
+        super().__init__(fps, None)
+        self.ancho = ancho
+        self.alto = alto
+        gradiente = np.linspace(40, 200, ancho, dtype=np.uint8)
+        self._fondo = np.dstack([np.tile(gradiente, (alto, 1))] * 3)
+        self._numero = 0
+
+    def _siguiente(self):
+        frame = self._fondo.copy()
+        fase = self._numero / max(self.fps, 1.0)
+        centro = (int(self.ancho / 2 + self.ancho / 3 * np.sin(fase)),
+                  int(self.alto / 2 + self.alto / 3 * np.sin(2 * fase)))
+        cv2.circle(frame, centro, max(8, self.alto // 10), (60, 120, 230), -1)
+        cv2.putText(frame, str(self._numero), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self._numero += 1
+        return frame
+
+
+def crear_fuente(tipo, ruta=None, fps=None, bucle=True, tamano=None):
+    """Build a non-camera frame source of the given type."""
+    if tipo == "video":
+        if not ruta:
+            raise ValueError("FRAME_SOURCE=video requiere FRAME_SOURCE_PATH")
+        return FuenteVideo(ruta, fps, bucle, tamano)
+    if tipo == "images":
+        if not ruta:
+            raise ValueError("FRAME_SOURCE=images requiere FRAME_SOURCE_PATH")
+        return FuenteImagenes(ruta, fps or 10.0, bucle, tamano)
+    if tipo == "synthetic":
+        return FuenteSintetica(fps or 30.0, tamano)
+    raise ValueError(f"Fuente de frames desconocida: {tipo}. Opciones: {', '.join(TIPOS)}")
+
+
+def abrir_fuente(indice=0):
+    """Frame source for the services as configured by FRAME_SOURCE; the camera by default."""
+    tipo = os.getenv("FRAME_SOURCE", "camera").lower()
+    if tipo == "camera":
+        from camara_compartida import abrir_camara
+        return abrir_camara(indice)
+    ancho, alto = os.getenv("FRAME_SOURCE_WIDTH"), os.getenv("FRAME_SOURCE_HEIGHT")
+    fps = os.getenv("FRAME_SOURCE_FPS")
+    return crear_fuente(tipo, os.getenv("FRAME_SOURCE_PATH"),
+                        fps=float(fps) if fps else None,
+                        bucle=os.getenv("FRAME_SOURCE_LOOP", "1") != "0",
+                        tamano=(int(ancho), int(alto)) if ancho and alto else None)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Historial circular de los últimos vectores de landmarks de una mano.
+
+Guarda los últimos ``capacidad`` vectores con su hora en arreglos reservados una sola
+vez. Cada vector se escribe dos veces (en ``i`` y en ``i + capacidad``), de modo que
+los últimos ``n`` vectores son siempre un tramo contiguo del arreglo y se pueden leer
+como una vista, sin copiar ni reordenar. Al agregar un vector se calcula su
+desplazamiento respecto al anterior y se lleva la cuenta de frames seguidos en
+movimiento que usan las reglas de gestos dinámicos.
+"""
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS
+
+
+class HistorialLandmarks:
+    def __init__(self, capacidad=64, dimension=NUM_CARACTERISTICAS):
+        self.capacidad = capacidad
+        self._datos = np.zeros((2 * capacidad, dimension), dtype=np.float32)
+        self._tiempos = np.zeros(2 * capacidad, dtype=np.float64)
+        self._diferencia = np.zeros(dimension, dtype=np.float32)
+        self._posicion = 0  # Slot the next vector is written to
+        self.cantidad = 0
+        self.frames_en_movimiento = 0
+
+    def __len__(self):
+        return self.cantidad
+
+    def reiniciar(self):
+        self.cantidad = 0
+        self.frames_en_movimiento = 0
+
+    def ranura(self):
+        """Buffer for the next vector, to be filled in place and then committed with agregar()."""
+        return self._datos[self._posicion]
+
+    def agregar(self, tiempo, umbral, vector=None):
+        """Commit the next vector (vector, or what was written into ranura()); returns its displacement.
+
+        A displacement above umbral extends the run of moving frames; otherwise the run resets.
+        """
+        p = self._posicion
+        fila = self._datos[p]
+        if vector is not None:
+            fila[:] = vector
+        desplazamiento = 0.0
+        if self.cantidad:
+            np.subtract(fila, self._datos[p - 1 if p else self.capacidad - 1], out=self._diferencia)
+            desplazamiento = float(np.sqrt(np.dot(self._diferencia, self._diferencia)))
+            self.frames_en_movimiento = self.frames_en_movimiento + 1 if desplazamiento > umbral else 0
+        self._datos[p + self.capacidad] = fila
+        self._tiempos[p] = self._tiempos[p + self.capacidad] = tiempo
+        self._posicion = (p + 1) % self.capacidad
+        self.cantidad = min(self.cantidad + 1, self.capacidad)
+        return desplazamiento
+
+    def _tramo(self, n):
+        fin = self._posicion + self.capacidad
+        return slice(fin - min(n, self.cantidad), fin)
+
+    def ultimos(self, n):
+        """View of the last n vectors (fewer if the history is shorter), oldest first."""
+        return self._datos[self._tramo(n)]
+
+    def tiempos(self, n):
+        return self._tiempos[self._tramo(n)]
+
+    @property
+    def ultimo_tiempo(self):
+        return self._tiempos[self._posicion + self.capacidad - 1] if self.cantidad else None
+
+    def muestrear(self, n, intervalo, salida):
+        """Write into salida the n vectors closest to intervalo seconds apart, ending at the last one.
+
+        Returns salida, or None if the history does not reach back far enough.
+        """
+        if self.cantidad < n:
+            return None
+        tiempos = self.tiempos(self.cantidad)
+        inicio = tiempos[-1] - intervalo * (n - 1)
+        if inicio < tiempos[0] - intervalo / 2:
+            return None
+        objetivos = inicio + intervalo * np.arange(n)
+        indices = np.searchsorted(tiempos, objetivos).clip(1, len(tiempos) - 1)
+        # Pick whichever neighbour is closer to each target time
+        indices -= (objetivos - tiempos[indices - 1]) < (tiempos[indices] - objetivos)
+        return np.take(self.ultimos(self.cantidad), indices, axis=0, out=salida)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Backends de inferencia para el MLP de gestos.
+
+El modelo que guarda ``entrenamiento.py`` es una pila de capas Dense (con Dropout
+entre ellas), así que la pasada hacia adelante se puede ejecutar con multiplicaciones
+de matrices en NumPy leyendo los pesos directamente del ``.h5``, sin importar
+TensorFlow. Backends disponibles (variable de entorno ``INFERENCE_BACKEND``):
+
+- ``numpy``  (por defecto): pesos del ``.h5`` y matmuls en NumPy.
+- ``tflite``: el modelo Keras convertido a TFLite y ejecutado con el intérprete.
+- ``keras``: ``keras.models.load_model`` tal cual.
+
+Todos exponen ``predict(x, verbose=0)`` con la misma firma que Keras.
+"""
+import json
+import os
+import threading
+import numpy as np
+
+BACKENDS = ("numpy", "tflite", "keras")
+
+_ACTIVACIONES = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=-1, keepdims=True)
+    return x
+
+
+_ACTIVACIONES["softmax"] = _softmax
+
+
+class ModeloNumpy:
+    """Forward pass of a Sequential Dense/Dropout model using weights read from a Keras .h5 file."""
+
+    def __init__(self, model_path):
+        import h5py
+
+        self.model_path = model_path
+        self.capas = []
+        with h5py.File(model_path, "r") as f:
+            config = json.loads(f.attrs["model_config"])
+            pesos = f["model_weights"] if "model_weights" in f else f
+            for capa in config["config"]["layers"]:
+                clase = capa["class_name"]
+                if clase in ("InputLayer", "Dropout"):
+                    continue  # Dropout is the identity at inference time
+                if clase != "Dense":
+                    raise ValueError(f"Capa no soportada por el backend numpy: {clase}")
+                nombre = capa["config"]["name"]
+                activacion = capa["config"].get("activation", "linear")
+                if activacion not in _ACTIVACIONES:
+                    raise ValueError(f"Activación no soportada por el backend numpy: {activacion}")
+                grupo = pesos[nombre]
+                nombres_pesos = [n.decode() if isinstance(n, bytes) else n for n in grupo.attrs["weight_names"]]
+                kernel = next(grupo[n][()] for n in nombres_pesos if n.endswith("kernel:0"))
+                bias = next((grupo[n][()] for n in nombres_pesos if n.endswith("bias:0")), None)
+                if bias is None:
+                    bias = np.zeros(kernel.shape[1], dtype=np.float32)
+                self.capas.append((kernel.astype(np.float32), bias.astype(np.float32), _ACTIVACIONES[activacion]))
+        if not self.capas:
+            raise ValueError(f"El modelo {model_path} no contiene capas Dense")
+
+    @property
+    def input_dim(self):
+        return self.capas[0][0].shape[0]
+
+    @property
+    def output_dim(self):
+        return self.capas[-1][0].shape[1]
+
+    def predict(self, x, verbose=0):
+        salida = np.asarray(x, dtype=np.float32)
+        if salida.ndim == 1:
+            salida = salida[np.newaxis, :]
+        for kernel, bias, activacion in self.capas:
+            salida = activacion(salida @ kernel + bias)
+        return salida
+
+
+class ModeloTFLite:
+    """Keras model converted to TFLite once at load time and run with the TFLite interpreter.
+
+    One instance is shared by every session and the batching thread, and the interpreter's
+    tensors are per instance, so predict() runs one call at a time.
+    """
+
+    def __init__(self, model_path):
+        import tensorflow as tf
+        from keras.models import load_model
+
+        self.model_path = model_path
+        modelo = load_model(model_path)
+        contenido = tf.lite.TFLiteConverter.from_keras_model(modelo).convert()
+        self.interprete = tf.lite.Interpreter(model_content=contenido)
+        self.interprete.allocate_tensors()
+        self.entrada = self.interprete.get_input_details()[0]
+        self.salida = self.interprete.get_output_details()[0]
+        self.batch_actual = 1
+        self._lock = threading.Lock()
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[np.newaxis, :]
+        with self._lock:
+            if x.shape[0] != self.batch_actual:
+                self.interprete.resize_tensor_input(self.entrada["index"], list(x.shape))
+                self.interprete.allocate_tensors()
+                self.batch_actual = x.shape[0]
+            self.interprete.set_tensor(self.entrada["index"], x)
+            self.interprete.invoke()
+            return self.interprete.get_tensor(self.salida["index"]).copy()
+
+
+def cargar_modelo(model_path, backend=None):
+    """Load model_path with the requested backend (defaults to INFERENCE_BACKEND or 'numpy')."""
+    backend = (backend or os.getenv("INFERENCE_BACKEND", "numpy")).lower()
+    if backend == "numpy":
+        return ModeloNumpy(model_path)
+    if backend == "tflite":
+        return ModeloTFLite(model_path)
+    if backend == "keras":
+        from keras.models import load_model
+        return load_model(model_path)
+    raise ValueError(f"Backend de inferencia desconocido: {backend}. Opciones: {', '.join(BACKENDS)}")
+
+
+def verificar_contra_keras(modelo, model_path, muestras=64, tolerancia=1e-4):
+    """Compare a backend's outputs with Keras on random landmark vectors; returns the max abs error.
+
+    Raises AssertionError if the difference exceeds tolerancia.
+    """
+    from keras.models import load_model
+
+    referencia = load_model(model_path)
+    rng = np.random.default_rng(0)
+    x = rng.random((muestras, referencia.input_shape[-1]), dtype=np.float32)
+    esperado = referencia.predict(x, verbose=0)
+    obtenido = modelo.predict(x, verbose=0)
+    error = float(np.max(np.abs(esperado - obtenido)))
+    if error > tolerancia:
+        raise AssertionError(f"El backend difiere de Keras en {error:.2e} (tolerancia {tolerancia:.0e})")
+    return error
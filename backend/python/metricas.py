@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Métricas de latencia y rendimiento en formato de texto de Prometheus.
+
+Contadores, medidores e histogramas mínimos, sin dependencias externas, para
+instrumentar cada etapa del procesamiento de video y exponerlos en ``/api/metrics``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Buckets in seconds, from sub-millisecond JPEG encodes up to MediaPipe stalls
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _formato_etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + (list(extra) if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self):
+        self._valor = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._valor += n
+
+    def muestras(self, nombre, etiquetas):
+        return [f"{nombre}{_formato_etiquetas(etiquetas)} {self._valor}"]
+
+
+class Medidor:
+    tipo = "gauge"
+
+    def __init__(self):
+        self._valor = 0.0
+
+    def set(self, valor):
+        self._valor = valor
+
+    @property
+    def valor(self):
+        return self._valor
+
+    def muestras(self, nombre, etiquetas):
+        return [f"{nombre}{_formato_etiquetas(etiquetas)} {self._valor:.6g}"]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = tuple(buckets)
+        self._cuentas = [0] * len(self.buckets)
+        self._suma = 0.0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        with self._lock:
+            self._suma += valor
+            self._total += 1
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    self._cuentas[i] += 1
+                    break
+
+    @contextmanager
+    def medir(self):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio)
+
+    def muestras(self, nombre, etiquetas):
+        with self._lock:
+            cuentas, suma, total = list(self._cuentas), self._suma, self._total
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip(self.buckets, cuentas):
+            acumulado += cuenta
+            lineas.append(f"{nombre}_bucket{_formato_etiquetas(etiquetas, [('le', f'{limite:g}')])} {acumulado}")
+        lineas.append(f"{nombre}_bucket{_formato_etiquetas(etiquetas, [('le', '+Inf')])} {total}")
+        lineas.append(f"{nombre}_sum{_formato_etiquetas(etiquetas)} {suma:.6f}")
+        lineas.append(f"{nombre}_count{_formato_etiquetas(etiquetas)} {total}")
+        return lineas
+
+
+class Registro:
+    """Holds every metric of one service, keyed by name and label values."""
+
+    def __init__(self, prefijo):
+        self.prefijo = prefijo
+        self._metricas = {}  # nombre -> (ayuda, tipo, {etiquetas: metrica})
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre, ayuda, etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            _, _, hijos = self._metricas.setdefault(f"{self.prefijo}_{nombre}", (ayuda, clase.tipo, {}))
+            if clave not in hijos:
+                hijos[clave] = clase()
+            return hijos[clave]
+
+    def contador(self, nombre, ayuda, **etiquetas):
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre, ayuda, **etiquetas):
+        return self._obtener(Medidor, nombre, ayuda, etiquetas)
+
+    def histograma(self, nombre, ayuda, **etiquetas):
+        return self._obtener(Histograma, nombre, ayuda, etiquetas)
+
+    def exportar(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metricas = [(n, a, t, dict(h)) for n, (a, t, h) in sorted(self._metricas.items())]
+        lineas = []
+        for nombre, ayuda, tipo, hijos in metricas:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, metrica in hijos.items():
+                lineas.extend(metrica.muestras(nombre, etiquetas))
+        return "\n".join(lineas) + "\n"
+
+
+class MedidorFPS:
+    """Exponentially smoothed frames-per-second written into a gauge on every tick()."""
+
+    def __init__(self, medidor, suavizado=0.1):
+        self.medidor = medidor
+        self.suavizado = suavizado
+        self._anterior = None
+
+    def tick(self):
+        ahora = time.perf_counter()
+        if self._anterior is not None and ahora > self._anterior:
+            instantaneo = 1.0 / (ahora - self._anterior)
+            actual = self.medidor.valor
+            self.medidor.set(instantaneo if actual == 0 else actual + self.suavizado * (instantaneo - actual))
+        self._anterior = ahora
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
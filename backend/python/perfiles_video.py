@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Perfiles de transmisión para los flujos MJPEG de ``/video_feed``.
+
+Un perfil fija el ancho máximo de los frames transmitidos, la calidad JPEG y los FPS
+máximos. Cada petición elige el suyo con ``?profile=`` y puede ajustar valores
+sueltos con ``?width=``, ``?quality=`` y ``?fps=``; los espectadores que piden lo mismo
+comparten una única codificación. El perfil por defecto se toma de ``STREAM_PROFILE``
+y ``full`` (tamaño de la cámara, calidad 95, sin límite de FPS) equivale a la
+transmisión de siempre.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class PerfilVideo:
+    def __init__(self, nombre, ancho=None, calidad=95, max_fps=None):
+        self.nombre = nombre
+        self.ancho = ancho  # Maximum width; frames are only ever shrunk
+        self.calidad = calidad
+        self.max_fps = max_fps
+
+    @property
+    def clave(self):
+        """Viewers whose profiles share this key share one encoder."""
+        return self.ancho, self.calidad, self.max_fps
+
+    def ajustar(self, ancho=None, calidad=None, max_fps=None):
+        """Copy of this profile with the given values overridden."""
+        return PerfilVideo(self.nombre,
+                           self.ancho if ancho is None else ancho,
+                           self.calidad if calidad is None else calidad,
+                           self.max_fps if max_fps is None else max_fps)
+
+    def a_dict(self):
+        return {"profile": self.nombre, "width": self.ancho, "quality": self.calidad, "fps": self.max_fps}
+
+
+PERFILES = {
+    "full": PerfilVideo("full"),
+    "high": PerfilVideo("high", ancho=960, calidad=85, max_fps=30),
+    "medium": PerfilVideo("medium", ancho=640, calidad=75, max_fps=20),
+    "low": PerfilVideo("low", ancho=320, calidad=60, max_fps=10),
+}
+
+
+def perfil_por_defecto():
+    nombre = os.getenv("STREAM_PROFILE", "full").lower()
+    if nombre not in PERFILES:
+        raise ValueError(f"Perfil de video desconocido: {nombre}. Opciones: {', '.join(PERFILES)}")
+    return PERFILES[nombre]
+
+
+def _entero(args, nombre, minimo, maximo):
+    valor = args.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ValueError(f"{nombre} debe ser un número entero")
+    if not minimo <= valor <= maximo:
+        raise ValueError(f"{nombre} debe estar entre {minimo} y {maximo}")
+    return valor
+
+
+def perfil_de_peticion(args, por_defecto=None):
+    """Profile requested by a /video_feed query string; raises ValueError on invalid values."""
+    nombre = (args.get("profile") or "").lower()
+    if nombre and nombre not in PERFILES:
+        raise ValueError(f"Perfil de video desconocido: {nombre}. Opciones: {', '.join(PERFILES)}")
+    perfil = PERFILES[nombre] if nombre else (por_defecto or perfil_por_defecto())
+    return perfil.ajustar(ancho=_entero(args, "width", 16, 4096),
+                          calidad=_entero(args, "quality", 1, 100),
+                          max_fps=_entero(args, "fps", 1, 120))
+
+
+class CodificadorPerfil:
+    """Encodes frames for one profile, reusing its resize buffer and encoder parameters."""
+
+    def __init__(self, perfil):
+        self.perfil = perfil
+        self._parametros = [cv2.IMWRITE_JPEG_QUALITY, int(perfil.calidad)]
+        self._intervalo = 1.0 / perfil.max_fps if perfil.max_fps else 0.0
+        self._proximo = 0.0
+        self._redimensionado = None
+
+    def toca(self, ahora=None):
+        """Whether a frame is due under the profile's FPS limit; reserves the slot if so."""
+        if not self._intervalo:
+            return True
+        ahora = time.monotonic() if ahora is None else ahora
+        if ahora < self._proximo:
+            return False
+        # A late frame starts a new slot instead of letting the next ones through in a burst
+        self._proximo = max(self._proximo + self._intervalo, ahora + self._intervalo / 2)
+        return True
+
+    def _escalar(self, frame):
+        alto, ancho = frame.shape[:2]
+        if not self.perfil.ancho or ancho <= self.perfil.ancho:
+            return frame
+        forma = (max(1, round(alto * self.perfil.ancho / ancho)), self.perfil.ancho) + frame.shape[2:]
+        if self._redimensionado is None or self._redimensionado.shape != forma:
+            self._redimensionado = np.empty(forma, dtype=frame.dtype)
+        return cv2.resize(frame, (forma[1], forma[0]), dst=self._redimensionado, interpolation=cv2.INTER_AREA)
+
+    def codificar(self, frame):
+        """JPEG bytes of frame scaled to the profile."""
+        ret, buffer = cv2.imencode('.jpg', self._escalar(frame), self._parametros)
+        if not ret:
+            raise ValueError("JPEG encoding failed")
+        return buffer.tobytes()
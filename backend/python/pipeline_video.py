@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Pipeline de video por etapas: lectura de cámara, inferencia y codificación JPEG.
+
+Cada etapa corre en su propio hilo y se comunica con la siguiente mediante un
+buffer de una sola posición que conserva únicamente el elemento más reciente. Si una
+etapa se retrasa (por ejemplo, un pico de MediaPipe), los frames viejos se descartan
+en lugar de acumularse, de modo que la latencia extremo a extremo queda acotada.
+``DifusorVideo`` reparte un pipeline entre los espectadores y codifica cada frame una
+vez por perfil de transmisión en uso (ver ``perfiles_video``); sin espectadores no se
+dibuja ni se codifica nada.
+"""
+import threading
+import time
+
+from perfiles_video import CodificadorPerfil, perfil_por_defecto
+
+
+class BufferUltimo:
+    """Single-slot buffer that only keeps the most recent item, tagged with a sequence number."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._cerrado = False
+
+    def poner(self, item):
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def tomar(self, ultimo_seq, timeout=None):
+        """Wait for an item newer than ultimo_seq; returns (seq, item) or (ultimo_seq, None) on timeout/close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > ultimo_seq or self._cerrado, timeout):
+                return ultimo_seq, None
+            if self._seq <= ultimo_seq:
+                return ultimo_seq, None
+            return self._seq, self._item
+
+    def ultimo(self):
+        with self._cond:
+            return self._item
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
+
+
+class PipelineVideo:
+    """Runs leer -> procesar -> codificar on three threads connected by BufferUltimo slots.
+
+    leer() returns (ok, frame) like cv2.VideoCapture.read; a failed read stops the pipeline.
+    procesar(frame) returns the annotated frame and codificar(frame) returns JPEG bytes.
+    A stage that returns None passes nothing on.
+    """
+
+    def __init__(self, leer, procesar, codificar, nombre="pipeline", al_descartar=None):
+        self.leer = leer
+        self.procesar = procesar
+        self.codificar = codificar
+        self.nombre = nombre
+        self.al_descartar = al_descartar
+        self.frames = BufferUltimo()
+        self.procesados = BufferUltimo()
+        self.jpegs = BufferUltimo()
+        self.descartados = {"inferencia": 0, "codificacion": 0, "salida": 0}
+        self._activo = False
+        self._hilos = []
+
+    def iniciar(self):
+        self._activo = True
+        etapas = [
+            (self._bucle_lectura, ()),
+            (self._bucle_etapa, ("inferencia", self.frames, self.procesados, self.procesar)),
+            (self._bucle_etapa, ("codificacion", self.procesados, self.jpegs, self.codificar)),
+        ]
+        for objetivo, args in etapas:
+            hilo = threading.Thread(target=objetivo, args=args, daemon=True, name=f"{self.nombre}-{objetivo.__name__}")
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        self._activo = False
+        for buffer in (self.frames, self.procesados, self.jpegs):
+            buffer.cerrar()
+
+    @property
+    def activo(self):
+        return self._activo
+
+    def _bucle_lectura(self):
+        try:
+            while self._activo:
+                ok, frame = self.leer()
+                if not ok or frame is None:
+                    print("Error: Unable to read frame from camera.")
+                    break
+                self.frames.poner(frame)
+        finally:
+            self.detener()
+
+    def _bucle_etapa(self, nombre, entrada, salida, funcion):
+        seq = 0
+        while self._activo:
+            nuevo_seq, item = entrada.tomar(seq, timeout=1.0)
+            if item is None:
+                continue
+            # Anything between the last consumed item and this one was overwritten unseen
+            self.contar_descarte(nombre, nuevo_seq - seq - 1 if seq else 0)
+            seq = nuevo_seq
+            try:
+                resultado = funcion(item)
+                if resultado is not None:
+                    salida.poner(resultado)
+            except Exception as e:
+                print(f"Error in {self.nombre} {nombre} stage: {e}")
+
+    def contar_descarte(self, etapa, n):
+        if n <= 0:
+            return
+        self.descartados[etapa] += n
+        if self.al_descartar is not None:
+            self.al_descartar(etapa, n)
+
+
+class _SalidaPerfil:
+    """Encoder and newest JPEG of one stream profile, shared by the viewers that asked for it."""
+
+    def __init__(self, perfil):
+        self.codificador = CodificadorPerfil(perfil)
+        self.jpegs = BufferUltimo()
+        self.espectadores = 0
+
+
+class DifusorVideo:
+    """Shares one PipelineVideo among every connected viewer.
+
+    Each camera frame is processed once and encoded once per stream profile in use;
+    every subscriber reads the newest JPEG of its profile at its own pace, so a slow
+    client skips frames without holding back the rest. procesar(frame, dibujar) only
+    needs to annotate the frame when dibujar is true, and codificar(frame, codificador)
+    wraps CodificadorPerfil.codificar (e.g. to time it). al_emitir(), if given, is called
+    once per frame that was encoded for at least one profile.
+
+    The pipeline starts with the first subscriber and stops when the last one leaves,
+    unless retener() keeps it running without viewers (recognition goes on, nothing is
+    drawn or encoded).
+    """
+
+    def __init__(self, leer, procesar, codificar=None, nombre="video", al_descartar=None, perfil=None,
+                 al_emitir=None):
+        self.leer = leer
+        self.procesar = procesar
+        self.codificar = codificar or (lambda frame, codificador: codificador.codificar(frame))
+        self.al_emitir = al_emitir
+        self.nombre = nombre
+        self.al_descartar = al_descartar
+        self.perfil = perfil or perfil_por_defecto()
+        self._lock = threading.Lock()
+        self._pipeline = None
+        self._salidas = {}
+        self._suscriptores = 0
+        self._retenciones = 0
+
+    def _asegurar_pipeline(self):
+        if self._pipeline is None or not self._pipeline.activo:
+            self._pipeline = PipelineVideo(self.leer, self._procesar, self._codificar,
+                                           nombre=self.nombre, al_descartar=self.al_descartar)
+            self._pipeline.iniciar()
+        return self._pipeline
+
+    def _soltar_pipeline(self, pipeline):
+        if self._suscriptores == 0 and self._retenciones == 0 and self._pipeline is pipeline is not None:
+            pipeline.detener()
+            self._pipeline = None
+
+    def _procesar(self, frame):
+        return self.procesar(frame, self._suscriptores > 0)
+
+    def _codificar(self, frame):
+        with self._lock:
+            salidas = list(self._salidas.values())
+        ahora = time.monotonic()
+        emitido = False
+        for salida in salidas:
+            if salida.codificador.toca(ahora):
+                salida.jpegs.poner(self.codificar(frame, salida.codificador))
+                emitido = True
+        if emitido and self.al_emitir is not None:
+            self.al_emitir()
+        return None
+
+    def suscribir(self, perfil=None, timeout=1.0):
+        """Yield encoded frames of perfil (the default profile if None) for one viewer until the
+        pipeline stops or the viewer disconnects."""
+        perfil = perfil or self.perfil
+        with self._lock:
+            salida = self._salidas.get(perfil.clave)
+            if salida is None:
+                salida = self._salidas[perfil.clave] = _SalidaPerfil(perfil)
+            salida.espectadores += 1
+            self._suscriptores += 1
+            pipeline = self._asegurar_pipeline()
+        try:
+            seq = 0
+            while pipeline.activo:
+                nuevo_seq, jpeg = salida.jpegs.tomar(seq, timeout)
+                if jpeg is None:
+                    continue
+                pipeline.contar_descarte("salida", nuevo_seq - seq - 1 if seq else 0)
+                seq = nuevo_seq
+                yield jpeg
+        finally:
+            with self._lock:
+                salida.espectadores -= 1
+                if salida.espectadores == 0 and self._salidas.get(perfil.clave) is salida:
+                    del self._salidas[perfil.clave]
+                self._suscriptores -= 1
+                self._soltar_pipeline(pipeline)
+
+    def retener(self):
+        """Keep the pipeline running (starting it if needed) until the matching liberar()."""
+        with self._lock:
+            self._retenciones += 1
+            self._asegurar_pipeline()
+
+    def liberar(self):
+        with self._lock:
+            self._retenciones -= 1
+            self._soltar_pipeline(self._pipeline)
+
+    def ultimo_frame(self):
+        """Most recent raw camera frame while streaming, or None if the pipeline is stopped."""
+        pipeline = self._pipeline
+        if pipeline is None or not pipeline.activo:
+            return None
+        return pipeline.frames.ultimo()
+
+    def siguiente_frame(self, ultimo_seq=0, timeout=1.0):
+        """Wait for a raw camera frame newer than ultimo_seq; returns (seq, frame), or (ultimo_seq, None)
+        on timeout or if the pipeline is stopped."""
+        pipeline = self._pipeline
+        if pipeline is None or not pipeline.activo:
+            return ultimo_seq, None
+        return pipeline.frames.tomar(ultimo_seq, timeout)
+
+    def detener(self):
+        with self._lock:
+            if self._pipeline is not None:
+                self._pipeline.detener()
+                self._pipeline = None
+
+    @property
+    def espectadores(self):
+        return self._suscriptores
+
+    def perfiles(self):
+        """Viewer count per stream profile currently being encoded."""
+        conteo = {}
+        with self._lock:
+            for salida in self._salidas.values():
+                nombre = salida.codificador.perfil.nombre
+                conteo[nombre] = conteo.get(nombre, 0) + salida.espectadores
+        return conteo
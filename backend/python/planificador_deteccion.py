@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Planificación adaptativa de la detección de manos.
+
+Decide frame a frame si vale la pena ejecutar ``hands.process`` y la predicción, o
+si se pueden reutilizar los últimos resultados. Usa una diferencia de frames muy
+barata (imagen reducida en escala de grises) para detectar movimiento:
+
+- Con la mano visible y la imagen estable, se reutilizan los landmarks y la
+  predicción anteriores hasta ``max_reuso`` frames seguidos.
+- Sin mano visible, la detección se espacia exponencialmente (1, 2, 4, ...
+  hasta ``max_salto`` frames) y vuelve a cada frame en cuanto hay movimiento.
+
+Variables de entorno: ``DETECTION_POLICY`` (``adaptive`` o ``always``),
+``MOTION_THRESHOLD``, ``MAX_REUSE_FRAMES`` y ``MAX_IDLE_SKIP``.
+"""
+import os
+import cv2
+import numpy as np
+
+# Small enough that the diff costs microseconds, large enough to see a hand move
+TAMANO_MINIATURA = (32, 24)
+
+
+class PlanificadorDeteccion:
+    def __init__(self, politica="adaptive", umbral_movimiento=2.0, max_reuso=5, max_salto=8):
+        if politica not in ("adaptive", "always"):
+            raise ValueError(f"Política de detección desconocida: {politica}")
+        self.politica = politica
+        self.umbral_movimiento = umbral_movimiento
+        self.max_reuso = max(1, max_reuso)
+        self.max_salto = max(1, max_salto)
+        self._miniatura = None
+        self._hay_mano = False
+        self._frames_sin_detectar = 0
+        self._salto = 1
+        self.detecciones = 0
+        self.omitidas = 0
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(politica=os.getenv("DETECTION_POLICY", "adaptive"),
+                   umbral_movimiento=float(os.getenv("MOTION_THRESHOLD", "2.0")),
+                   max_reuso=int(os.getenv("MAX_REUSE_FRAMES", "5")),
+                   max_salto=int(os.getenv("MAX_IDLE_SKIP", "8")))
+
+    def _movimiento(self, frame):
+        """Mean absolute difference (0-255) between this frame and the last detected one."""
+        gris = cv2.cvtColor(cv2.resize(frame, TAMANO_MINIATURA, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if self._miniatura is None:
+            return float("inf"), gris
+        return float(np.mean(cv2.absdiff(gris, self._miniatura))), gris
+
+    def debe_detectar(self, frame):
+        """True if hands.process should run on this frame; False to reuse the previous results."""
+        if self.politica == "always":
+            self.detecciones += 1
+            return True
+
+        movimiento, gris = self._movimiento(frame)
+        self._frames_sin_detectar += 1
+        hay_movimiento = movimiento > self.umbral_movimiento
+        if self._hay_mano:
+            detectar = hay_movimiento or self._frames_sin_detectar >= self.max_reuso
+        else:
+            detectar = hay_movimiento or self._frames_sin_detectar >= self._salto
+
+        if detectar:
+            self._miniatura = gris
+            self._frames_sin_detectar = 0
+            self.detecciones += 1
+        else:
+            self.omitidas += 1
+        return detectar
+
+    def registrar(self, hay_mano):
+        """Record the outcome of a detection so the next decisions can back off or ramp up."""
+        self._hay_mano = hay_mano
+        if hay_mano:
+            self._salto = 1
+        else:
+            self._salto = min(self._salto * 2, self.max_salto)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Micro-batching de predicciones para la API ``/api/predict``.
+
+Las peticiones concurrentes se acumulan durante una ventana corta (unos pocos
+milisegundos) y se agrupan por usuario, de modo que cada modelo recibe una sola
+llamada ``predict`` con todas las filas pendientes en lugar de una por petición.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+from caracteristicas import normalizar
+
+
+class ProgramadorLotes:
+    """Coalesces concurrent predict requests into one batched model call per user.
+
+    obtener_modelo(user_id) must return (modelo, mapa_inverso, normalizacion); it is called
+    from the scheduler thread once per user per batch.
+    """
+
+    def __init__(self, obtener_modelo, ventana_ms=5.0, max_filas=256):
+        self.obtener_modelo = obtener_modelo
+        self.ventana = ventana_ms / 1000.0
+        self.max_filas = max_filas
+        self._cola = queue.Queue()
+        self.lotes = 0
+        self.filas = 0
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="prediccion-lotes")
+        self._hilo.start()
+
+    def enviar(self, user_id, vectores):
+        """Queue an (n, 63) array for user_id; the Future resolves to (labels, probabilities)."""
+        futuro = Future()
+        self._cola.put((str(user_id), np.asarray(vectores, dtype=np.float32), futuro))
+        return futuro
+
+    def _bucle(self):
+        while True:
+            pendientes = [self._cola.get()]
+            filas = len(pendientes[0][1])
+            limite = time.monotonic() + self.ventana
+            # Keep collecting until the window closes or the batch is full
+            while filas < self.max_filas:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pendiente = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                pendientes.append(pendiente)
+                filas += len(pendiente[1])
+            self._procesar(pendientes)
+
+    def _procesar(self, pendientes):
+        por_usuario = {}
+        for pendiente in pendientes:
+            por_usuario.setdefault(pendiente[0], []).append(pendiente)
+
+        for user_id, grupo in por_usuario.items():
+            try:
+                modelo, mapa_inverso, normalizacion = self.obtener_modelo(user_id)
+                entradas = np.concatenate([vectores for _, vectores, _ in grupo])
+                probabilidades = modelo.predict(normalizar(entradas, normalizacion, salida=entradas), verbose=0)
+                self.lotes += 1
+                self.filas += len(entradas)
+            except Exception as e:
+                for _, _, futuro in grupo:
+                    futuro.set_exception(e)
+                continue
+
+            indices = np.argmax(probabilidades, axis=1)
+            inicio = 0
+            for _, vectores, futuro in grupo:
+                fin = inicio + len(vectores)
+                etiquetas = [mapa_inverso.get(int(i)) for i in indices[inicio:fin]]
+                futuro.set_result((etiquetas, probabilidades[inicio:fin]))
+                inicio = fin
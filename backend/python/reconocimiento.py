@@ -1,103 +1,185 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, render_template, Response, redirect, url_for, flash, request
 import cv2
-import mediapipe as mp
 import numpy as np
-from keras.models import load_model
+from arranque import Arranque, registrar_rutas
+from inferencia import cargar_modelo, verificar_contra_keras
+from caracteristicas import cargar_config, normalizar, vector_mano
+from cache_modelos import CacheModelos, tamano_estimado
+from pipeline_video import DifusorVideo
+from perfiles_video import PERFILES, perfil_de_peticion
+from fuentes_video import abrir_fuente
+from prediccion_lotes import ProgramadorLotes
+from planificador_deteccion import PlanificadorDeteccion
+from trabajos_entrenamiento import enviar_a_servicio
+from metricas import CONTENT_TYPE as METRICS_CONTENT_TYPE, MedidorFPS, Registro
+from versiones_modelo import listar_versiones, revertir, rutas_modelo_usuario, version_actual
+from sesiones_reconocimiento import GestorSesiones, SesionReconocimiento
+from reglas_gestos import (FRAMES_MOVIMIENTO, GESTOS_DINAMICOS, GESTOS_ESTATICOS, UMBRAL_MOVIMIENTO,
+                           aceptar_gesto)
+from secuencias_gestos import cargar_secuencias
 import os
-import glob
-import subprocess
 import sys
 import threading
 import time
+from contextlib import nullcontext
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Necesario para usar flash messages
 
-# Define static and dynamic gestures
-static_gestures = set("ABCDEFGHILMNOPRSTUVWY")
-dynamic_gestures = set("JKQXZ")
-
-# Initialize variables to track hand movement
-previous_landmarks = None
-movement_threshold = 0.02  # Adjust this threshold as needed
-movement_frames = 5
-movement_counter = 0
-
-# Variable to store the last detected gesture
-last_detected_gesture = None
-last_gesture_time = 0
-
-# Update paths to be user-specific
+# MediaPipe and the default model load in the background while the port is already open;
+# /api/health and /api/ready report the startup phases
+arranque = Arranque("reconocimiento")
+# Pages, metrics, training and the camera do not depend on it and are served meanwhile
+registrar_rutas(app, arranque, exentos=("index", "start_reconocimiento", "run_reconocimiento", "metrics",
+                                        "camera_open", "camera_close", "train_model"))
+
+# Static and dynamic gestures and the movement rules that accept them live in reglas_gestos,
+# shared with the offline transcription (the tracking state itself lives in each session)
+static_gestures = GESTOS_ESTATICOS
+dynamic_gestures = GESTOS_DINAMICOS
+movement_threshold = UMBRAL_MOVIMIENTO
+movement_frames = FRAMES_MOVIMIENTO
+# A hand seen again after this many seconds starts a new movement history
+motion_history_gap = float(os.getenv("MOTION_HISTORY_GAP", "1.0"))
+motion_history_size = int(os.getenv("MOTION_HISTORY_SIZE", "64"))
+# Dynamic gestures from the sequence model (when the user has one) need at least this confidence
+sequence_min_confidence = float(os.getenv("SEQUENCE_MIN_CONFIDENCE", "0.6"))
+
+# A gesture that is held is re-sent to event subscribers at most every
+# gesture_repeat_interval seconds instead of on every frame.
+gesture_event_buffer = int(os.getenv("GESTURE_EVENT_BUFFER", "50"))
+gesture_repeat_interval = 1.0
+
+# User of the default session, which backs the original single-user endpoints
 current_user_id = os.getenv("USER_ID", "1")  # Default to user 1 for out-of-the-box run
+DEFAULT_SESSION = "default"
 
 # Model directory is now in backend/modelos/{user_id}
 base_dir = os.path.dirname(__file__)
 backend_dir = os.path.dirname(base_dir)
 
-# Global variables for model and labels (will be loaded dynamically)
-modelo = None
-mapa_etiquetas = None
-mapa_inverso = None
+model_lock = threading.Lock()
+
+# Recently used models stay resident so switching users does not reload from disk
+_cache_mb = os.getenv("MODEL_CACHE_MB")
+cache_modelos = CacheModelos(max_modelos=int(os.getenv("MODEL_CACHE_SIZE", "4")),
+                             max_bytes=int(float(_cache_mb) * 1024 * 1024) if _cache_mb else None)
+
+def resolve_model_paths(user_id):
+    """Return (version, model_path, label_map_path); version is None for unversioned models"""
+    return rutas_modelo_usuario(os.path.join(backend_dir, "modelos", str(user_id)), user_id)
+
+def get_user_model(user_id, paths=None):
+    """Return (modelo, mapa_etiquetas, mapa_inverso, normalizacion, secuencias) for a user, loading it into the cache if needed"""
+    _, model_path, label_map_path = paths or resolve_model_paths(user_id)
+
+    def cargar():
+        print(f"Loading model for user {user_id} from {model_path}")
+        nuevo_modelo = cargar_modelo(model_path)
+        if os.getenv("INFERENCE_VERIFY") == "1":
+            error = verificar_contra_keras(nuevo_modelo, model_path)
+            print(f"Inference backend matches Keras (max abs error {error:.2e})")
+        etiquetas = np.load(label_map_path, allow_pickle=True).item()
+        inverso = {v: k for k, v in etiquetas.items()}
+        secuencias = cargar_secuencias(model_path)
+        if secuencias is not None:
+            print(f"Sequence model for user {user_id}: {secuencias.ventana} frames every {secuencias.intervalo:.3f}s")
+        return ((nuevo_modelo, etiquetas, inverso, cargar_config(model_path), secuencias),
+                tamano_estimado(nuevo_modelo, model_path))
+
+    # Load model and labels (from the cache when the files are unchanged)
+    entrada, _ = cache_modelos.obtener(str(user_id), (model_path, label_map_path), cargar)
+    return entrada
+
+def load_session_model(sesion, user_id=None):
+    """Load (or reload) the model of sesion's user, optionally switching the session to user_id"""
+    user_id = str(user_id or sesion.user_id)
+    with model_lock:
+        paths = resolve_model_paths(user_id)
+        nuevo_modelo, nuevas_etiquetas, nuevo_inverso, normalizacion, secuencias = get_user_model(user_id, paths)
+        if user_id != sesion.user_id:
+            # Motion history of another user's hand means nothing for this one
+            sesion.user_id = user_id
+            sesion.historial.reiniciar()
+        sesion.mapa_etiquetas = nuevas_etiquetas
+        sesion.modelo_version = paths[0]
+        evaluador = secuencias.evaluador(sequence_min_confidence) if secuencias is not None else None
+        sesion.modelo_activo = (nuevo_modelo, nuevo_inverso, normalizacion, evaluador)
+    print(f"Model loaded successfully for user {user_id} in session {sesion.id} "
+          f"(version {sesion.modelo_version or 'unversioned'})")
+    return True
 
 def load_user_model(user_id):
-    """Load model for a specific user"""
-    global modelo, mapa_etiquetas, mapa_inverso, current_user_id
-    
-    model_dir = os.path.join(backend_dir, "modelos", str(user_id))
-    
-    # Resolve model and label file names supporting both with/without user prefix
-    model_candidates = [
-        os.path.join(model_dir, "modelo_gestos.h5"),
-        os.path.join(model_dir, f"{user_id}_modelo_gestos.h5")
-    ]
-    label_candidates = [
-        os.path.join(model_dir, "mapa_etiquetas.npy"),
-        os.path.join(model_dir, f"{user_id}_mapa_etiquetas.npy")
-    ]
-    
-    model_path = next((p for p in model_candidates if os.path.exists(p)), None)
-    label_map_path = next((p for p in label_candidates if os.path.exists(p)), None)
-    
-    # Fallback: pick first matching files if above failed
-    if not model_path:
-        h5_files = glob.glob(os.path.join(model_dir, "*.h5"))
-        model_path = h5_files[0] if h5_files else None
-    if not label_map_path:
-        npy_files = [f for f in glob.glob(os.path.join(model_dir, "*.npy")) if "etiquetas" in os.path.basename(f)]
-        label_map_path = npy_files[0] if npy_files else None
-    
-    # Check if model files exist
-    if not model_path or not label_map_path:
-        raise FileNotFoundError(f"Modelo o mapa de etiquetas no encontrado en {model_dir}. Entrena el modelo primero.")
-    
-    # Load model and labels
-    print(f"Loading model for user {user_id} from {model_path}")
-    modelo = load_model(model_path)
-    mapa_etiquetas = np.load(label_map_path, allow_pickle=True).item()
-    mapa_inverso = {v: k for k, v in mapa_etiquetas.items()}
+    """Load model for a specific user into the default session"""
+    global current_user_id
+    sesion = sesiones.obtener(DEFAULT_SESSION)
+    if sesion is None:
+        sesiones.crear(user_id, DEFAULT_SESSION)
+    else:
+        load_session_model(sesion, user_id)
     current_user_id = str(user_id)
-    print(f"Model loaded successfully for user {user_id}")
     return True
 
-# Try to load default model on startup
-try:
-    load_user_model(current_user_id)
-    print(f"Default model loaded for user {current_user_id}")
-except Exception as e:
-    print(f"Warning: Could not load default model: {e}")
-    print("Model will need to be loaded via /api/load-model endpoint")
+def model_watch_worker(interval):
+    """Pick up newly published model versions for every open session without restarting.
 
-# Inicializar MediaPipe
-mp_hands = mp.solutions.hands
-mp_dibujo = mp.solutions.drawing_utils
-hands = mp_hands.Hands(static_image_mode=False, max_num_hands=1, 
-                       min_detection_confidence=0.8, min_tracking_confidence=0.8)
+    The new version is loaded here, off the frame path, and only then swapped in. If it fails
+    to load the previous model keeps serving.
+    """
+    while True:
+        time.sleep(interval)
+        publicadas = {}
+        for sesion in sesiones.listar():
+            try:
+                if sesion.user_id not in publicadas:
+                    publicadas[sesion.user_id] = version_actual(os.path.join(backend_dir, "modelos", sesion.user_id))
+                publicada = publicadas[sesion.user_id]
+                if publicada is None or publicada[0] == sesion.modelo_version:
+                    continue
+                print(f"New model version {publicada[0]} for user {sesion.user_id}; reloading session {sesion.id}.")
+                load_session_model(sesion)
+            except Exception as e:
+                print(f"Could not hot-reload model for session {sesion.id}, "
+                      f"keeping version {sesion.modelo_version}: {e}")
+
+def _model_for_batch(user_id):
+    modelo_usuario, _, inverso, normalizacion, _ = get_user_model(user_id)
+    return modelo_usuario, inverso, normalizacion
+
+# Concurrent /api/predict requests are coalesced into one model call per user
+programador_lotes = ProgramadorLotes(_model_for_batch,
+                                     ventana_ms=float(os.getenv("PREDICT_BATCH_WINDOW_MS", "5")),
+                                     max_filas=int(os.getenv("PREDICT_MAX_BATCH", "256")))
+
+# MediaPipe is imported by startup(); nothing that uses it runs before the service is ready
+mp_hands = mp_dibujo = None
+
+def create_hands():
+    # One tracker per session: MediaPipe keeps tracking state between frames
+    return mp_hands.Hands(static_image_mode=False, max_num_hands=1,
+                          min_detection_confidence=0.8, min_tracking_confidence=0.8)
+
+# Per-stage latency, throughput and drop metrics exposed at /api/metrics
+metricas = Registro("reconocimiento")
+stage_latency = {stage: metricas.histograma("frame_stage_seconds", "Latency of each frame processing stage", stage=stage)
+                 for stage in ("read", "flip_convert", "hands_process", "predict", "sequence", "draw", "encode", "yield")}
+frames_total = metricas.contador("frames_total", "Frames read from the camera")
+predictions_total = metricas.contador("predictions_total", "Model predictions made on streamed frames")
+sequence_predictions_total = metricas.contador("sequence_predictions_total",
+                                               "Sequence model evaluations on moving hands")
+gestures_total = metricas.contador("gestures_recognized_total", "Gestures accepted by the static/dynamic rules")
+detections_skipped = metricas.contador("detections_skipped_total", "Frames that reused the previous hand landmarks")
+
+def count_dropped(stage, n):
+    metricas.contador("dropped_frames_total", "Frames overwritten before a stage could consume them", stage=stage).inc(n)
 
 # Lazy camera control
 cap = None
 camera_active = False
 last_frame_time = 0
+# Sessions watching the camera at once share the device; reads must not interleave
+camera_lock = threading.Lock()
 
 def open_camera():
     global cap, camera_active
@@ -105,7 +187,9 @@ def open_camera():
         return True
     max_retries = 5
     for attempt in range(max_retries):
-        cap = cv2.VideoCapture(0)
+        if cap is not None:
+            cap.release()  # Do not leave a failed handle (or its shared memory mapping) behind
+        cap = abrir_fuente(0)
         if cap.isOpened():
             camera_active = True
             print(f"Camera opened successfully on attempt {attempt + 1}")
@@ -128,76 +212,199 @@ def close_camera():
     except Exception:
         pass
 
-def generate_frames():
-    global previous_landmarks, movement_counter, last_detected_gesture, last_gesture_time
-    while camera_active and cap is not None and cap.isOpened():
+def read_frame():
+    """Read one frame from the shared camera (runs on the pipeline's reader thread)"""
+    global last_frame_time
+    if not (camera_active and cap is not None and cap.isOpened()):
+        return False, None
+    # The shared camera serves every reader thread each frame; a device opened directly must not be read concurrently
+    with stage_latency["read"].medir(), (nullcontext() if getattr(cap, "compartida", False) else camera_lock):
         ret, frame = cap.read()
-        if not ret or frame is None:
-            print("Error: Unable to read frame from camera.")
-            break
-        global last_frame_time
+    if ret:
         last_frame_time = time.time()
+        frames_total.inc()
+    return ret, frame
 
+def process_frame(frame, sesion, dibujar=True):
+    """Detect the hand, classify the gesture and draw landmarks (if anyone is watching) using one session's state"""
+    with sesion.lock:
+        sesion.tocar()
+        return _process_frame(frame, sesion, dibujar)
+
+def _process_frame(frame, sesion, dibujar):
+    with stage_latency["flip_convert"].medir():
         frame = cv2.flip(frame, 1)  # Invertir la imagen para una experiencia más intuitiva
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-        resultados = hands.process(frame_rgb)
-
-        if resultados.multi_hand_landmarks:
-            for hand_landmarks in resultados.multi_hand_landmarks:
-                # Draw hand landmarks on frame
-                mp_dibujo.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                
-                gesto = []
-                for punto in hand_landmarks.landmark:
-                    gesto.extend([punto.x, punto.y, punto.z])
-
-                if len(gesto) == 63:  # Validate gesture vector length
-                    try:
-                        prediccion = modelo.predict(np.array([gesto]), verbose=0)
-                        if prediccion.any():  # Validate prediction
-                            indice = np.argmax(prediccion)
-                            if indice in mapa_inverso:
-                                etiqueta = mapa_inverso[indice]
-
-                                # Check for hand movement
-                                if previous_landmarks is not None:
-                                    movement = np.linalg.norm(np.array(gesto) - np.array(previous_landmarks))
-                                    if movement > movement_threshold:
-                                        movement_counter += 1
-                                    else:
-                                        movement_counter = 0
-                                previous_landmarks = gesto
-
-                                # Determine if the gesture should be recognized
-                                if (etiqueta in static_gestures and movement_counter == 0) or \
-                                   (etiqueta in dynamic_gestures and movement_counter >= movement_frames):
-                                    # Store the detected gesture instead of drawing it on frame
-                                    last_detected_gesture = etiqueta
-                                    last_gesture_time = time.time()
-                    except Exception as e:
-                        continue
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    # Stable frame: keep the previous landmarks and prediction, only redraw them
+    if not sesion.planificador.debe_detectar(frame):
+        detections_skipped.inc()
+        if dibujar:
+            with stage_latency["draw"].medir():
+                for hand_landmarks in sesion.ultimas_manos:
+                    mp_dibujo.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+        return frame
+
+    with stage_latency["hands_process"].medir():
+        resultados = sesion.hands.process(frame_rgb)
+    sesion.ultimas_manos = resultados.multi_hand_landmarks or []
+    sesion.planificador.registrar(bool(sesion.ultimas_manos))
+
+    modelo_frame, inverso_frame, normalizacion_frame, secuencias_frame = sesion.modelo_activo
+    if resultados.multi_hand_landmarks:
+        for hand_landmarks in resultados.multi_hand_landmarks:
+            # Draw hand landmarks on frame
+            if dibujar:
+                with stage_latency["draw"].medir():
+                    mp_dibujo.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+            
+            # The landmarks go straight into the session's history, which also tracks movement
+            ahora = time.time()
+            historial = sesion.historial
+            if historial.cantidad and ahora - historial.ultimo_tiempo > motion_history_gap:
+                historial.reiniciar()
+            gesto = vector_mano(hand_landmarks, historial.ranura())
+            historial.agregar(ahora, movement_threshold)
+
+            try:
+                with stage_latency["predict"].medir():
+                    entrada = normalizar(gesto, normalizacion_frame, salida=sesion.entrada_modelo)
+                    prediccion = modelo_frame.predict(entrada, verbose=0)
+                predictions_total.inc()
+                if prediccion.any():  # Validate prediction
+                    indice = np.argmax(prediccion)
+                    if indice in inverso_frame:
+                        etiqueta = inverso_frame[indice]
+                        confianza = float(prediccion.max())
+
+                        # Static gestures need a still hand; with a sequence model the dynamic ones come
+                        # from it, evaluated only while the hand is moving
+                        aceptado = aceptar_gesto(etiqueta, historial.frames_en_movimiento, movement_frames,
+                                                 dinamicos=secuencias_frame is None)
+                        if secuencias_frame is not None and historial.frames_en_movimiento:
+                            with stage_latency["sequence"].medir():
+                                dinamico = secuencias_frame.evaluar(historial)
+                            sequence_predictions_total.inc()
+                            if dinamico is not None:
+                                (etiqueta, confianza), aceptado = dinamico, True
+
+                        if aceptado:
+                            # Store the detected gesture instead of drawing it on frame
+                            sesion.ultimo_gesto = etiqueta
+                            sesion.tiempo_ultimo_gesto = time.time()
+                            gestures_total.inc()
+                            if etiqueta != sesion.ultimo_publicado or \
+                               sesion.tiempo_ultimo_gesto - sesion.tiempo_ultimo_publicado >= gesture_repeat_interval:
+                                sesion.eventos.publicar({"gesture": str(etiqueta),
+                                                         "confidence": confianza,
+                                                         "timestamp": sesion.tiempo_ultimo_gesto})
+                                sesion.ultimo_publicado = etiqueta
+                                sesion.tiempo_ultimo_publicado = sesion.tiempo_ultimo_gesto
+            except Exception as e:
+                continue
+    return frame
+
+def encode_frame(frame, codificador):
+    """Encode an annotated frame as JPEG for one stream profile (runs on the encoder thread)"""
+    with stage_latency["encode"].medir():
+        jpeg = codificador.codificar(frame)
+    metricas.contador("stream_bytes_total", "JPEG bytes encoded for the video feed",
+                      profile=codificador.perfil.nombre).inc(len(jpeg))
+    return jpeg
+
+def create_session(sesion_id, user_id):
+    """Build a session with its own tracker, detection scheduler and model reference"""
+    # The scheduler skips hands.process/predict on unchanged frames and backs off while no hand is visible
+    sesion = SesionReconocimiento(sesion_id, user_id, create_hands(), PlanificadorDeteccion.desde_entorno(),
+                                  max_historial_eventos=gesture_event_buffer, capacidad_historial=motion_history_size)
+    try:
+        load_session_model(sesion)
+    except Exception:
+        sesion.cerrar()
+        raise
+    # One pipeline per session, shared by every viewer of that session. Camera read,
+    # inference and encoding run on separate threads; stale frames are dropped between
+    # stages so a slow MediaPipe call never backs up the camera. Each frame is encoded
+    # once per stream profile being watched, and not at all while only gesture events are.
+    sesion.difusor = DifusorVideo(read_frame, lambda frame, dibujar: process_frame(frame, sesion, dibujar),
+                                  encode_frame, nombre=f"reconocimiento-{sesion_id}", al_descartar=count_dropped,
+                                  al_emitir=MedidorFPS(metricas.medidor(
+                                      "stream_fps", "Smoothed rate of streamed frames per second",
+                                      session=sesion_id)).tick)
+    return sesion
+
+# Sessions idle for SESSION_IDLE_SECONDS are closed; the default one lives as long as the server
+sesiones = GestorSesiones(create_session,
+                          max_sesiones=int(os.getenv("MAX_SESSIONS", "8")),
+                          max_inactividad=float(os.getenv("SESSION_IDLE_SECONDS", "300")),
+                          protegidas=(DEFAULT_SESSION,))
+
+def warm_up(sesion):
+    """Run a tracker and the model once so the first streamed frame does not pay for their initialization"""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    if sesion is None:
+        hands = create_hands()
+        try:
+            hands.process(frame)
+        finally:
+            hands.close()
+        return
+    with sesion.lock:
+        sesion.hands.process(frame)
+        modelo_frame, _, normalizacion_frame, secuencias_frame = sesion.modelo_activo
+        modelo_frame.predict(normalizar(np.zeros(63, dtype=np.float32), normalizacion_frame,
+                                        salida=sesion.entrada_modelo), verbose=0)
+        if secuencias_frame is not None:
+            secuencias_frame.calentar()
+
+def startup():
+    global mp_hands, mp_dibujo
+    with arranque.fase("mediapipe"):
+        import mediapipe as mp
+        mp_hands = mp.solutions.hands
+        mp_dibujo = mp.solutions.drawing_utils
+    # Without a default model the service still starts; a model is then loaded via /api/load-model
+    with arranque.fase("default_model", opcional=True):
+        load_user_model(current_user_id)
+        print(f"Default model loaded for user {current_user_id}")
+    with arranque.fase("warm_up"):
+        warm_up(sesiones.obtener(DEFAULT_SESSION))
+
+arranque.iniciar(startup)
+
+threading.Thread(target=model_watch_worker, args=(float(os.getenv("MODEL_WATCH_INTERVAL", "2")),),
+                 daemon=True).start()
+
+def generate_frames(sesion, perfil):
+    for frame in sesion.difusor.suscribir(perfil):
+        # Time spent in yield is time the client takes to accept the frame. The part is sent
+        # in pieces so the JPEG is not copied into a new bytes object for every viewer.
+        with stage_latency["yield"].medir():
+            yield b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(frame)
+            yield frame
+            yield b'\r\n'
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Training jobs run on captura_imagenes.py's job manager, the one Node also uses, so the
+# worker limit and the one-job-per-user rule hold across both services
+training_service_url = os.getenv("TRAINING_SERVICE_URL", "http://localhost:5001")
+
 @app.route('/train_model')
 def train_model():
+    user_id = request.args.get('userId', current_user_id)
     try:
-        # Usar el intérprete de Python del entorno virtual
-        python_executable = sys.executable
-        result = subprocess.run([python_executable, "entrenamiento.py"], check=True, capture_output=True, text=True)
-        flash("Modelo entrenado exitosamente.")
-        return redirect(url_for('index'))
-    except subprocess.CalledProcessError as e:
-        flash(f"Error al entrenar el modelo: {e.stderr}")
+        trabajo = enviar_a_servicio(training_service_url, user_id)
+    except OSError as e:
+        flash(f"No se pudo iniciar el entrenamiento: el servicio de captura no responde ({e}).")
         return redirect(url_for('index'))
+    if trabajo["created"]:
+        flash(f"Entrenamiento iniciado (trabajo {trabajo['jobId']}).")
+    else:
+        flash(f"Ya hay un entrenamiento en curso para el usuario {user_id} (trabajo {trabajo['jobId']}).")
+    return redirect(url_for('index'))
 
 @app.route('/run-reconocimiento')
 def run_reconocimiento():
@@ -208,27 +415,49 @@ def start_reconocimiento():
     # Render the visualize-model.html template
     return render_template('visualize-model.html')
 
-@app.route('/api/video_feed')
-def video_feed():
-    print("Received request for /api/video_feed")
-    if modelo is None:
+def session_video_feed(sesion):
+    try:
+        perfil = perfil_de_peticion(request.args)
+    except ValueError as e:
+        return Response(str(e), status=400)
+    if sesion is None or sesion.modelo_activo is None:
         return Response("Model not loaded. Call /api/load-model first.", status=503)
     if not camera_active:
         return Response("Camera inactive", status=503)
     if cap is None or not cap.isOpened():
         if not open_camera():
             return Response("Camera open failed", status=503)
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(generate_frames(sesion, perfil), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def session_last_gesture(sesion):
+    if sesion is not None and sesion.ultimo_gesto and (time.time() - sesion.tiempo_ultimo_gesto) < 3:
+        return {"gesture": sesion.ultimo_gesto, "timestamp": sesion.tiempo_ultimo_gesto}, 200
+    return {"gesture": None}, 200
+
+def session_gesture_events(sesion):
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    # Ids from before a restart or from another session mean "only new events"
+    desde_id = sesion.eventos.id_de_cliente(ultimo_id)
+    return Response(sesion.suscribir_eventos(desde_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def request_user_id():
+    # Accept userId from query params or JSON body
+    user_id = request.args.get('userId')
+    if not user_id and request.is_json:
+        user_id = (request.get_json(silent=True) or {}).get('userId')
+    return user_id
+
+@app.route('/api/video_feed')
+def video_feed():
+    print("Received request for /api/video_feed")
+    return session_video_feed(sesiones.obtener(DEFAULT_SESSION))
 
 @app.route('/api/load-model', methods=['POST'])
 def load_model_endpoint():
     """Load or reload model for a specific user"""
     try:
-        # Accept userId from query params or JSON body
-        user_id = request.args.get('userId')
-        if not user_id and request.is_json:
-            user_id = request.json.get('userId')
-        
+        user_id = request_user_id()
         if not user_id:
             return {"success": False, "message": "userId parameter required"}, 400
         
@@ -239,10 +468,92 @@ def load_model_endpoint():
     except Exception as e:
         return {"success": False, "message": f"Error loading model: {str(e)}"}, 500
 
+@app.route('/api/predict', methods=['POST'])
+def predict_endpoint():
+    """Classify one or many 63-float landmark vectors for a user.
+
+    Vectors are raw MediaPipe coordinates; the model's normalization is applied here.
+
+    JSON body: {"userId": "1", "landmarks": [63 floats] or [[63 floats], ...]}.
+    Binary body (application/octet-stream): little-endian float32 rows, userId in the query string.
+    """
+    user_id = request.args.get('userId')
+    try:
+        if request.content_type == 'application/octet-stream':
+            vectores = np.frombuffer(request.get_data(), dtype='<f4')
+            if vectores.size == 0 or vectores.size % 63 != 0:
+                return {"success": False, "message": "Body must contain a multiple of 63 float32 values"}, 400
+            vectores = vectores.reshape(-1, 63)
+        else:
+            body = request.get_json(silent=True) or {}
+            user_id = user_id or body.get('userId')
+            vectores = np.asarray(body.get('landmarks', []), dtype=np.float32)
+            if vectores.ndim == 1:
+                vectores = vectores.reshape(1, -1)
+            if vectores.ndim != 2 or vectores.shape[0] == 0 or vectores.shape[1] != 63:
+                return {"success": False, "message": "landmarks must be one or more vectors of 63 floats"}, 400
+    except (TypeError, ValueError) as e:
+        return {"success": False, "message": f"Invalid landmarks: {e}"}, 400
+    # null in JSON and NaN/inf in binary bodies would otherwise reach the model as NaN
+    invalidas = np.flatnonzero(~np.isfinite(vectores).all(axis=1))
+    if invalidas.size:
+        return {"success": False, "message": f"landmarks rows {invalidas.tolist()} contain non-finite values"}, 400
+
+    if not user_id:
+        return {"success": False, "message": "userId parameter required"}, 400
+
+    try:
+        etiquetas, probabilidades = programador_lotes.enviar(user_id, vectores).result(timeout=10)
+    except FileNotFoundError as e:
+        return {"success": False, "message": str(e)}, 404
+    except Exception as e:
+        return {"success": False, "message": f"Error during prediction: {str(e)}"}, 500
+
+    metricas.contador("predict_api_vectors_total", "Landmark vectors classified through /api/predict").inc(len(vectores))
+    predicciones = [
+        {"gesture": None if etiqueta is None else str(etiqueta),
+         "confidence": float(fila.max()),
+         "probabilities": fila.tolist()}
+        for etiqueta, fila in zip(etiquetas, probabilidades)
+    ]
+    return {"success": True, "predictions": predicciones}, 200
+
+@app.route('/api/model/versions', methods=['GET'])
+def model_versions():
+    """List the published model versions of a user and which one is serving"""
+    user_id = request.args.get('userId', current_user_id)
+    model_dir = os.path.join(backend_dir, "modelos", str(user_id))
+    publicada = version_actual(model_dir)
+    return {"userId": str(user_id),
+            "versions": listar_versiones(model_dir),
+            "published": publicada[0] if publicada else None,
+            "serving": {s.id: s.modelo_version for s in sesiones.listar() if s.user_id == str(user_id)}}, 200
+
+@app.route('/api/model/rollback', methods=['POST'])
+def model_rollback():
+    """Point a user back to the previous model version and serve it right away"""
+    user_id = str(request_user_id() or current_user_id)
+    version = revertir(os.path.join(backend_dir, "modelos", user_id))
+    if version is None:
+        return {"success": False, "message": "No previous model version to roll back to"}, 409
+    for sesion in sesiones.listar():
+        if sesion.user_id == user_id:
+            try:
+                load_session_model(sesion)
+            except Exception as e:
+                return {"success": False, "message": f"Error loading model: {str(e)}"}, 500
+    return {"success": True, "message": f"Rolled back to version {version}", "version": version}, 200
+
+@app.route('/api/model-cache', methods=['GET'])
+def model_cache_status():
+    """Report which user models are resident in the cache"""
+    return cache_modelos.estado(), 200
+
 @app.route('/api/camera/open', methods=['POST'])
 def camera_open():
     # Check if model is loaded
-    if modelo is None:
+    sesion = sesiones.obtener(DEFAULT_SESSION)
+    if sesion is None or sesion.modelo_activo is None:
         return "Model not loaded. Call /api/load-model first.", 503
     if open_camera():
         return "Camera opened", 200
@@ -251,10 +562,97 @@ def camera_open():
 @app.route('/api/last-gesture', methods=['GET'])
 def get_last_gesture():
     """Get the last detected gesture"""
-    global last_detected_gesture, last_gesture_time
-    if last_detected_gesture and (time.time() - last_gesture_time) < 3:
-        return {"gesture": last_detected_gesture, "timestamp": last_gesture_time}, 200
-    return {"gesture": None}, 200
+    return session_last_gesture(sesiones.obtener(DEFAULT_SESSION))
+
+@app.route('/api/gesture-events', methods=['GET'])
+def gesture_events():
+    """Server-Sent Events stream of recognized gestures; honours Last-Event-ID for replay"""
+    sesion = sesiones.obtener(DEFAULT_SESSION)
+    if sesion is None:
+        return {"success": False, "message": "Model not loaded. Call /api/load-model first."}, 503
+    return session_gesture_events(sesion)
+
+# Session-scoped API: each client gets its own tracker, motion history and gesture stream.
+
+def get_session_or_404(session_id):
+    sesion = sesiones.obtener(session_id)
+    if sesion is None:
+        return None, ({"success": False, "message": "Unknown or expired session"}, 404)
+    return sesion, None
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session_endpoint():
+    user_id = request_user_id()
+    if not user_id:
+        return {"success": False, "message": "userId parameter required"}, 400
+    session_id = request.args.get('sessionId') or (request.get_json(silent=True) or {}).get('sessionId')
+    if session_id == DEFAULT_SESSION:
+        return {"success": False, "message": "Use /api/load-model for the default session"}, 400
+    try:
+        sesion = sesiones.crear(user_id, session_id)
+    except FileNotFoundError as e:
+        return {"success": False, "message": str(e)}, 404
+    except RuntimeError as e:
+        return {"success": False, "message": str(e)}, 503
+    except Exception as e:
+        return {"success": False, "message": f"Error creating session: {str(e)}"}, 500
+    return {"success": True, **sesion.a_dict()}, 201
+
+@app.route('/api/sessions', methods=['GET'])
+def list_sessions():
+    return {"sessions": [s.a_dict() for s in sesiones.listar()]}, 200
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    sesion, error = get_session_or_404(session_id)
+    return error or (sesion.a_dict(), 200)
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if session_id == DEFAULT_SESSION or not sesiones.eliminar(session_id):
+        return {"success": False, "message": "Unknown or expired session"}, 404
+    return {"success": True, "message": f"Session {session_id} closed"}, 200
+
+@app.route('/api/sessions/<session_id>/load-model', methods=['POST'])
+def session_load_model(session_id):
+    """Reload the session's model, or switch the session to another user's model"""
+    sesion, error = get_session_or_404(session_id)
+    if error:
+        return error
+    try:
+        load_session_model(sesion, request_user_id())
+    except FileNotFoundError as e:
+        return {"success": False, "message": str(e)}, 404
+    except Exception as e:
+        return {"success": False, "message": f"Error loading model: {str(e)}"}, 500
+    return {"success": True, **sesion.a_dict()}, 200
+
+@app.route('/api/sessions/<session_id>/frame', methods=['POST'])
+def session_frame(session_id):
+    """Run recognition on one client-supplied frame (JPEG/PNG body) with the session's state"""
+    sesion, error = get_session_or_404(session_id)
+    if error:
+        return error
+    frame = cv2.imdecode(np.frombuffer(request.get_data(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return {"success": False, "message": "Body must be an encoded image"}, 400
+    process_frame(frame, sesion)
+    return {"success": True, "handDetected": bool(sesion.ultimas_manos), **session_last_gesture(sesion)[0]}, 200
+
+@app.route('/api/sessions/<session_id>/video_feed')
+def session_video_feed_endpoint(session_id):
+    sesion, error = get_session_or_404(session_id)
+    return error or session_video_feed(sesion)
+
+@app.route('/api/sessions/<session_id>/last-gesture', methods=['GET'])
+def session_last_gesture_endpoint(session_id):
+    sesion, error = get_session_or_404(session_id)
+    return error or session_last_gesture(sesion)
+
+@app.route('/api/sessions/<session_id>/gesture-events', methods=['GET'])
+def session_gesture_events_endpoint(session_id):
+    sesion, error = get_session_or_404(session_id)
+    return error or session_gesture_events(sesion)
 
 @app.route('/api/camera/close', methods=['POST'])
 def camera_close():
@@ -277,17 +675,31 @@ threading.Thread(target=inactivity_worker, args=(10,), daemon=True).start()
 import atexit
 atexit.register(close_camera)
 
-@app.route('/api/health')
-def health():
-    print("Health check requested.")
-    return "Flask server is running.", 200
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus text-format metrics for the recognition stream"""
+    metricas.medidor("viewers", "Clients currently watching the video feed").set(
+        sum(s.difusor.espectadores for s in sesiones.listar() if s.difusor is not None))
+    por_perfil = {}
+    for s in sesiones.listar():
+        if s.difusor is not None:
+            for nombre, n in s.difusor.perfiles().items():
+                por_perfil[nombre] = por_perfil.get(nombre, 0) + n
+    for nombre in PERFILES:
+        metricas.medidor("profile_viewers", "Clients watching the video feed per stream profile",
+                         profile=nombre).set(por_perfil.get(nombre, 0))
+    metricas.medidor("sessions", "Open recognition sessions").set(len(sesiones))
+    return Response(metricas.exportar(), mimetype=METRICS_CONTENT_TYPE)
 
 if __name__ == "__main__":
     print("Starting reconocimiento.py...")
     try:
         from waitress import serve
-        print("Using Waitress WSGI server on port 5000...")
-        serve(app, host='0.0.0.0', port=5000, _quiet=False)
+        # Every viewer holds a thread for the MJPEG feed and another for the gesture SSE,
+        # so the pool is sized for the streams of all sessions plus health and control requests
+        threads = int(os.getenv("SERVER_THREADS", "32"))
+        print(f"Using Waitress WSGI server on port 5000 with {threads} threads...")
+        serve(app, host='0.0.0.0', port=5000, threads=threads, _quiet=False)
     except ImportError:
         print("Waitress not available, using Flask development server on port 5000...")
         app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Reglas para aceptar un gesto a partir de la predicción de cada frame.
+
+Los gestos estáticos se aceptan solo con la mano quieta; los dinámicos (J, K, Q, X,
+Z) solo después de ``FRAMES_MOVIMIENTO`` frames seguidos con movimiento. El
+movimiento lo mide ``HistorialLandmarks`` con ``UMBRAL_MOVIMIENTO``. Las usan tanto
+el reconocimiento en vivo como la transcripción de grabaciones, para que ambos den el
+mismo resultado.
+"""
+GESTOS_ESTATICOS = set("ABCDEFGHILMNOPRSTUVWY")
+GESTOS_DINAMICOS = set("JKQXZ")
+UMBRAL_MOVIMIENTO = 0.02  # Distance between consecutive landmark vectors that counts as movement
+FRAMES_MOVIMIENTO = 5
+
+
+def aceptar_gesto(etiqueta, frames_en_movimiento, frames=FRAMES_MOVIMIENTO, dinamicos=True):
+    """Whether the frame classifier's etiqueta is accepted given the current run of moving frames.
+
+    With dinamicos=False only static gestures are accepted this way (a sequence model
+    decides the dynamic ones).
+    """
+    if etiqueta in GESTOS_ESTATICOS:
+        return frames_en_movimiento == 0
+    return dinamicos and etiqueta in GESTOS_DINAMICOS and frames_en_movimiento >= frames
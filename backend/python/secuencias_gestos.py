@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Clasificador opcional de secuencias para los gestos dinámicos.
+
+``entrenamiento.py`` arma ventanas de ``ventana`` frames consecutivos con las
+ráfagas guardadas en el dataset de captura (registros de la misma letra separados por
+poco tiempo) y entrena con ellas un MLP aparte, que se publica junto al modelo de
+frames. En el reconocimiento, ese modelo solo se evalúa cuando la mano se está
+moviendo y sobre frames tomados del historial de la sesión con el mismo intervalo
+que tuvieron las ráfagas. Las características de una ventana (las coordenadas
+relativas a la muñeca del último frame) se calculan aquí, igual para el
+entrenamiento y para la inferencia.
+"""
+import os
+
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS, leer_config
+from inferencia import cargar_modelo
+from reglas_gestos import GESTOS_DINAMICOS
+
+ARCHIVO_MODELO = "modelo_secuencias.h5"
+VENTANA = 8
+MAX_HUECO = 0.5  # Seconds between two capture records of the same burst
+
+
+def caracteristicas_ventana(ventana, salida=None):
+    """Flatten a (frames, 63) window into one row, relative to the last frame's wrist.
+
+    Keeps both the hand shape and the wrist trajectory, but not where in the image it happened.
+    """
+    ventana = np.asarray(ventana, dtype=np.float32)
+    if salida is None:
+        salida = np.empty(ventana.size, dtype=np.float32)
+    puntos = ventana.reshape(-1, 3)
+    np.subtract(puntos, puntos[-NUM_CARACTERISTICAS // 3], out=salida.reshape(-1, 3))
+    return salida
+
+
+def ventanas_de_registros(etiquetas, tiempos, landmarks, ventana=VENTANA, max_hueco=MAX_HUECO):
+    """Build training windows from capture records; returns (X (m, ventana*63), labels, median interval).
+
+    Records are grouped into runs of one letter with at most max_hueco seconds between
+    consecutive records, and every run yields its overlapping windows.
+    """
+    orden = np.lexsort((tiempos, etiquetas))
+    etiquetas, tiempos, landmarks = etiquetas[orden], tiempos[orden], landmarks[orden]
+    cortes = np.flatnonzero((etiquetas[1:] != etiquetas[:-1]) | (np.diff(tiempos) > max_hueco)) + 1
+    filas, nombres, intervalos = [], [], []
+    for inicio, fin in zip(np.r_[0, cortes], np.r_[cortes, len(etiquetas)]):
+        if fin - inicio < ventana:
+            continue
+        intervalos.append(np.diff(tiempos[inicio:fin]))
+        for i in range(inicio, fin - ventana + 1):
+            filas.append(caracteristicas_ventana(landmarks[i:i + ventana]))
+            nombres.append(etiquetas[i])
+    if not filas:
+        return np.zeros((0, ventana * NUM_CARACTERISTICAS), dtype=np.float32), np.array([]), None
+    return np.stack(filas), np.array(nombres), float(np.median(np.concatenate(intervalos)))
+
+
+def configuracion(etiquetas, ventana, intervalo):
+    """Entry describing a trained sequence model, stored in the version's caracteristicas.json."""
+    return {"model": ARCHIVO_MODELO, "window": ventana, "interval_s": intervalo,
+            "labels": [str(e) for e in etiquetas]}
+
+
+class ModeloSecuencias:
+    """A loaded sequence model; shared by every session of a user."""
+
+    def __init__(self, modelo, etiquetas, ventana, intervalo):
+        self.modelo = modelo
+        self.etiquetas = etiquetas
+        self.ventana = ventana
+        self.intervalo = intervalo
+
+    def evaluador(self, confianza_minima=0.6):
+        return EvaluadorSecuencias(self, confianza_minima)
+
+    def interpretar(self, probabilidades, confianza_minima):
+        """(dynamic gesture, confidence) for one row of probabilities, or None."""
+        indice = int(probabilidades.argmax())
+        etiqueta = self.etiquetas[indice]
+        if etiqueta not in GESTOS_DINAMICOS or probabilidades[indice] < confianza_minima:
+            return None
+        return etiqueta, float(probabilidades[indice])
+
+
+class EvaluadorSecuencias:
+    """Per-session evaluation of a ModeloSecuencias with preallocated window and input buffers."""
+
+    def __init__(self, modelo, confianza_minima=0.6):
+        self.modelo = modelo
+        self.confianza_minima = confianza_minima
+        self._ventana = np.zeros((modelo.ventana, NUM_CARACTERISTICAS), dtype=np.float32)
+        self._entrada = np.zeros((1, modelo.ventana * NUM_CARACTERISTICAS), dtype=np.float32)
+
+    def calentar(self):
+        """Run the model once on the empty window (the first call of some backends is slow)."""
+        self.modelo.modelo.predict(self._entrada, verbose=0)
+
+    def evaluar(self, historial):
+        """Return (dynamic gesture, confidence) for the recent history, or None."""
+        if historial.muestrear(self.modelo.ventana, self.modelo.intervalo, self._ventana) is None:
+            return None
+        caracteristicas_ventana(self._ventana, self._entrada[0])
+        probabilidades = self.modelo.modelo.predict(self._entrada, verbose=0)[0]
+        return self.modelo.interpretar(probabilidades, self.confianza_minima)
+
+
+def cargar_secuencias(model_path, backend=None):
+    """Load the sequence model published next to model_path, or None if it was trained without one."""
+    config = leer_config(model_path).get("sequence")
+    if not config:
+        return None
+    ruta = os.path.join(os.path.dirname(model_path), config["model"])
+    return ModeloSecuencias(cargar_modelo(ruta, backend), config["labels"], int(config["window"]),
+                            float(config["interval_s"]))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Sesiones de reconocimiento independientes.
+
+Cada sesión guarda su propio estado entre frames: referencia al modelo del usuario,
+tracker de MediaPipe, planificador de detección, historial de movimiento y último
+gesto. Así varios clientes pueden usar el mismo servidor sin mezclar el seguimiento
+de sus manos. Las sesiones sin actividad durante ``max_inactividad`` segundos (y sin
+espectadores de video ni suscriptores de eventos) se cierran solas.
+"""
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS
+from eventos_gestos import CanalEventos
+from historial_landmarks import HistorialLandmarks
+
+
+class SesionReconocimiento:
+    def __init__(self, sesion_id, user_id, hands, planificador, max_historial_eventos=50, capacidad_historial=64):
+        self.id = sesion_id
+        self.user_id = str(user_id)
+        self.hands = hands
+        self.planificador = planificador
+        # (modelo, mapa_inverso, normalizacion, evaluador de secuencias) swapped as one reference
+        # so a frame never mixes two versions
+        self.modelo_activo = None
+        self.mapa_etiquetas = None
+        self.modelo_version = None
+        # Recent landmark vectors and movement run; each frame's vector is written straight into it
+        self.historial = HistorialLandmarks(capacidad_historial)
+        # Preallocated model input row
+        self.entrada_modelo = np.zeros((1, NUM_CARACTERISTICAS), dtype=np.float32)
+        self.ultimas_manos = []
+        self.ultimo_gesto = None
+        self.tiempo_ultimo_gesto = 0
+        self.ultimo_publicado = None
+        self.tiempo_ultimo_publicado = 0
+        self.eventos = CanalEventos(max_historial=max_historial_eventos)
+        self.difusor = None
+        self.creada = self.ultimo_uso = time.time()
+        # MediaPipe graphs are not thread-safe: one frame at a time per session
+        self.lock = threading.Lock()
+        self._oyentes = 0
+        self._lock_oyentes = threading.Lock()
+
+    def tocar(self):
+        self.ultimo_uso = time.time()
+
+    @property
+    def en_uso(self):
+        return self._oyentes > 0 or (self.difusor is not None and self.difusor.espectadores > 0)
+
+    def suscribir_eventos(self, desde_id=None):
+        """SSE stream of this session's gestures; the session is not evicted while it is open.
+
+        Recognition keeps running for it even when nobody watches the video (frames are
+        then neither drawn nor encoded).
+        """
+        with self._lock_oyentes:
+            self._oyentes += 1
+        if self.difusor is not None:
+            self.difusor.retener()
+        try:
+            yield from self.eventos.suscribir(desde_id)
+        finally:
+            if self.difusor is not None:
+                self.difusor.liberar()
+            with self._lock_oyentes:
+                self._oyentes -= 1
+            self.tocar()
+
+    def cerrar(self):
+        if self.difusor is not None:
+            self.difusor.detener()
+        with self.lock:
+            self.hands.close()
+
+    def a_dict(self):
+        return {
+            "sessionId": self.id,
+            "userId": self.user_id,
+            "modelVersion": self.modelo_version,
+            "modelLoaded": self.modelo_activo is not None,
+            "lastGesture": None if self.ultimo_gesto is None else str(self.ultimo_gesto),
+            "lastGestureTime": self.tiempo_ultimo_gesto,
+            "createdAt": self.creada,
+            "lastUsedAt": self.ultimo_uso,
+            "viewers": self.difusor.espectadores if self.difusor is not None else 0,
+        }
+
+
+class GestorSesiones:
+    """Creates, looks up and evicts recognition sessions.
+
+    crear_sesion(sesion_id, user_id) builds a ready SesionReconocimiento (model loaded);
+    it may raise, in which case no session is registered.
+    """
+
+    def __init__(self, crear_sesion, max_sesiones=8, max_inactividad=300.0, protegidas=()):
+        self.crear_sesion = crear_sesion
+        self.max_sesiones = max(1, max_sesiones)
+        self.max_inactividad = max_inactividad
+        self.protegidas = set(protegidas)
+        self._sesiones = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._bucle_expiracion, daemon=True, name="sesiones-expiracion").start()
+
+    def crear(self, user_id, sesion_id=None):
+        sesion_id = sesion_id or uuid.uuid4().hex[:12]
+        sesion = self.crear_sesion(sesion_id, user_id)
+        with self._lock:
+            if sesion_id not in self._sesiones and len(self._sesiones) >= self.max_sesiones:
+                self._expulsar_menos_reciente()
+            if sesion_id not in self._sesiones and len(self._sesiones) >= self.max_sesiones:
+                sesion.cerrar()
+                raise RuntimeError(f"Maximum of {self.max_sesiones} sessions reached")
+            anterior = self._sesiones.get(sesion_id)
+            self._sesiones[sesion_id] = sesion
+        if anterior is not None:
+            anterior.cerrar()
+        return sesion
+
+    def obtener(self, sesion_id):
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is not None:
+            sesion.tocar()
+        return sesion
+
+    def eliminar(self, sesion_id):
+        with self._lock:
+            sesion = self._sesiones.pop(sesion_id, None)
+        if sesion is not None:
+            sesion.cerrar()
+        return sesion is not None
+
+    def listar(self):
+        with self._lock:
+            return list(self._sesiones.values())
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def _expulsar_menos_reciente(self):
+        # Called with the lock held; protected and busy sessions are never evicted
+        candidatas = [s for s in self._sesiones.values() if s.id not in self.protegidas and not s.en_uso]
+        if not candidatas:
+            return
+        sesion = min(candidatas, key=lambda s: s.ultimo_uso)
+        del self._sesiones[sesion.id]
+        print(f"Session {sesion.id} (user {sesion.user_id}) evicted to make room")
+        threading.Thread(target=sesion.cerrar, daemon=True).start()
+
+    def expirar(self):
+        """Close sessions idle for longer than max_inactividad; returns how many were closed."""
+        limite = time.time() - self.max_inactividad
+        with self._lock:
+            vencidas = [s for s in self._sesiones.values()
+                        if s.id not in self.protegidas and not s.en_uso and s.ultimo_uso < limite]
+            for sesion in vencidas:
+                del self._sesiones[sesion.id]
+        for sesion in vencidas:
+            print(f"Session {sesion.id} (user {sesion.user_id}) expired after inactivity")
+            sesion.cerrar()
+        return len(vencidas)
+
+    def _bucle_expiracion(self):
+        while True:
+            time.sleep(max(1.0, min(30.0, self.max_inactividad / 4)))
+            try:
+                self.expirar()
+            except Exception as e:
+                print(f"Error expiring sessions: {e}")
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Cola de trabajos de entrenamiento en segundo plano.
+
+Enviar un entrenamiento devuelve un id de trabajo de inmediato; un número acotado
+de hilos ejecuta ``entrenamiento.py`` como subproceso, uno por trabajo. Si ya hay un
+trabajo en cola o en curso para el mismo usuario, se devuelve ese mismo id en lugar
+de lanzar otro. El progreso por época se lee de las líneas ``PROGRESO {...}`` que
+imprime ``entrenamiento.py`` y se publica también como eventos SSE ``progress``, cuyo
+flujo termina con el trabajo.
+
+Hay un solo gestor, en ``captura_imagenes.py``; ``reconocimiento.py`` (y Node) le envían
+los trabajos en lugar de ejecutar otro, así el límite de hilos y la regla de un trabajo
+por usuario valen para todo el sistema.
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import deque
+
+from eventos_gestos import CanalEventos
+
+PREFIJO_PROGRESO = "PROGRESO "
+
+
+class TrabajoEntrenamiento:
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex[:12]
+        self.user_id = user_id
+        self.estado = "queued"
+        self.enviado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.epoca = 0
+        self.epocas = None
+        self.metricas = {}
+        self.codigo_salida = None
+        self.error = None
+        self.salida = deque(maxlen=200)
+        self.eventos = CanalEventos(max_historial=200, nombre="progress")
+        self.finalizado = threading.Event()
+
+    @property
+    def terminado(self):
+        return self.estado in ("succeeded", "failed")
+
+    def a_dict(self, incluir_salida=False):
+        datos = {
+            "jobId": self.id,
+            "userId": self.user_id,
+            "status": self.estado,
+            "submittedAt": self.enviado,
+            "startedAt": self.inicio,
+            "finishedAt": self.fin,
+            "epoch": self.epoca,
+            "epochs": self.epocas,
+            "metrics": self.metricas,
+            "returnCode": self.codigo_salida,
+            "error": self.error,
+        }
+        if incluir_salida:
+            datos["output"] = "\n".join(self.salida)
+        return datos
+
+
+class GestorEntrenamientos:
+    """Runs training jobs on max_workers threads, deduplicating jobs per user."""
+
+    def __init__(self, script_path, max_workers=1, max_historial=100):
+        self.script_path = script_path
+        self._cola = queue.Queue()
+        self._trabajos = {}
+        self._activos = {}  # user_id -> job id while queued or running
+        self._lock = threading.Lock()
+        self._max_historial = max_historial
+        for i in range(max(1, max_workers)):
+            threading.Thread(target=self._bucle, daemon=True, name=f"entrenamiento-{i}").start()
+
+    def enviar(self, user_id):
+        """Queue a training job for user_id; returns (job, created) where created is False for a duplicate."""
+        user_id = str(user_id)
+        with self._lock:
+            existente = self._activos.get(user_id)
+            if existente is not None:
+                return self._trabajos[existente], False
+            trabajo = TrabajoEntrenamiento(user_id)
+            self._trabajos[trabajo.id] = trabajo
+            self._activos[user_id] = trabajo.id
+            self._podar()
+        self._cola.put(trabajo)
+        return trabajo, True
+
+    def obtener(self, job_id):
+        return self._trabajos.get(job_id)
+
+    def listar(self):
+        with self._lock:
+            return [t.a_dict() for t in self._trabajos.values()]
+
+    def _podar(self):
+        # Forget the oldest finished jobs so the registry does not grow forever
+        terminados = [t for t in self._trabajos.values() if t.terminado]
+        for trabajo in terminados[:max(0, len(self._trabajos) - self._max_historial)]:
+            del self._trabajos[trabajo.id]
+
+    def _publicar(self, trabajo):
+        trabajo.eventos.publicar(trabajo.a_dict())
+
+    def _bucle(self):
+        while True:
+            trabajo = self._cola.get()
+            try:
+                self._ejecutar(trabajo)
+            except Exception as e:
+                trabajo.estado = "failed"
+                trabajo.error = str(e)
+            finally:
+                trabajo.fin = time.time()
+                with self._lock:
+                    self._activos.pop(trabajo.user_id, None)
+                self._publicar(trabajo)
+                trabajo.eventos.cerrar()
+                trabajo.finalizado.set()
+                print(f"Training job {trabajo.id} for user {trabajo.user_id}: {trabajo.estado}")
+
+    def _ejecutar(self, trabajo):
+        trabajo.estado = "running"
+        trabajo.inicio = time.time()
+        self._publicar(trabajo)
+
+        # Unbuffered so progress lines arrive as each epoch ends
+        entorno = dict(os.environ, PYTHONUNBUFFERED="1")
+        proceso = subprocess.Popen(
+            [sys.executable, self.script_path, trabajo.user_id],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=entorno,
+        )
+        for linea in proceso.stdout:
+            linea = linea.rstrip()
+            if linea.startswith(PREFIJO_PROGRESO):
+                try:
+                    progreso = json.loads(linea[len(PREFIJO_PROGRESO):])
+                except ValueError:
+                    continue
+                trabajo.epoca = progreso.get("epoch", trabajo.epoca)
+                trabajo.epocas = progreso.get("epochs", trabajo.epocas)
+                trabajo.metricas = progreso.get("metrics", trabajo.metricas)
+                self._publicar(trabajo)
+            elif linea:
+                trabajo.salida.append(linea)
+        trabajo.codigo_salida = proceso.wait()
+        if trabajo.codigo_salida == 0:
+            trabajo.estado = "succeeded"
+        else:
+            trabajo.estado = "failed"
+            trabajo.error = trabajo.salida[-1] if trabajo.salida else f"exit code {trabajo.codigo_salida}"
+
+
+def enviar_a_servicio(url_servicio, user_id, timeout=5.0):
+    """Submit a job to the manager served at url_servicio; returns the job as a dict (with "created").
+
+    Raises OSError (urllib.error.URLError included) if the service cannot be reached or refuses the job.
+    """
+    url = f"{url_servicio}/api/training-jobs?{urllib.parse.urlencode({'userId': user_id})}"
+    with urllib.request.urlopen(urllib.request.Request(url, method="POST"), timeout=timeout) as respuesta:
+        return json.loads(respuesta.read())
+
+
+def crear_blueprint(gestor):
+    """Flask routes to submit, list, query and stream training jobs."""
+    # Imported here so entrenamiento.py can read PREFIJO_PROGRESO without pulling in Flask
+    from flask import Blueprint, Response, request
+
+    rutas = Blueprint("trabajos_entrenamiento", __name__)
+
+    @rutas.route('/api/training-jobs', methods=['POST'])
+    def enviar_trabajo():
+        user_id = request.args.get('userId')
+        if not user_id and request.is_json:
+            user_id = request.json.get('userId')
+        if not user_id:
+            return {"success": False, "message": "userId parameter required"}, 400
+        trabajo, creado = gestor.enviar(user_id)
+        mensaje = "Training job queued." if creado else "Training already in progress for this user."
+        return {"success": True, "message": mensaje, "created": creado, **trabajo.a_dict()}, 202
+
+    @rutas.route('/api/training-jobs', methods=['GET'])
+    def listar_trabajos():
+        return {"jobs": gestor.listar()}, 200
+
+    @rutas.route('/api/training-jobs/<job_id>', methods=['GET'])
+    def estado_trabajo(job_id):
+        trabajo = gestor.obtener(job_id)
+        if trabajo is None:
+            return {"success": False, "message": "Unknown job id"}, 404
+        return trabajo.a_dict(incluir_salida=True), 200
+
+    @rutas.route('/api/training-jobs/<job_id>/events', methods=['GET'])
+    def eventos_trabajo(job_id):
+        trabajo = gestor.obtener(job_id)
+        if trabajo is None:
+            return {"success": False, "message": "Unknown job id"}, 404
+        desde_id = trabajo.eventos.id_de_cliente(request.headers.get('Last-Event-ID'))
+        if trabajo.terminado and desde_id is not None and desde_id >= trabajo.eventos.ultimo_id:
+            # The client already got the final event; 204 stops EventSource from reconnecting
+            return Response(status=204)
+        return Response(trabajo.eventos.suscribir(desde_id or 0), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return rutas
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Transcripción fuera de línea de videos grabados y carpetas de imágenes.
+
+Aplica a cada fuente el mismo camino que el reconocimiento en vivo (espejo de la
+imagen, MediaPipe, el modelo del usuario y las reglas de ``reglas_gestos``) pero sin
+cámara ni servidor y sin limitarse al tiempo real: cada fuente se divide en tramos de
+frames que se procesan con MediaPipe en un pool de procesos, y todos los frames con
+mano de un tramo se clasifican con una sola llamada a ``predict``. El resultado es
+una transcripción con marcas de tiempo en JSON o CSV:
+
+    python transcribir.py sesion1.mp4 sesion2.mp4 --user 1 --output transcripcion.json
+    python transcribir.py capturas/ --fps 10 --model modelo.h5 --labels mapa.npy --output t.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from caracteristicas import NUM_CARACTERISTICAS, cargar_config, matriz_manos, normalizar
+from extraccion_paralela import contexto_procesos, numero_workers
+from fuentes_video import listar_imagenes
+from inferencia import BACKENDS, cargar_modelo
+from historial_landmarks import HistorialLandmarks
+from reglas_gestos import FRAMES_MOVIMIENTO, UMBRAL_MOVIMIENTO, aceptar_gesto
+from secuencias_gestos import caracteristicas_ventana, cargar_secuencias
+from versiones_modelo import rutas_modelo_usuario
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(base_dir)
+
+def crear_tracker(estatico=False):
+    # Same settings as the live recognizer so both transcribe a recording the same way
+    return mp.solutions.hands.Hands(static_image_mode=estatico, max_num_hands=1,
+                                    min_detection_confidence=0.8, min_tracking_confidence=0.8)
+
+
+def listar_fuente(ruta, fps_imagenes):
+    """Return (tipo, fuente, total_frames, fps) for a video file or an image directory."""
+    if os.path.isdir(ruta):
+        imagenes = listar_imagenes(ruta)
+        return "imagenes", imagenes, len(imagenes), fps_imagenes
+    captura = cv2.VideoCapture(ruta)
+    try:
+        if not captura.isOpened():
+            raise FileNotFoundError(f"No se pudo abrir el video: {ruta}")
+        total = int(captura.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = captura.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        captura.release()
+    return "video", ruta, total, fps
+
+
+def dividir_en_tramos(tipo, fuente, total, tamano_tramo, voltear, estatico):
+    """Split a source into (tipo, fuente, inicio, fin, voltear, estatico) tasks of at most tamano_tramo frames."""
+    if total <= 0:
+        if tipo == "imagenes":
+            return []  # Empty folder
+        # Unknown frame count (some containers): read the whole video in one task
+        return [(tipo, fuente, 0, None, voltear, estatico)]
+    return [(tipo, fuente, inicio, min(inicio + tamano_tramo, total), voltear, estatico)
+            for inicio in range(0, total, tamano_tramo)]
+
+
+def _frames_de_tramo(tipo, fuente, inicio, fin):
+    if tipo == "imagenes":
+        for indice in range(inicio, fin):
+            yield indice, cv2.imread(fuente[indice])
+        return
+    captura = cv2.VideoCapture(fuente)
+    try:
+        if inicio:
+            captura.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+        indice = inicio
+        while fin is None or indice < fin:
+            ok, frame = captura.read()
+            if not ok:
+                break
+            yield indice, frame
+            indice += 1
+    finally:
+        captura.release()
+
+
+def _procesar_tramo(tarea):
+    """Return (frames leídos, índices de frames con mano, landmarks (n, 63)) for one task."""
+    tipo, fuente, inicio, fin, voltear, estatico = tarea
+    # A fresh tracker per task: tracking state must not leak between unrelated frame ranges
+    hands = crear_tracker(estatico)
+    indices = []
+    filas = []
+    leidos = 0
+    try:
+        for indice, frame in _frames_de_tramo(tipo, fuente, inicio, fin):
+            if frame is None:
+                continue
+            leidos += 1
+            if voltear:
+                frame = cv2.flip(frame, 1)
+            resultados = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if resultados.multi_hand_landmarks:
+                indices.append(indice)
+                filas.append(resultados.multi_hand_landmarks[0])
+    finally:
+        hands.close()
+    return leidos, np.array(indices, dtype=np.int64), matriz_manos(filas)
+
+
+def procesar_tramos(tareas, workers):
+    """Yield the result of each task in submission order, using a process pool when workers > 1."""
+    workers = min(workers, len(tareas))
+    if workers <= 1:
+        for tarea in tareas:
+            yield _procesar_tramo(tarea)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto_procesos(["transcribir"])) as pool:
+        yield from pool.map(_procesar_tramo, tareas)
+
+
+class Transcriptor:
+    """Classifies the landmarks of consecutive frames and merges accepted gestures into segments."""
+
+    def __init__(self, modelo, mapa_inverso, fps, hueco=0.5, normalizacion="none", secuencias=None,
+                 confianza_secuencias=0.6, hueco_historial=1.0, umbral=UMBRAL_MOVIMIENTO, frames=FRAMES_MOVIMIENTO):
+        self.modelo = modelo
+        self.mapa_inverso = mapa_inverso
+        self.normalizacion = normalizacion
+        self.secuencias = secuencias
+        self.confianza_secuencias = confianza_secuencias
+        self.fps = fps
+        self.hueco = hueco
+        self.hueco_historial = hueco_historial
+        self.umbral = umbral
+        self.frames = frames
+        self.historial = HistorialLandmarks()
+        if secuencias is not None:
+            self._ventana = np.zeros((secuencias.ventana, NUM_CARACTERISTICAS), dtype=np.float32)
+        self.segmentos = []
+        self._actual = None
+
+    def agregar(self, indices, landmarks):
+        """Classify one task's frames with batched predicts and apply the gesture rules in order.
+
+        Movement and the sequence windows only depend on the landmarks, so they are computed
+        first; then the frame model and the sequence model each run once over the task.
+        """
+        if len(indices) == 0:
+            return
+        en_movimiento = np.zeros(len(indices), dtype=np.int64)
+        ventanas = None
+        if self.secuencias is not None:
+            ventanas = np.zeros((len(indices), self._ventana.size), dtype=np.float32)
+            con_ventana = np.zeros(len(indices), dtype=bool)
+        for i, (indice, gesto) in enumerate(zip(indices, landmarks)):
+            tiempo = indice / self.fps
+            if self.historial.cantidad and tiempo - self.historial.ultimo_tiempo > self.hueco_historial:
+                self.historial.reiniciar()
+            self.historial.agregar(tiempo, self.umbral, gesto)
+            en_movimiento[i] = self.historial.frames_en_movimiento
+            if ventanas is not None and en_movimiento[i] and \
+               self.historial.muestrear(self.secuencias.ventana, self.secuencias.intervalo, self._ventana) is not None:
+                caracteristicas_ventana(self._ventana, ventanas[i])
+                con_ventana[i] = True
+
+        predicciones = np.asarray(self.modelo.predict(normalizar(landmarks, self.normalizacion), verbose=0))
+        clases = predicciones.argmax(axis=1)
+        confianzas = predicciones.max(axis=1)
+        dinamicos = {}
+        if ventanas is not None and con_ventana.any():
+            filas = np.flatnonzero(con_ventana)
+            probabilidades = np.asarray(self.secuencias.modelo.predict(ventanas[filas], verbose=0))
+            dinamicos = {int(i): self.secuencias.interpretar(p, self.confianza_secuencias)
+                         for i, p in zip(filas, probabilidades)}
+
+        for i, (indice, clase, confianza) in enumerate(zip(indices, clases, confianzas)):
+            etiqueta = self.mapa_inverso.get(int(clase))
+            if etiqueta is None:
+                continue
+            aceptado = aceptar_gesto(etiqueta, en_movimiento[i], self.frames, dinamicos=self.secuencias is None)
+            if dinamicos.get(i) is not None:
+                (etiqueta, confianza), aceptado = dinamicos[i], True
+            if aceptado:
+                self._acumular(str(etiqueta), int(indice), float(confianza))
+
+    def _acumular(self, etiqueta, indice, confianza):
+        segundo = indice / self.fps
+        actual = self._actual
+        if actual is not None and actual["gesture"] == etiqueta and segundo - actual["end"] <= self.hueco:
+            actual["end"] = segundo
+            actual["frames"] += 1
+            actual["_suma"] += confianza
+            return
+        self._cerrar()
+        self._actual = {"gesture": etiqueta, "start": segundo, "end": segundo, "frames": 1, "_suma": confianza}
+
+    def _cerrar(self):
+        if self._actual is None:
+            return
+        segmento = self._actual
+        segmento["confidence"] = round(segmento.pop("_suma") / segmento["frames"], 4)
+        segmento["start"] = round(segmento["start"], 3)
+        segmento["end"] = round(segmento["end"], 3)
+        self.segmentos.append(segmento)
+        self._actual = None
+
+    def terminar(self):
+        self._cerrar()
+        return self.segmentos
+
+
+def transcribir_fuente(ruta, modelo, mapa_inverso, normalizacion, secuencias, args):
+    tipo, fuente, total, fps = listar_fuente(ruta, args.fps)
+    tareas = dividir_en_tramos(tipo, fuente, total, args.chunk, not args.no_flip, args.static)
+    transcriptor = Transcriptor(modelo, mapa_inverso, fps, hueco=args.gap, normalizacion=normalizacion,
+                                secuencias=secuencias, confianza_secuencias=args.sequence_confidence)
+    inicio = time.perf_counter()
+    leidos = con_mano = 0
+    for n, indices, landmarks in procesar_tramos(tareas, args.workers):
+        leidos += n
+        con_mano += len(indices)
+        transcriptor.agregar(indices, landmarks)
+    segmentos = transcriptor.terminar()
+    duracion = time.perf_counter() - inicio
+    print(f"{ruta}: {leidos} frames ({con_mano} con mano) en {duracion:.1f} s, "
+          f"{leidos / duracion if duracion else 0:.1f} frames/s, {len(segmentos)} gestos", file=sys.stderr)
+    return {
+        "source": ruta,
+        "type": tipo,
+        "fps": fps,
+        "frames": leidos,
+        "frames_with_hand": con_mano,
+        "duration_s": round(leidos / fps, 3) if fps else None,
+        "elapsed_s": round(duracion, 3),
+        "transcript": "".join(s["gesture"] for s in segmentos),
+        "segments": segmentos,
+    }
+
+
+def cargar_modelo_transcripcion(args):
+    """Return (modelo, mapa_inverso, normalización, secuencias, descripción) from --model/--labels or the user's model."""
+    version = None
+    if args.model or args.labels:
+        if not (args.model and args.labels):
+            raise ValueError("--model y --labels se deben indicar juntos")
+        model_path, label_map_path = args.model, args.labels
+    else:
+        version, model_path, label_map_path = rutas_modelo_usuario(
+            os.path.join(backend_dir, "modelos", str(args.user)), args.user)
+    modelo = cargar_modelo(model_path, args.backend)
+    etiquetas = np.load(label_map_path, allow_pickle=True).item()
+    normalizacion = cargar_config(model_path)
+    secuencias = cargar_secuencias(model_path, args.backend)
+    descripcion = {"user": None if args.model else str(args.user), "version": version,
+                   "model_path": model_path, "label_map_path": label_map_path, "normalization": normalizacion,
+                   "sequence_model": secuencias is not None}
+    return modelo, {v: k for k, v in etiquetas.items()}, normalizacion, secuencias, descripcion
+
+
+def escribir_salida(resultado, ruta, formato):
+    if formato == "csv":
+        archivo = open(ruta, "w", newline="") if ruta else sys.stdout
+        try:
+            escritor = csv.writer(archivo)
+            escritor.writerow(["source", "gesture", "start", "end", "frames", "confidence"])
+            for fuente in resultado["sources"]:
+                for s in fuente["segments"]:
+                    escritor.writerow([fuente["source"], s["gesture"], s["start"], s["end"],
+                                       s["frames"], s["confidence"]])
+        finally:
+            if ruta:
+                archivo.close()
+        return
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if ruta:
+        with open(ruta, "w") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe gestos de videos grabados o carpetas de imágenes")
+    parser.add_argument("inputs", nargs="+", help="Archivos de video o directorios de imágenes")
+    parser.add_argument("--user", default=os.getenv("USER_ID", "1"),
+                        help="Usuario cuyo modelo actual se usa (si no se pasan --model y --labels)")
+    parser.add_argument("--model", help="Ruta a un modelo .h5 concreto")
+    parser.add_argument("--labels", help="Ruta al mapa de etiquetas .npy del modelo")
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="Backend de inferencia (por defecto INFERENCE_BACKEND o numpy)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos de MediaPipe (por defecto TRAIN_WORKERS o todos los núcleos)")
+    parser.add_argument("--chunk", type=int, default=300, help="Frames por tramo de trabajo")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frames por segundo de las carpetas de imágenes")
+    parser.add_argument("--gap", type=float, default=0.5,
+                        help="Segundos sin el mismo gesto aceptado que separan dos apariciones")
+    parser.add_argument("--sequence-confidence", type=float,
+                        default=float(os.getenv("SEQUENCE_MIN_CONFIDENCE", "0.6")),
+                        help="Confianza mínima del modelo de secuencias para aceptar un gesto dinámico")
+    parser.add_argument("--no-flip", action="store_true",
+                        help="No aplicar el espejo horizontal que usa la cámara en vivo")
+    parser.add_argument("--static", action="store_true",
+                        help="Detectar la mano en cada frame sin seguimiento (imágenes no consecutivas)")
+    parser.add_argument("--output", help="Archivo de salida (.json o .csv); por defecto se imprime")
+    parser.add_argument("--format", choices=("json", "csv"), default=None,
+                        help="Formato de salida (por defecto según la extensión de --output)")
+    args = parser.parse_args(argv)
+    if args.chunk < 1 or args.fps <= 0:
+        parser.error("--chunk y --fps deben ser positivos")
+    args.workers = numero_workers(args.workers)
+    args.format = args.format or ("csv" if args.output and args.output.lower().endswith(".csv") else "json")
+    return args
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    modelo, mapa_inverso, normalizacion, secuencias, descripcion = cargar_modelo_transcripcion(args)
+    fuentes = [transcribir_fuente(ruta, modelo, mapa_inverso, normalizacion, secuencias, args) for ruta in args.inputs]
+    resultado = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": descripcion,
+        "settings": {"flip": not args.no_flip, "static": args.static, "gap_s": args.gap,
+                     "movement_threshold": UMBRAL_MOVIMIENTO, "movement_frames": FRAMES_MOVIMIENTO},
+        "sources": fuentes,
+    }
+    escribir_salida(resultado, args.output, args.format)
+    if args.output:
+        print(f"Transcripción guardada en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Verificación de que los backends de inferencia dan lo mismo que Keras.
+
+Carga el modelo de ``backend/modelos/1`` (u otro con ``--model``) con los backends
+``numpy`` y ``tflite`` y compara sus salidas con ``keras.models.load_model`` sobre
+vectores aleatorios. Además amplía la cabeza del modelo con ``ampliar_salida``, como
+hace el entrenamiento incremental al aprender letras nuevas, lo guarda en un ``.h5``
+temporal y repite la comparación sobre él. Termina con código 1 si algún backend se
+pasa de la tolerancia:
+
+    python verificar_inferencia.py
+    python verificar_inferencia.py --model modelo.h5 --backends numpy --tolerance 1e-5
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from entrenamiento import ampliar_salida
+from inferencia import cargar_modelo, verificar_contra_keras
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(base_dir)
+modelo_path = os.path.join(backend_dir, "modelos", "1", "1_modelo_gestos.h5")
+
+
+def guardar_ampliado(model_path, clases_nuevas, destino):
+    """Save model_path with clases_nuevas extra outputs to destino; returns the new output count.
+
+    The new columns get random weights instead of the initializer's, so a backend that
+    dropped or misplaced them would not go unnoticed.
+    """
+    import keras
+
+    modelo = keras.models.load_model(model_path)
+    num_clases = modelo.output_shape[-1] + clases_nuevas
+    ampliado = ampliar_salida(keras, modelo, num_clases)
+    cabeza = ampliado.layers[-1]
+    kernel, bias = cabeza.get_weights()
+    rng = np.random.default_rng(0)
+    anteriores = num_clases - clases_nuevas
+    kernel[:, anteriores:] = rng.normal(0, 0.5, (kernel.shape[0], clases_nuevas))
+    bias[anteriores:] = rng.normal(0, 0.5, clases_nuevas)
+    cabeza.set_weights([kernel, bias])
+    ampliado.save(destino)
+    return num_clases
+
+
+def verificar(model_path, backends, muestras, tolerancia):
+    """Check every backend against Keras on model_path; returns the names of those that failed."""
+    fallidos = []
+    for backend in backends:
+        try:
+            error = verificar_contra_keras(cargar_modelo(model_path, backend), model_path, muestras, tolerancia)
+        except AssertionError as e:
+            print(f"  {backend:8s} FALLA: {e}")
+            fallidos.append(backend)
+            continue
+        print(f"  {backend:8s} ok (error máximo {error:.2e})")
+    return fallidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los backends de inferencia con Keras")
+    parser.add_argument("--model", default=modelo_path, help="Modelo .h5 a verificar")
+    parser.add_argument("--backends", default="numpy,tflite")
+    parser.add_argument("--samples", type=int, default=256, help="Vectores aleatorios por comparación")
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--new-classes", type=int, default=3,
+                        help="Salidas que se agregan al modelo ampliado (0 para omitirlo)")
+    args = parser.parse_args()
+    backends = args.backends.split(",")
+
+    print(f"Modelo {args.model}")
+    fallidos = verificar(args.model, backends, args.samples, args.tolerance)
+    if args.new_classes > 0:
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta = os.path.join(tmp, "modelo_ampliado.h5")
+            num_clases = guardar_ampliado(args.model, args.new_classes, ruta)
+            print(f"Modelo ampliado a {num_clases} salidas")
+            fallidos += verificar(ruta, backends, args.samples, args.tolerance)
+
+    if fallidos:
+        print(f"Backends fuera de tolerancia: {', '.join(sorted(set(fallidos)))}")
+        sys.exit(1)
+    print("Todos los backends coinciden con Keras")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Versiones de modelo por usuario con publicación atómica.
+
+Cada entrenamiento escribe el modelo y el mapa de etiquetas en un directorio nuevo
+``modelos/<user>/versiones/<version>/`` y, solo cuando ambos archivos están
+completos, reemplaza atómicamente el puntero ``modelos/<user>/actual.json``. Así
+``reconocimiento.py`` nunca lee un ``.h5`` a medio escribir y puede volver a la
+versión anterior sin reentrenar.
+"""
+import glob
+import json
+import os
+import shutil
+import time
+
+NOMBRE_PUNTERO = "actual.json"
+DIR_VERSIONES = "versiones"
+ARCHIVO_MODELO = "modelo_gestos.h5"
+ARCHIVO_ETIQUETAS = "mapa_etiquetas.npy"
+
+
+def _leer_puntero(modelo_dir):
+    ruta = os.path.join(modelo_dir, NOMBRE_PUNTERO)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Puntero de versión inválido en {ruta}: {e}")
+        return None
+
+
+def _escribir_puntero(modelo_dir, puntero):
+    ruta = os.path.join(modelo_dir, NOMBRE_PUNTERO)
+    tmp = ruta + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(puntero, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def rutas_version(modelo_dir, version):
+    directorio = os.path.join(modelo_dir, DIR_VERSIONES, version)
+    return os.path.join(directorio, ARCHIVO_MODELO), os.path.join(directorio, ARCHIVO_ETIQUETAS)
+
+
+def version_actual(modelo_dir):
+    """Return (version, model_path, label_map_path) for the published version, or None."""
+    puntero = _leer_puntero(modelo_dir)
+    if not puntero or not puntero.get("version"):
+        return None
+    model_path, label_map_path = rutas_version(modelo_dir, puntero["version"])
+    if not (os.path.exists(model_path) and os.path.exists(label_map_path)):
+        return None
+    return puntero["version"], model_path, label_map_path
+
+
+def rutas_modelo_usuario(modelo_dir, user_id):
+    """Return (version, model_path, label_map_path) for a user's model; version is None for unversioned models.
+
+    The published version wins; models trained before versioning are found by their flat file names.
+    """
+    publicada = version_actual(modelo_dir)
+    if publicada is not None:
+        return publicada
+
+    # Resolve model and label file names supporting both with/without user prefix
+    model_candidates = [
+        os.path.join(modelo_dir, "modelo_gestos.h5"),
+        os.path.join(modelo_dir, f"{user_id}_modelo_gestos.h5")
+    ]
+    label_candidates = [
+        os.path.join(modelo_dir, "mapa_etiquetas.npy"),
+        os.path.join(modelo_dir, f"{user_id}_mapa_etiquetas.npy")
+    ]
+    model_path = next((p for p in model_candidates if os.path.exists(p)), None)
+    label_map_path = next((p for p in label_candidates if os.path.exists(p)), None)
+
+    # Fallback: pick first matching files if above failed
+    if not model_path:
+        h5_files = glob.glob(os.path.join(modelo_dir, "*.h5"))
+        model_path = h5_files[0] if h5_files else None
+    if not label_map_path:
+        npy_files = [f for f in glob.glob(os.path.join(modelo_dir, "*.npy")) if "etiquetas" in os.path.basename(f)]
+        label_map_path = npy_files[0] if npy_files else None
+
+    if not model_path or not label_map_path:
+        raise FileNotFoundError(f"Modelo o mapa de etiquetas no encontrado en {modelo_dir}. Entrena el modelo primero.")
+    return None, model_path, label_map_path
+
+
+def listar_versiones(modelo_dir):
+    directorio = os.path.join(modelo_dir, DIR_VERSIONES)
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(v for v in os.listdir(directorio) if not v.endswith(".tmp"))
+
+
+def publicar_version(modelo_dir, guardar, conservar=5):
+    """Write a new version with guardar(model_path, label_map_path) and atomically make it current.
+
+    Returns the new version name. Only the newest `conservar` versions are kept, and the
+    current and previous ones are never deleted.
+    """
+    ahora = time.time()
+    version = time.strftime("v%Y%m%d-%H%M%S", time.localtime(ahora)) + f"-{int(ahora * 1000) % 1000:03d}"
+    versiones_dir = os.path.join(modelo_dir, DIR_VERSIONES)
+    tmp_dir = os.path.join(versiones_dir, version + ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    guardar(os.path.join(tmp_dir, ARCHIVO_MODELO), os.path.join(tmp_dir, ARCHIVO_ETIQUETAS))
+    os.replace(tmp_dir, os.path.join(versiones_dir, version))
+
+    anterior = _leer_puntero(modelo_dir) or {}
+    _escribir_puntero(modelo_dir, {"version": version, "previous": anterior.get("version"),
+                                   "published_at": time.time()})
+    _podar(modelo_dir, conservar, protegidas={version, anterior.get("version")})
+    return version
+
+
+def revertir(modelo_dir):
+    """Point back to the previous version; returns its name or None if there is none."""
+    puntero = _leer_puntero(modelo_dir)
+    if not puntero or not puntero.get("previous"):
+        return None
+    previa = puntero["previous"]
+    model_path, label_map_path = rutas_version(modelo_dir, previa)
+    if not (os.path.exists(model_path) and os.path.exists(label_map_path)):
+        return None
+    # Older versions sorted before the one we roll back to become its own "previous"
+    candidatas = [v for v in listar_versiones(modelo_dir) if v < previa]
+    _escribir_puntero(modelo_dir, {"version": previa, "previous": candidatas[-1] if candidatas else None,
+                                   "published_at": time.time(), "rolled_back_from": puntero["version"]})
+    return previa
+
+
+def _podar(modelo_dir, conservar, protegidas):
+    versiones = listar_versiones(modelo_dir)
+    for version in versiones[:max(0, len(versiones) - conservar)]:
+        if version not in protegidas:
+            shutil.rmtree(os.path.join(modelo_dir, DIR_VERSIONES, version), ignore_errors=True)
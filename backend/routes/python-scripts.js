@@ -5,16 +5,113 @@ const path = require('path');
 const fs = require('fs');
 const axios = require('axios');
 
+// ============ Service Health ============
+
+const CAPTURA_PORT = 5001;
+const RECONOCIMIENTO_PORT = 5000;
+// The Flask services open their port right away and load MediaPipe and the models in the
+// background; /api/ready answers 200 once that is done
+const SERVICE_READY_TIMEOUT_MS = parseInt(process.env.PYTHON_READY_TIMEOUT_MS || '60000', 10);
+
+// Startup report of a Flask service (status: starting, ready or failed), or null if it is not running
+async function getServiceStartup(port) {
+    try {
+        const r = await axios.get(`http://localhost:${port}/api/health`, { timeout: 1000 });
+        return r.data;
+    } catch (e) {
+        return null;
+    }
+}
+
+// Poll /api/ready until the service is warmed up; resolves with its startup report and
+// rejects if startup failed or did not finish within timeoutMs
+async function waitForServiceReady(port, timeoutMs = SERVICE_READY_TIMEOUT_MS) {
+    const deadline = Date.now() + timeoutMs;
+    let report = null;
+    while (Date.now() < deadline) {
+        try {
+            const r = await axios.get(`http://localhost:${port}/api/ready`, { timeout: 1000 });
+            return r.data;
+        } catch (e) {
+            report = e.response?.data || report;
+            if (report?.status === 'failed') {
+                throw new Error(`startup failed: ${report.error}`);
+            }
+        }
+        await new Promise((resolve) => setTimeout(resolve, 250));
+    }
+    throw new Error(`not ready after ${timeoutMs} ms (phase: ${report?.currentPhase || 'not listening'})`);
+}
+
+// Make sure a Flask service is running and ready, starting it if needed. A running service is
+// reused once it is ready; one that failed or hangs is killed and started again. Resolves with
+// { startup, alreadyRunning }; rejects with err.spawnFailed set if the process could not be spawned.
+async function ensureServiceRunning(script, port, userId) {
+    if (await getServiceStartup(port)) {
+        try {
+            const startup = await waitForServiceReady(port);
+            console.log(`${script} already running and ready.`);
+            return { startup, alreadyRunning: true };
+        } catch (e) {
+            console.log(`${script} is running but ${e.message}; restarting it.`);
+        }
+    }
+
+    // Kill any leftover process and start fresh
+    const name = path.basename(script, '.py');
+    const killCmd = process.platform === 'win32'
+        ? `taskkill /FI "COMMANDLINE eq *${name}*" /IM python.exe /T /F`
+        : `pkill -9 -f ${name}`;
+    await new Promise((resolve) => exec(killCmd, () => resolve()));
+    // Delay to ensure processes are killed
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+
+    const pythonProcess = spawn('python', [path.join(__dirname, '../python', script)], {
+        detached: true,
+        stdio: ['ignore', 'pipe', 'pipe'],
+        env: { ...process.env, USER_ID: userId }
+    });
+    pythonProcess.stdout.on('data', (data) => {
+        console.log(`${script}: ${data.toString().trim()}`);
+    });
+    pythonProcess.stderr.on('data', (data) => {
+        console.error(`${script} Error: ${data.toString().trim()}`);
+    });
+    const spawnFailed = new Promise((_, reject) => {
+        pythonProcess.on('error', (err) => {
+            console.error(`Failed to start ${script}:`, err.message);
+            err.spawnFailed = true;
+            reject(err);
+        });
+    });
+    pythonProcess.unref();
+
+    // Ready once the service has loaded its libraries and models and warmed them up
+    try {
+        const startup = await Promise.race([waitForServiceReady(port), spawnFailed]);
+        console.log(`${script} ready on port ${port} after ${startup.readyAfterSeconds}s.`);
+        return { startup, alreadyRunning: false };
+    } catch (err) {
+        if (!err.spawnFailed) {
+            console.error(`${script} did not become ready: ${err.message}`);
+        }
+        throw err;
+    }
+}
+
 // ============ Diagnostic Routes ============
 
 // Check status of all services
 router.get('/status', async (req, res) => {
-    const capturaHealthy = await checkCapturaHealth().catch(() => false);
-    const reconocimientoHealthy = await checkReconocimientoHealth().catch(() => false);
-    
+    const [captura, reconocimiento] = await Promise.all([
+        getServiceStartup(CAPTURA_PORT),
+        getServiceStartup(RECONOCIMIENTO_PORT)
+    ]);
+
     res.json({
-        captura: capturaHealthy ? 'healthy' : 'unavailable',
-        reconocimiento: reconocimientoHealthy ? 'healthy' : 'unavailable',
+        captura: captura ? captura.status : 'unavailable',
+        reconocimiento: reconocimiento ? reconocimiento.status : 'unavailable',
+        startup: { captura, reconocimiento },
         timestamp: new Date().toISOString()
     });
 });
@@ -42,6 +139,15 @@ router.post('/stop-service', (req, res) => {
 
 // ============ Captura de Imágenes Routes ============
 
+// Stream profile options (resolution, JPEG quality, max FPS) forwarded to the Flask video feeds
+function streamProfileParams(query) {
+    const params = {};
+    for (const key of ['profile', 'width', 'quality', 'fps']) {
+        if (query[key] !== undefined) params[key] = query[key];
+    }
+    return params;
+}
+
 // Proxy video feed from captura_imagenes.py (port 5001)
 router.get('/capture-video-feed', async (req, res) => {
     const userId = req.query.userId;
@@ -52,6 +158,7 @@ router.get('/capture-video-feed', async (req, res) => {
     try {
         const flaskUrl = 'http://localhost:5001/video_feed';
         const response = await axios.get(flaskUrl, {
+            params: streamProfileParams(req.query),
             responseType: 'stream',
             timeout: 30000
         });
@@ -160,22 +267,31 @@ router.post('/capture-image', (req, res) => {
         })
         .catch(error => {
             console.error('Error capturing image:', error.message);
-            res.status(500).json({ success: false, message: 'Failed to capture image.' });
+            // e.g. 422 when no hand was detected in the frame
+            const status = error.response?.status || 500;
+            const message = error.response?.data?.message || 'Failed to capture image.';
+            res.status(status).json({ success: false, message });
         });
 });
 
-// Health check for captura service (port 5001)
-async function checkCapturaHealth() {
+// Capture a burst of images for a letter in one request; files are written in the background
+router.post('/capture-burst', async (req, res) => {
+    const { userId, letter, count, intervalMs } = req.query;
+
+    if (!userId || !letter) {
+        return res.status(400).json({ success: false, message: 'userId and letter are required.' });
+    }
+
     try {
-        await axios.get('http://localhost:5001/video_feed', {
-            timeout: 2000,
-            responseType: 'stream'
+        const r = await axios.post('http://localhost:5001/capture_burst', null, {
+            params: { userId, letter, count, intervalMs }
         });
-        return true;
+        res.status(r.status).json(r.data);
     } catch (e) {
-        return false;
+        const status = e.response?.status || 500;
+        res.status(status).json(e.response?.data || { success: false, message: 'Failed to capture burst.' });
     }
-}
+});
 
 // Start captura_imagenes.py Flask server
 router.get('/start-capture', async (req, res) => {
@@ -184,116 +300,60 @@ router.get('/start-capture', async (req, res) => {
         return res.status(400).send('userId query parameter is required.');
     }
 
-    // First, check if service is already healthy
-    if (await checkCapturaHealth()) {
-        console.log('captura_imagenes.py already running and responding.');
-        return res.json({ success: true, message: 'captura_imagenes.py already running.' });
+    try {
+        const { startup, alreadyRunning } = await ensureServiceRunning('captura_imagenes.py', CAPTURA_PORT, userId);
+        const message = alreadyRunning
+            ? 'captura_imagenes.py already running.'
+            : `captura_imagenes.py started on port ${CAPTURA_PORT}.`;
+        res.json({ success: true, message, startup });
+    } catch (err) {
+        res.status(500).json(err.spawnFailed ? {
+            success: false,
+            message: 'Failed to spawn captura_imagenes.py process.',
+            error: err.message
+        } : {
+            success: false,
+            message: 'Failed to start captura_imagenes.py. Check Python dependencies and camera access.',
+            error: err.message,
+            hint: 'Ensure Python packages are installed: pip install -r requirements.txt'
+        });
     }
-
-    // If not healthy, kill any existing processes and start fresh
-    const killCmd = process.platform === 'win32'
-        ? `taskkill /FI "COMMANDLINE eq *captura_imagenes*" /IM python.exe /T /F`
-        : `pkill -9 -f captura_imagenes`;
-
-    exec(killCmd, (killErr) => {
-        // Delay to ensure processes are killed
-        setTimeout(() => {
-            const scriptPath = path.join(__dirname, '../python/captura_imagenes.py');
-            
-            let hasResponded = false; // Track if response was sent
-            
-            const pythonProcess = spawn('python', [scriptPath], {
-                detached: true,
-                stdio: ['ignore', 'pipe', 'pipe'],
-                env: { ...process.env, USER_ID: userId }
-            });
-
-            pythonProcess.stdout.on('data', (data) => {
-                console.log(`captura_imagenes.py: ${data.toString().trim()}`);
-            });
-
-            pythonProcess.stderr.on('data', (data) => {
-                console.error(`captura_imagenes.py Error: ${data.toString().trim()}`);
-            });
-
-            pythonProcess.on('error', (err) => {
-                console.error('Failed to start captura_imagenes.py:', err.message);
-                if (!hasResponded) {
-                    hasResponded = true;
-                    res.status(500).json({ 
-                        success: false, 
-                        message: 'Failed to spawn captura_imagenes.py process.',
-                        error: err.message
-                    });
-                }
-            });
-
-            pythonProcess.unref();
-            
-            // Wait for service to be ready and then respond
-            let attempts = 0;
-                const maxAttempts = 30; // 30 * 500ms = 15 seconds
-            const checkInterval = setInterval(async () => {
-                attempts++;
-                if (await checkCapturaHealth()) {
-                    clearInterval(checkInterval);
-                    if (!hasResponded) {
-                        hasResponded = true;
-                        console.log('captura_imagenes.py started and ready on port 5001.');
-                        res.json({ success: true, message: 'captura_imagenes.py started on port 5001.' });
-                    }
-                } else if (attempts >= maxAttempts) {
-                    clearInterval(checkInterval);
-                    if (!hasResponded) {
-                        hasResponded = true;
-                        console.error('Timeout waiting for captura_imagenes.py to be ready');
-                        res.status(500).json({ 
-                            success: false, 
-                            message: 'Failed to start captura_imagenes.py. Check Python dependencies and camera access.',
-                            hint: 'Ensure Python packages are installed: pip install -r requirements.txt'
-                        });
-                    }
-                }
-            }, 500);
-        }, 1000);
-    });
 });
 
 // ============ Entrenamiento Routes ============
 
-// Train model for a given userId
-router.post('/train-model', (req, res) => {
+// Queue a training job for a given userId on captura_imagenes.py (port 5001).
+// Its job manager is the only one: it bounds concurrent trainings and deduplicates per user
+// (reconocimiento.py's /train_model delegates to it too). The service is started if needed.
+router.post('/train-model', async (req, res) => {
     const userId = req.query.userId;
     if (!userId) {
         return res.status(400).json({ success: false, message: 'userId is required.' });
     }
 
-    const scriptPath = path.join(__dirname, '../python/entrenamiento.py');
-
-    const pythonProcess = spawn('python', [scriptPath, userId]);
-
-    let output = '';
-    let errorOutput = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-        const msg = data.toString().trim();
-        console.log(`entrenamiento.py: ${msg}`);
-        output += msg + '\n';
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-        const msg = data.toString().trim();
-        console.error(`entrenamiento.py Error: ${msg}`);
-        errorOutput += msg + '\n';
-    });
-
-    pythonProcess.on('close', (code) => {
-        if (code === 0) {
-            res.json({ success: true, message: 'Model trained successfully.', output });
-        } else {
-            res.status(500).json({ success: false, message: 'Training failed.', error: errorOutput });
+    try {
+        // Training routes answer while the service is still warming up, so a live one is enough
+        const startup = await getServiceStartup(CAPTURA_PORT);
+        if (!startup || startup.status === 'failed') {
+            await ensureServiceRunning('captura_imagenes.py', CAPTURA_PORT, userId);
         }
-    });
+        const r = await axios.post(`http://localhost:5001/api/training-jobs?userId=${encodeURIComponent(userId)}`);
+        res.status(202).json(r.data);
+    } catch (e) {
+        console.error('Error queuing training job:', e.message);
+        res.status(500).json({ success: false, message: 'Failed to queue training job.', error: e.response?.data });
+    }
+});
+
+// Status and progress of a training job
+router.get('/training-jobs/:jobId', async (req, res) => {
+    try {
+        const r = await axios.get(`http://localhost:5001/api/training-jobs/${encodeURIComponent(req.params.jobId)}`);
+        res.json(r.data);
+    } catch (e) {
+        const status = e.response?.status || 500;
+        res.status(status).json(e.response?.data || { success: false, message: 'Failed to get training job.' });
+    }
 });
 
 // ============ Reconocimiento/Visualización Routes ============
@@ -308,6 +368,7 @@ router.get('/recognize-video-feed', async (req, res) => {
     try {
         const flaskUrl = 'http://localhost:5000/api/video_feed';
         const response = await axios.get(flaskUrl, {
+            params: streamProfileParams(req.query),
             responseType: 'stream',
             timeout: 30000
         });
@@ -335,19 +396,6 @@ router.get('/recognize-video-feed', async (req, res) => {
     }
 });
 
-// Health check for reconocimiento service (port 5000)
-async function checkReconocimientoHealth() {
-    try {
-        await axios.get('http://localhost:5000/api/video_feed', {
-            timeout: 2000,
-            responseType: 'stream'
-        });
-        return true;
-    } catch (e) {
-        return false;
-    }
-}
-
 // Start reconocimiento.py Flask server
 router.get('/start-recognition', async (req, res) => {
     const userId = req.query.userId;
@@ -355,79 +403,24 @@ router.get('/start-recognition', async (req, res) => {
         return res.status(400).send('userId query parameter is required.');
     }
 
-    // First, check if service is already healthy
-    if (await checkReconocimientoHealth()) {
-        console.log('reconocimiento.py already running and responding.');
-        return res.json({ success: true, message: 'reconocimiento.py already running.' });
+    try {
+        const { startup, alreadyRunning } = await ensureServiceRunning('reconocimiento.py', RECONOCIMIENTO_PORT, userId);
+        const message = alreadyRunning
+            ? 'reconocimiento.py already running.'
+            : `reconocimiento.py started on port ${RECONOCIMIENTO_PORT}.`;
+        res.json({ success: true, message, startup });
+    } catch (err) {
+        res.status(500).json(err.spawnFailed ? {
+            success: false,
+            message: 'Failed to spawn reconocimiento.py process.',
+            error: err.message
+        } : {
+            success: false,
+            message: 'Failed to start reconocimiento.py. Check model files and dependencies.',
+            error: err.message,
+            hint: 'Ensure model files exist in scrips/modelos/1/ and Python dependencies are installed.'
+        });
     }
-
-    // If not healthy, kill any existing processes and start fresh
-    const killCmd = process.platform === 'win32'
-        ? `taskkill /FI "COMMANDLINE eq *reconocimiento*" /IM python.exe /T /F`
-        : `pkill -9 -f reconocimiento`;
-
-    exec(killCmd, (killErr) => {
-        // Delay to ensure processes are killed
-        setTimeout(() => {
-            const scriptPath = path.join(__dirname, '../python/reconocimiento.py');
-            
-            let hasResponded = false; // Track if response was sent
-            
-            const pythonProcess = spawn('python', [scriptPath], {
-                detached: true,
-                stdio: ['ignore', 'pipe', 'pipe'],
-                env: { ...process.env, USER_ID: userId }
-            });
-
-            pythonProcess.stdout.on('data', (data) => {
-                console.log(`reconocimiento.py: ${data.toString().trim()}`);
-            });
-
-            pythonProcess.stderr.on('data', (data) => {
-                console.error(`reconocimiento.py Error: ${data.toString().trim()}`);
-            });
-
-            pythonProcess.on('error', (err) => {
-                console.error('Failed to start reconocimiento.py:', err.message);
-                if (!hasResponded) {
-                    hasResponded = true;
-                    res.status(500).json({ 
-                        success: false, 
-                        message: 'Failed to spawn reconocimiento.py process.',
-                        error: err.message
-                    });
-                }
-            });
-
-            pythonProcess.unref();
-            
-            // Wait for service to be ready and then respond
-            let attempts = 0;
-                const maxAttempts = 30; // 30 * 500ms = 15 seconds
-            const checkInterval = setInterval(async () => {
-                attempts++;
-                if (await checkReconocimientoHealth()) {
-                    clearInterval(checkInterval);
-                    if (!hasResponded) {
-                        hasResponded = true;
-                        console.log('reconocimiento.py started and ready on port 5000.');
-                        res.json({ success: true, message: 'reconocimiento.py started on port 5000.' });
-                    }
-                } else if (attempts >= maxAttempts) {
-                    clearInterval(checkInterval);
-                    if (!hasResponded) {
-                        hasResponded = true;
-                        console.error('Timeout waiting for reconocimiento.py to be ready');
-                        res.status(500).json({ 
-                            success: false, 
-                            message: 'Failed to start reconocimiento.py. Check model files and dependencies.',
-                            hint: 'Ensure model files exist in scrips/modelos/1/ and Python dependencies are installed.'
-                        });
-                    }
-                }
-            }, 500);
-        }, 1000);
-    });
 });
 
 // Camera control for reconocimiento service
@@ -481,12 +474,43 @@ router.get('/last-gesture', async (req, res) => {
     }
 });
 
-// Health check for Flask services
-router.get('/health', async (req, res) => {
+// Stream recognized gestures as Server-Sent Events from reconocimiento.py
+router.get('/gesture-events', async (req, res) => {
     try {
-        await axios.get('http://localhost:5000/health', { timeout: 2000 });
-        res.json({ status: 'healthy', service: 'reconocimiento' });
+        const headers = {};
+        if (req.headers['last-event-id']) {
+            headers['Last-Event-ID'] = req.headers['last-event-id'];
+        }
+        const response = await axios.get('http://localhost:5000/api/gesture-events', {
+            responseType: 'stream',
+            headers
+        });
+
+        res.setHeader('Content-Type', 'text/event-stream');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.setHeader('Connection', 'keep-alive');
+        res.flushHeaders();
+
+        response.data.pipe(res);
+
+        // Close the upstream connection when the browser goes away
+        req.on('close', () => response.data.destroy());
+        response.data.on('error', (err) => {
+            console.error('Error streaming gesture events:', err.message);
+            res.end();
+        });
     } catch (e) {
+        console.error('Error proxying gesture events:', e.message);
+        res.status(503).send('Gesture events unavailable.');
+    }
+});
+
+// Health check for Flask services
+router.get('/health', async (req, res) => {
+    const startup = await getServiceStartup(RECONOCIMIENTO_PORT);
+    if (startup) {
+        res.json({ status: 'healthy', service: 'reconocimiento', ready: startup.status === 'ready', startup });
+    } else {
         res.status(503).json({ status: 'unhealthy', service: 'reconocimiento' });
     }
 });